@@ -1,13 +1,33 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+import secrets
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from models import db, Client, Intake, Provider, Application, Location, Treatment, ProviderTreatment, ProviderAvailability, ProviderDailyLimit, ClientNote, Appointment, SOAPNote, MedicalAlert, PerformanceMetric
+from dashboard import (get_todays_appointments, get_upcoming_appointments, get_unconfirmed_intakes,
+                       get_recent_soap_notes, get_active_alerts, get_active_alert_counts, get_portal_stats,
+                       get_appointment_page, decode_cursor, MAX_PAGE_SIZE)
+from rollups import run_rollup, get_provider_metric_totals
+from worker import run_periodically, start_background_job, run_in_background
+from slots import find_free_slots, unit_to_str, MAX_RANGE_DAYS
+from slot_cache import slot_cache, COUNTER_STATS as SLOT_CACHE_COUNTERS
+from booking import book_appointment, BookingError
+from auth import User, load_provider_user, admin_required, remember_identity, forget_identity
+from instrumentation import init_instrumentation, request_metrics
+from page_cache import cached_page, prerender_pages
+from assets import init_assets, build_assets
+from compression import CompressionMiddleware
+from mailer import enqueue_email, enqueue_emails, deliver_pending, deliver_all, StubSMTPServer
+from webhooks import record_webhook_event, process_all_pending, requeue_events
+from search import search, rebuild_search_index, ensure_search_schema
+from timeline import get_client_timeline, decode_timeline_cursor, can_view_client
+from client_stats import reconcile_client_stats
+from export import appointment_export_query, stream_export, parquet_available, EXPORT_FORMATS
+from importer import import_csv, read_checkpoint, print_progress, CHUNK_SIZE as IMPORT_CHUNK_SIZE
 from datetime import datetime, date, timedelta
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from sqlalchemy.orm import selectinload
 import stripe
 
 app = Flask(__name__)
@@ -15,7 +35,8 @@ app.secret_key = os.environ.get("SESSION_SECRET") or "dev-secret-key-change-in-p
 
 # Construct DATABASE_URL from individual components if needed
 database_url = os.environ.get("DATABASE_URL")
-if not database_url or not database_url.startswith("postgresql://"):
+# sqlite:// URLs are accepted for the test suite
+if not database_url or not database_url.startswith(("postgresql://", "sqlite://")):
     pghost = os.environ.get("PGHOST")
     pguser = os.environ.get("PGUSER")
     pgdb = os.environ.get("PGDATABASE")
@@ -36,10 +57,14 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# CSV imports of years of history are far bigger than other uploads
+app.config['IMPORT_MAX_CONTENT_LENGTH'] = int(os.environ.get('IMPORT_MAX_MB', '1024')) * 1024 * 1024
 
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 db.init_app(app)
+init_instrumentation(app)
+init_assets(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -47,121 +72,64 @@ login_manager.login_view = 'login'
 
 stripe.api_key = os.environ.get('STRIPE_SECRET_KEY')
 
+# Periodic jobs run in a daemon thread per web worker unless BACKGROUND_JOBS=0
+# (e.g. when they run as separate `flask` worker processes instead)
+app.config['BACKGROUND_JOBS'] = os.environ.get('BACKGROUND_JOBS', '1') == '1'
+app.config['ROLLUP_INTERVAL_SECONDS'] = int(os.environ.get('ROLLUP_INTERVAL_SECONDS', '300'))
+app.config['EMAIL_POLL_SECONDS'] = int(os.environ.get('EMAIL_POLL_SECONDS', '5'))
+app.config['WEBHOOK_POLL_SECONDS'] = int(os.environ.get('WEBHOOK_POLL_SECONDS', '2'))
+# How long a session's cached identity is trusted before re-checking the providers table
+app.config['IDENTITY_TTL_SECONDS'] = int(os.environ.get('IDENTITY_TTL_SECONDS', '10'))
+# Public pages are served from memory for anonymous visitors; PAGE_CACHE_PRERENDER renders them at startup
+app.config['PAGE_CACHE'] = os.environ.get('PAGE_CACHE', '1') == '1'
+app.config['PAGE_CACHE_PRERENDER'] = os.environ.get('PAGE_CACHE_PRERENDER', '0') == '1'
+
+# gzip/brotli responses; set COMPRESSION=0 when a proxy in front already compresses
+if os.environ.get('COMPRESSION', '1') == '1':
+    app.wsgi_app = CompressionMiddleware(app.wsgi_app, static_folder=app.static_folder,
+                                         static_url_path=app.static_url_path)
+
+@app.before_request
+def start_background_jobs():
+    if app.config['BACKGROUND_JOBS']:
+        start_background_job(app, 'rollup-metrics', run_rollup, app.config['ROLLUP_INTERVAL_SECONDS'])
+        start_background_job(app, 'email-delivery', deliver_pending, app.config['EMAIL_POLL_SECONDS'])
+        start_background_job(app, 'webhook-processing', process_webhook_queue, app.config['WEBHOOK_POLL_SECONDS'])
+
+def process_webhook_queue():
+    return process_all_pending(notify=notify_new_intakes)
+
 @app.template_filter('count_active_alerts')
-def count_active_alerts(client):
-    """Count active medical alerts for a client"""
+def count_active_alerts(client, alert_counts=None):
+    """Count active medical alerts for a client, preferring a precomputed alert_counts map"""
     if not client:
         return 0
+    if alert_counts is not None and client.id in alert_counts:
+        return alert_counts[client.id]
     from models import MedicalAlert
     return MedicalAlert.query.filter_by(client_id=client.id, is_active=True).count()
 
 @app.template_filter('has_active_alerts')
-def has_active_alerts(client):
-    """Check if client has any active medical alerts"""
-    if not client:
-        return False
-    from models import MedicalAlert
-    return MedicalAlert.query.filter_by(client_id=client.id, is_active=True).count() > 0
-
-class User(UserMixin):
-    def __init__(self, id, username):
-        self.id = id
-        self.username = username
+def has_active_alerts(client, alert_counts=None):
+    """Check if client has any active medical alerts, preferring a precomputed alert_counts map"""
+    return count_active_alerts(client, alert_counts) > 0
 
 @login_manager.user_loader
 def load_user(user_id):
-    provider = Provider.query.get(int(user_id))
-    if provider:
-        return User(provider.id, provider.username)
-    return None
-
-def get_or_create_client(name, email, phone=None):
-    """
-    Get existing client by email or create a new one.
-    Returns the Client object.
-    """
-    client = Client.query.filter_by(email=email).first()
-    if client:
-        # Update client info if provided
-        if name and client.name != name:
-            client.name = name
-        if phone and client.phone != phone:
-            client.phone = phone
-        db.session.commit()
-        return client
-    
-    # Create new client
-    client = Client(
-        name=name,
-        email=email,
-        phone=phone
-    )
-    db.session.add(client)
-    db.session.commit()
-    return client
+    return load_provider_user(user_id)
 
 def send_email(to_email, subject, body):
-    """Send HTML email with professional formatting and error handling"""
+    """Queue an HTML email with the caller's changes; the caller commits and the delivery worker sends it"""
     try:
-        smtp_server = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
-        smtp_port = int(os.environ.get('SMTP_PORT', '587'))
-        smtp_username = os.environ.get('SMTP_USERNAME', 'no-reply@toughlovemassage.com')
-        smtp_password = os.environ.get('SMTP_PASSWORD', '')
-        
-        if not smtp_password:
-            print(f"📧 [DEV MODE] Email would be sent to {to_email}")
-            print(f"   Subject: {subject}")
-            print(f"   Body preview: {body[:100]}...")
-            return True
-        
-        msg = MIMEMultipart('alternative')
-        msg['From'] = f"Tough Love Massage <{smtp_username}>"
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Create professional HTML wrapper
-        html_template = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        </head>
-        <body style="font-family: 'Montserrat', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
-            <div style="background: linear-gradient(135deg, #2c7a7b 0%, #1a4d4d 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
-                <h1 style="margin: 0; font-family: 'Playfair Display', serif; font-size: 28px;">Tough Love Massage</h1>
-                <p style="margin: 10px 0 0 0; font-size: 14px; opacity: 0.9;">Discover Ultimate Rejuvenation</p>
-            </div>
-            <div style="background: #ffffff; padding: 30px; border: 1px solid #e0f2f1; border-top: none; border-radius: 0 0 10px 10px;">
-                {body}
-            </div>
-            <div style="text-align: center; margin-top: 20px; padding: 20px; color: #666; font-size: 12px;">
-                <p>Tough Love Massage | Downtown Studio & Suburban Retreat</p>
-                <p style="margin: 5px 0;">
-                    <a href="mailto:info@toughlovemassage.com" style="color: #2c7a7b; text-decoration: none;">Contact Us</a> | 
-                    <a href="https://toughlovemassage.com/policies" style="color: #2c7a7b; text-decoration: none;">Privacy Policy</a>
-                </p>
-            </div>
-        </body>
-        </html>
-        """
-        
-        msg.attach(MIMEText(html_template, 'html'))
-        
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
-        
-        print(f"✓ Email sent successfully to {to_email}")
+        enqueue_email(to_email, subject, body)
         return True
     except Exception as e:
-        print(f"✗ Email error: {e}")
+        # Nothing was added to the session, so the caller's own changes still commit
+        print(f"✗ Email queue error: {e}")
         return False
 
-def send_booking_notification(intake):
-    """Notify providers of new booking"""
-    provider_emails = [p.username for p in Provider.query.all()]
+def booking_notification_messages(intake, provider_emails):
+    """Build the new-booking notification for every provider"""
     client_name = intake.client.name if intake.client else 'Unknown'
     client_email = intake.client.email if intake.client else 'N/A'
     subject = f"New Booking: {client_name}"
@@ -197,8 +165,33 @@ def send_booking_notification(intake):
         </a>
     </div>
     """
-    for email in provider_emails:
-        send_email(email, subject, body)
+    return [(email, subject, body) for email in provider_emails]
+
+def booking_received_message(client):
+    """Build the acknowledgment sent to a client whose booking is pending confirmation"""
+    body = f"""
+    <h2 style="color: #2c7a7b;">Booking Received!</h2>
+    <p>Dear {client.name},</p>
+    <p>Thank you for choosing Tough Love Massage. We've received your booking request and intake form.</p>
+    <div style="background: #fff3cd; padding: 15px; border-left: 4px solid #ffc107; margin: 20px 0;">
+        <p style="margin: 0;"><strong>⏳ Pending Confirmation</strong></p>
+        <p style="margin: 10px 0 0 0;">Our team is reviewing your information and will confirm your appointment shortly.</p>
+    </div>
+    <p>You'll receive a confirmation email once your appointment has been reviewed and approved.</p>
+    <p>If you have any questions, please don't hesitate to contact us.</p>
+    <p><em>The Tough Love Massage Team</em></p>
+    """
+    return (client.email, 'Booking Request Received - Tough Love Massage', body)
+
+def notify_new_intakes(intakes):
+    """Queue provider notifications and client acknowledgments for a batch of new intakes"""
+    provider_emails = [username for username, in db.session.query(Provider.username)]
+    messages = []
+    for intake in intakes:
+        messages.extend(booking_notification_messages(intake, provider_emails))
+        if intake.client:
+            messages.append(booking_received_message(intake.client))
+    enqueue_emails(messages)
 
 def send_confirmation_email(intake):
     """Send confirmation to client"""
@@ -292,6 +285,7 @@ def send_application_notification(application):
     send_email(admin_email, subject, body)
 
 @app.route('/')
+@cached_page
 def home():
     return render_template('home.html')
 
@@ -304,42 +298,52 @@ def location_suburban():
     return redirect(url_for('location_holliston'))
 
 @app.route('/holliston')
+@cached_page
 def location_holliston():
     return render_template('locations/holliston/landing.html')
 
 @app.route('/holliston/services')
+@cached_page
 def holliston_services():
     return render_template('locations/holliston/services.html')
 
 @app.route('/holliston/booking')
+@cached_page
 def holliston_booking():
     return render_template('locations/holliston/booking.html')
 
 @app.route('/holliston/team')
+@cached_page
 def holliston_team():
     return render_template('locations/holliston/team.html')
 
 @app.route('/holliston/info')
+@cached_page
 def holliston_info():
     return render_template('locations/holliston/info.html')
 
 @app.route('/worcester')
+@cached_page
 def location_worcester():
     return render_template('locations/worcester/landing.html')
 
 @app.route('/worcester/services')
+@cached_page
 def worcester_services():
     return render_template('locations/worcester/services.html')
 
 @app.route('/worcester/booking')
+@cached_page
 def worcester_booking():
     return render_template('locations/worcester/booking.html')
 
 @app.route('/worcester/team')
+@cached_page
 def worcester_team():
     return render_template('locations/worcester/team.html')
 
 @app.route('/worcester/info')
+@cached_page
 def worcester_info():
     return render_template('locations/worcester/info.html')
 
@@ -380,6 +384,7 @@ def gift_cards():
             else:
                 flash('💳 Demo Mode: Gift card payment simulation (Stripe not configured)', 'info')
                 send_gift_card_email(recipient_email, amount, message, sender_name)
+                db.session.commit()
                 flash(f'🎁 Gift card for ${amount} sent to {recipient_email}!', 'success')
                 return redirect(url_for('gift_cards'))
                 
@@ -396,19 +401,16 @@ def gift_cards():
         
         if amount and recipient_email:
             send_gift_card_email(recipient_email, amount, message, sender_name)
+            db.session.commit()
             flash(f'🎁 Payment successful! Gift card sent to {recipient_email}', 'success')
     
     return render_template('gift_cards.html')
 
 @app.route('/admin-dashboard')
 @login_required
+@admin_required
 def admin_dashboard():
     """Admin dashboard with reports and management"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('provider_portal'))
-    
     # Get statistics
     total_providers = Provider.query.filter_by(active=True).count()
     total_intakes = Intake.query.count()
@@ -429,14 +431,11 @@ def admin_dashboard():
 
 @app.route('/admin/providers')
 @login_required
+@admin_required
 def admin_providers():
     """Manage providers"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('provider_portal'))
-    
-    providers = Provider.query.all()
+    # The template checks each provider's treatment assignments; load them in one extra query
+    providers = Provider.query.options(selectinload(Provider.treatments)).all()
     locations = Location.query.all()
     treatments = Treatment.query.filter_by(active=True).all()
     
@@ -444,12 +443,9 @@ def admin_providers():
 
 @app.route('/admin/provider/create', methods=['POST'])
 @login_required
+@admin_required
 def admin_create_provider():
     """Create new provider"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    
     username = request.form.get('username')
     password = request.form.get('password')
     full_name = request.form.get('full_name')
@@ -479,13 +475,10 @@ def admin_create_provider():
 
 @app.route('/admin/provider/<int:provider_id>/update', methods=['POST'])
 @login_required
+@admin_required
 def admin_update_provider(provider_id):
     """Update provider details"""
-    admin = Provider.query.get(current_user.id)
-    if not admin or not admin.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    
-    provider = Provider.query.get_or_404(provider_id)
+    provider = db.get_or_404(Provider, provider_id)
     
     provider.full_name = request.form.get('full_name')
     provider.email = request.form.get('email')
@@ -500,13 +493,10 @@ def admin_update_provider(provider_id):
 
 @app.route('/admin/provider/<int:provider_id>/reset-password', methods=['POST'])
 @login_required
+@admin_required
 def admin_reset_password(provider_id):
     """Reset provider password"""
-    admin = Provider.query.get(current_user.id)
-    if not admin or not admin.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    
-    provider = Provider.query.get_or_404(provider_id)
+    provider = db.get_or_404(Provider, provider_id)
     new_password = request.form.get('new_password')
     
     provider.password_hash = generate_password_hash(new_password)
@@ -517,13 +507,10 @@ def admin_reset_password(provider_id):
 
 @app.route('/admin/provider/<int:provider_id>/treatments', methods=['POST'])
 @login_required
+@admin_required
 def admin_assign_treatments(provider_id):
     """Assign treatments to provider"""
-    admin = Provider.query.get(current_user.id)
-    if not admin or not admin.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    
-    provider = Provider.query.get_or_404(provider_id)
+    provider = db.get_or_404(Provider, provider_id)
     treatment_ids = request.form.getlist('treatment_ids')
     
     # Remove existing assignments
@@ -541,24 +528,17 @@ def admin_assign_treatments(provider_id):
 
 @app.route('/admin/locations')
 @login_required
+@admin_required
 def admin_locations():
     """Manage locations"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('provider_portal'))
-    
     locations = Location.query.all()
     return render_template('admin_locations.html', locations=locations)
 
 @app.route('/admin/location/create', methods=['POST'])
 @login_required
+@admin_required
 def admin_create_location():
     """Create new location"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    
     location = Location(
         name=request.form.get('name'),
         address=request.form.get('address'),
@@ -573,24 +553,17 @@ def admin_create_location():
 
 @app.route('/admin/treatments')
 @login_required
+@admin_required
 def admin_treatments():
     """Manage treatments"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('provider_portal'))
-    
     treatments = Treatment.query.all()
     return render_template('admin_treatments.html', treatments=treatments)
 
 @app.route('/admin/treatment/create', methods=['POST'])
 @login_required
+@admin_required
 def admin_create_treatment():
     """Create new treatment"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        return jsonify({'error': 'Access denied'}), 403
-    
     treatment = Treatment(
         name=request.form.get('name'),
         description=request.form.get('description'),
@@ -605,13 +578,9 @@ def admin_create_treatment():
 
 @app.route('/admin/reports')
 @login_required
+@admin_required
 def admin_reports():
     """View detailed reports"""
-    provider = Provider.query.get(current_user.id)
-    if not provider or not provider.is_admin:
-        flash('Access denied. Admin privileges required.', 'error')
-        return redirect(url_for('provider_portal'))
-    
     from sqlalchemy import func
     from datetime import timedelta
     
@@ -630,17 +599,110 @@ def admin_reports():
     thirty_days_ago = datetime.utcnow() - timedelta(days=30)
     recent_bookings = Intake.query.filter(Intake.created_at >= thirty_days_ago).count()
     
+    # Sessions and revenue come from the daily performance_metrics rollup
+    metrics_by_provider = get_provider_metric_totals(thirty_days_ago.date())
+    
+    locations = Location.query.order_by(Location.name).all()
+    
     return render_template('admin_reports.html',
                          bookings_by_provider=bookings_by_provider,
                          confirmed_count=confirmed_count,
                          pending_count=pending_count,
-                         recent_bookings=recent_bookings)
+                         recent_bookings=recent_bookings,
+                         metrics_by_provider=metrics_by_provider,
+                         locations=locations,
+                         parquet_available=parquet_available())
+
+@app.route('/admin/export/appointments.<fmt>')
+@login_required
+@admin_required
+def admin_export_appointments(fmt):
+    """Stream appointments as CSV, JSON Lines or Parquet, filtered by start/end date and location_id"""
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'status': 'error', 'message': f"Format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'status': 'error', 'message': 'Parquet export is not available on this server'}), 501
+    try:
+        start = date.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else None
+        location_id = int(request.args['location_id']) if request.args.get('location_id') else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'start and end must be YYYY-MM-DD; location_id must be a number'}), 400
+    
+    query = appointment_export_query(start, end, location_id)
+    filename = '-'.join(['appointments'] + [d.isoformat() for d in (start, end) if d]) + f'.{fmt}'
+    return Response(
+        stream_with_context(stream_export(query, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+def _import_path(import_id):
+    # Under the instance folder, not static/, so uploaded client data is never served
+    return os.path.join(app.instance_path, 'imports', f'{import_id}.csv')
+
+@app.route('/admin/import', methods=['POST'])
+@login_required
+@admin_required
+def admin_import():
+    """
+    Upload a client list or appointment export CSV and import it in the background.
+    A finished import deletes its file; a failed one keeps it and its checkpoint, and
+    `flask import-csv <instance>/imports/<import_id>.csv` resumes after the last committed chunk.
+    """
+    request.max_content_length = app.config['IMPORT_MAX_CONTENT_LENGTH']
+    file = request.files.get('file')
+    if not file or not file.filename.lower().endswith('.csv'):
+        return jsonify({'status': 'error', 'message': 'Upload a .csv file as "file"'}), 400
+    
+    # The id is the only handle on someone else's upload, so it must not be guessable
+    import_id = secrets.token_urlsafe(16)
+    path = _import_path(import_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file.save(path)
+    
+    def run_import():
+        import_csv(path, progress=None)
+        os.remove(path)
+    
+    run_in_background(app, f'import-{import_id}', run_import)
+    return jsonify({
+        'status': 'accepted',
+        'import_id': import_id,
+        'status_url': url_for('admin_import_status', import_id=import_id)
+    }), 202
+
+@app.route('/admin/import/<import_id>')
+@login_required
+@admin_required
+def admin_import_status(import_id):
+    """Progress of an uploaded import: rows read, counts, the first row errors and whether it finished"""
+    path = _import_path(secure_filename(import_id))
+    state = read_checkpoint(path)
+    if state is None:
+        if not os.path.exists(path):
+            return jsonify({'status': 'error', 'message': 'Import not found'}), 404
+        return jsonify({'status': 'queued', 'rows': 0})
+    if state.get('failed'):
+        status = 'failed'
+    else:
+        status = 'finished' if state['finished'] else 'running'
+    return jsonify({
+        'status': status,
+        'kind': state.get('kind'),
+        'rows': state['rows'],
+        'rows_per_second': round(state['rows_per_second']),
+        'counts': state['stats'],
+        'errors': state['errors'],
+        'message': state.get('failed'),
+        'resume_command': f'flask import-csv {path}' if status == 'failed' else None
+    })
 
 @app.route('/provider/availability')
 @login_required
 def provider_availability():
     """Manage provider availability"""
-    provider = Provider.query.get(current_user.id)
+    provider = db.session.get(Provider, current_user.id)
     availabilities = ProviderAvailability.query.filter_by(provider_id=current_user.id).all()
     
     return render_template('provider_availability.html', provider=provider, availabilities=availabilities)
@@ -671,7 +733,7 @@ def provider_add_availability():
 @login_required
 def provider_delete_availability(availability_id):
     """Delete availability slot"""
-    availability = ProviderAvailability.query.get_or_404(availability_id)
+    availability = db.get_or_404(ProviderAvailability, availability_id)
     
     if availability.provider_id != current_user.id:
         flash('Access denied', 'error')
@@ -687,7 +749,7 @@ def provider_delete_availability(availability_id):
 @login_required
 def provider_preferences():
     """Manage booking preferences"""
-    provider = Provider.query.get(current_user.id)
+    provider = db.session.get(Provider, current_user.id)
     treatments = Treatment.query.filter_by(active=True).all()
     daily_limits = ProviderDailyLimit.query.filter_by(provider_id=current_user.id).all()
     
@@ -735,18 +797,29 @@ def provider_set_daily_limit():
 @app.route('/provider/client-notes/<string:client_email>')
 @login_required
 def provider_view_client_notes(client_email):
-    """View/edit client notes"""
+    """View/edit client notes alongside the client's history"""
+    client = Client.query.filter_by(email=client_email).first_or_404()
+    if not can_view_client(current_user, client.id):
+        flash('Access denied.', 'error')
+        return redirect(url_for('provider_portal'))
+    
     note = ClientNote.query.filter_by(
         provider_id=current_user.id,
-        client_email=client_email
+        client_id=client.id
     ).first()
     
-    client_intakes = Intake.query.filter_by(email=client_email).all()
+    try:
+        after = decode_timeline_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        after = None
+    timeline, next_cursor = get_client_timeline(client.id, after)
     
     return render_template('provider_client_notes.html', 
+                         client=client,
                          client_email=client_email,
                          note=note,
-                         client_intakes=client_intakes)
+                         timeline=timeline,
+                         next_cursor=next_cursor)
 
 @app.route('/provider/client-notes/save', methods=['POST'])
 @login_required
@@ -754,20 +827,26 @@ def provider_save_client_notes():
     """Save client notes"""
     client_email = request.form.get('client_email')
     notes = request.form.get('notes')
+    client = Client.query.filter_by(email=client_email).first_or_404()
+    if not can_view_client(current_user, client.id):
+        flash('Access denied.', 'error')
+        return redirect(url_for('provider_portal'))
     
     existing = ClientNote.query.filter_by(
         provider_id=current_user.id,
-        client_email=client_email
+        client_id=client.id
     ).first()
     
     if existing:
         existing.notes = notes
         existing.updated_at = datetime.utcnow()
+        existing.updated_by_provider_id = current_user.id
     else:
         note = ClientNote(
             provider_id=current_user.id,
-            client_email=client_email,
-            notes=notes
+            client_id=client.id,
+            notes=notes,
+            created_by_provider_id=current_user.id
         )
         db.session.add(note)
     
@@ -776,11 +855,80 @@ def provider_save_client_notes():
     flash('✓ Client notes saved', 'success')
     return redirect(url_for('provider_view_client_notes', client_email=client_email))
 
+CLIENT_SORTS = {
+    'value': Client.lifetime_value.desc(),
+    'visits': Client.visit_count.desc(),
+    'last_visit': Client.last_visit.desc().nulls_last(),
+    'name': Client.name.asc()
+}
+
+@app.route('/api/clients')
+@login_required
+@admin_required
+def api_clients():
+    """Clients with their visit counters, sorted by lifetime value by default"""
+    sort = request.args.get('sort', 'value')
+    if sort not in CLIENT_SORTS:
+        return jsonify({'status': 'error', 'message': f"sort must be one of {', '.join(CLIENT_SORTS)}"}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit and offset must be numbers'}), 400
+    
+    clients = Client.query.order_by(CLIENT_SORTS[sort], Client.id).limit(limit).offset(offset).all()
+    return jsonify({
+        'clients': [
+            {
+                'id': client.id,
+                'name': client.name,
+                'email': client.email,
+                'visit_count': client.visit_count or 0,
+                'first_visit': client.first_visit.isoformat() if client.first_visit else None,
+                'last_visit': client.last_visit.isoformat() if client.last_visit else None,
+                'lifetime_value': client.lifetime_value or 0.0
+            }
+            for client in clients
+        ]
+    })
+
+@app.route('/api/clients/<int:client_id>/timeline')
+@login_required
+def api_client_timeline(client_id):
+    """A client's intakes, appointments, SOAP notes, alerts and notes, newest first; follow next_cursor for older entries"""
+    if not can_view_client(current_user, client_id):
+        return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+    
+    try:
+        after = decode_timeline_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'cursor must come from next_cursor; limit must be a number'}), 400
+    kinds = [kind for kind in request.args.get('kind', '').split(',') if kind]
+    
+    rows, next_cursor = get_client_timeline(client_id, after, limit, kinds)
+    
+    return jsonify({
+        'events': [
+            {
+                'kind': row.kind,
+                'id': row.id,
+                'at': row.occurred_at.isoformat() if row.occurred_at else None,
+                'title': row.title,
+                'detail': row.detail,
+                'status': row.status,
+                'provider_id': row.provider_id
+            }
+            for row in rows
+        ],
+        'next_cursor': next_cursor
+    })
+
 @app.route('/provider/intake/<int:intake_id>/add-note', methods=['POST'])
 @login_required
 def provider_add_intake_note(intake_id):
     """Add note to specific appointment"""
-    intake = Intake.query.get_or_404(intake_id)
+    intake = db.get_or_404(Intake, intake_id)
     note = request.form.get('note')
     
     intake.provider_notes = note
@@ -836,6 +984,7 @@ def join_team():
         <p><em>The Tough Love Massage Team</em></p>
         """
         send_email(email, 'Application Received - Tough Love Massage', applicant_body)
+        db.session.commit()
         
         flash('✓ Thank you for your application! We will review it and get back to you soon.', 'success')
         return redirect(url_for('join_team'))
@@ -843,59 +992,189 @@ def join_team():
     return render_template('join_team.html')
 
 @app.route('/policies')
+@cached_page
 def policies():
     return render_template('policies.html')
 
 @app.route('/book')
+@cached_page
 def book():
     return render_template('book.html')
 
+@app.route('/metrics')
+def metrics():
+    """Per-endpoint request, SQL and template metrics in Prometheus text format, for METRICS_TOKEN or admins"""
+    token = os.environ.get('METRICS_TOKEN')
+    has_token = bool(token) and secrets.compare_digest(request.headers.get('Authorization', '').encode(),
+                                                       f'Bearer {token}'.encode())
+    if not has_token and not (current_user.is_authenticated and current_user.is_admin):
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    
+    stats = slot_cache.stats()
+    body = request_metrics.prometheus_text(
+        counters={'slot_cache': {key: stats.pop(key) for key in SLOT_CACHE_COUNTERS}},
+        gauges={'slot_cache': stats}
+    )
+    return body, 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/api/slots')
+def api_slots():
+    """Free start times for a treatment across all providers, optionally at one location"""
+    try:
+        treatment_id = int(request.args['treatment'])
+        location_id = int(request.args['location']) if request.args.get('location') else None
+        start_date = date.fromisoformat(request.args['from']) if request.args.get('from') else date.today()
+        end_date = date.fromisoformat(request.args['to']) if request.args.get('to') else start_date + timedelta(days=13)
+    except (KeyError, ValueError):
+        return jsonify({'status': 'error', 'message': 'treatment is required; from/to must be YYYY-MM-DD'}), 400
+    
+    if end_date < start_date or (end_date - start_date).days >= MAX_RANGE_DAYS:
+        return jsonify({'status': 'error', 'message': f'Date range must be 1-{MAX_RANGE_DAYS} days'}), 400
+    
+    treatment = Treatment.query.filter_by(id=treatment_id, active=True).first()
+    if not treatment:
+        return jsonify({'status': 'error', 'message': 'Unknown treatment'}), 404
+    
+    slots = find_free_slots(treatment, start_date, end_date, location_id=location_id,
+                            load_days=slot_cache.get_provider_days)
+    
+    return jsonify({
+        'treatment': {
+            'id': treatment.id,
+            'name': treatment.name,
+            'duration_minutes': treatment.duration_minutes
+        },
+        'from': start_date.isoformat(),
+        'to': end_date.isoformat(),
+        'slots': [
+            {
+                'date': day.isoformat(),
+                'times': [
+                    {'start': unit_to_str(unit), 'provider_ids': provider_ids}
+                    for unit, provider_ids in sorted(times.items())
+                ]
+            }
+            for day, times in sorted(slots.items())
+        ]
+    })
+
+@app.route('/api/providers/<int:provider_id>/appointments')
+@login_required
+def api_provider_appointments(provider_id):
+    """A provider's appointments as keyset-paginated JSON; follow next_cursor for the next page"""
+    if provider_id != current_user.id and not current_user.is_admin:
+        return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+    
+    try:
+        start_date = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        end_date = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'from/to must be YYYY-MM-DD; cursor must come from next_cursor'}), 400
+    statuses = [status for status in request.args.get('status', '').split(',') if status]
+    
+    rows, next_cursor = get_appointment_page(provider_id, start_date, end_date, statuses, after, limit)
+    
+    return jsonify({
+        'appointments': [
+            {
+                'id': row.id,
+                'date': row.appointment_date.isoformat(),
+                'start': row.start_time.strftime('%H:%M'),
+                'end': row.end_time.strftime('%H:%M') if row.end_time else None,
+                'status': row.status,
+                'client': {'id': row.client_id, 'name': row.client_name},
+                'treatment': {'id': row.treatment_id, 'name': row.treatment_name} if row.treatment_id else None
+            }
+            for row in rows
+        ],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/search')
+@login_required
+def api_search():
+    """Ranked search over clients, SOAP notes and client notes; providers only see their own clients"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'status': 'error', 'message': 'q is required'}), 400
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'limit must be a number'}), 400
+    kinds = [kind for kind in request.args.get('kind', '').split(',') if kind]
+    
+    provider_id = None if current_user.is_admin else current_user.id
+    results = search(query, provider_id, kinds, limit)
+    return jsonify({'query': query, 'results': results})
+
+@app.route('/api/appointments', methods=['POST'])
+@login_required
+def api_book_appointment():
+    """Book an appointment after checking availability, buffers and daily limits under a lock"""
+    data = request.get_json(silent=True) or {}
+    try:
+        provider_id = int(data.get('provider_id') or current_user.id)
+        client_id = int(data['client_id'])
+        treatment_id = int(data['treatment_id']) if data.get('treatment_id') else None
+        day = date.fromisoformat(data['date'])
+        start_time = datetime.strptime(data['start_time'], '%H:%M').time()
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'client_id, date (YYYY-MM-DD) and start_time (HH:MM) are required'}), 400
+    
+    # Providers book into their own schedule; only admins book for someone else
+    if provider_id != current_user.id and not current_user.is_admin:
+        return jsonify({'status': 'error', 'message': 'Access denied'}), 403
+    
+    if not db.session.get(Client, client_id):
+        return jsonify({'status': 'error', 'message': 'Unknown client'}), 404
+    
+    try:
+        appointment = book_appointment(
+            provider_id, client_id, day, start_time,
+            treatment_id=treatment_id,
+            notes=data.get('notes'),
+            created_by_provider_id=current_user.id
+        )
+    except BookingError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    
+    return jsonify({
+        'status': 'success',
+        'appointment_id': appointment.id,
+        'date': appointment.appointment_date.isoformat(),
+        'start_time': appointment.start_time.strftime('%H:%M'),
+        'end_time': appointment.end_time.strftime('%H:%M')
+    }), 201
+
 @app.route('/provider-portal')
 @login_required
 def provider_portal():
-    provider = Provider.query.get(current_user.id)
+    provider = db.session.get(Provider, current_user.id)
     today = date.today()
     tomorrow = today + timedelta(days=1)
     
     # Get today's and upcoming appointments
-    todays_appointments = Appointment.query.filter(
-        Appointment.provider_id == current_user.id,
-        Appointment.appointment_date == today,
-        Appointment.status.in_(['scheduled', 'confirmed'])
-    ).order_by(Appointment.start_time).all()
-    
-    upcoming_appointments = Appointment.query.filter(
-        Appointment.provider_id == current_user.id,
-        Appointment.appointment_date >= tomorrow,
-        Appointment.status.in_(['scheduled', 'confirmed'])
-    ).order_by(Appointment.appointment_date, Appointment.start_time).limit(10).all()
+    todays_appointments = get_todays_appointments(current_user.id, today)
+    upcoming_appointments = get_upcoming_appointments(current_user.id, tomorrow)
     
     # Get unconfirmed intakes
-    unconfirmed_intakes = Intake.query.filter_by(confirmed=False).all()
+    unconfirmed_intakes = get_unconfirmed_intakes()
     
     # Get recent SOAP notes
-    recent_soap_notes = SOAPNote.query.filter_by(provider_id=current_user.id).order_by(SOAPNote.created_at.desc()).limit(5).all()
+    recent_soap_notes = get_recent_soap_notes(current_user.id)
     
     # Get clients with active medical alerts
-    active_alerts = MedicalAlert.query.filter_by(is_active=True).join(Client).all()
-    
-    # Get stats
-    total_clients = Client.query.join(Appointment).filter(Appointment.provider_id == current_user.id).distinct().count()
-    total_appointments = Appointment.query.filter_by(provider_id=current_user.id).count()
-    completed_this_month = Appointment.query.filter(
-        Appointment.provider_id == current_user.id,
-        Appointment.status == 'completed',
-        Appointment.appointment_date >= date(today.year, today.month, 1)
-    ).count()
-    
-    # Get performance metrics for this month
-    month_metrics = PerformanceMetric.query.filter(
-        PerformanceMetric.provider_id == current_user.id,
-        PerformanceMetric.metric_date >= date(today.year, today.month, 1)
-    ).all()
-    
-    total_revenue_month = sum(m.total_revenue for m in month_metrics)
-    total_sessions_month = sum(m.sessions_completed for m in month_metrics)
+    active_alerts = get_active_alerts()
+    
+    # Get stats and this month's performance metrics in one query
+    stats = get_portal_stats(current_user.id, today)
+    
+    # Load alert counts for every client on the schedule in one query
+    alert_counts = get_active_alert_counts(
+        apt.client_id for apt in todays_appointments + upcoming_appointments
+    )
     
     return render_template('provider_portal.html', 
                          provider=provider,
@@ -904,21 +1183,21 @@ def provider_portal():
                          intakes=unconfirmed_intakes,
                          recent_soap_notes=recent_soap_notes,
                          active_alerts=active_alerts,
-                         total_clients=total_clients,
-                         total_appointments=total_appointments,
-                         completed_this_month=completed_this_month,
-                         total_revenue_month=total_revenue_month,
-                         total_sessions_month=total_sessions_month,
+                         total_clients=stats.total_clients,
+                         total_appointments=stats.total_appointments,
+                         completed_this_month=stats.completed_this_month,
+                         total_revenue_month=stats.total_revenue_month,
+                         total_sessions_month=stats.total_sessions_month,
+                         alert_counts=alert_counts,
                          today=today)
 
 @app.route('/confirm-intake/<int:intake_id>')
 @login_required
 def confirm_intake(intake_id):
-    intake = Intake.query.get_or_404(intake_id)
+    intake = db.get_or_404(Intake, intake_id)
     intake.confirmed = True
-    db.session.commit()
-    
     send_confirmation_email(intake)
+    db.session.commit()
     
     client_name = intake.client.name if intake.client else 'Unknown Client'
     flash(f'✓ Intake confirmed for {client_name} and notification email sent!', 'success')
@@ -932,9 +1211,10 @@ def login():
         
         provider = Provider.query.filter_by(username=username).first()
         
-        if provider and check_password_hash(provider.password_hash, password):
-            user = User(provider.id, provider.username)
+        if provider and provider.active is not False and check_password_hash(provider.password_hash, password):
+            user = User.from_provider(provider)
             login_user(user)
+            remember_identity(provider)
             flash('Login successful!', 'success')
             return redirect(url_for('provider_portal'))
         else:
@@ -946,64 +1226,254 @@ def login():
 @login_required
 def logout():
     logout_user()
+    forget_identity()
     flash('You have been logged out.', 'success')
     return redirect(url_for('home'))
 
 @app.route('/webhook/fullslate', methods=['POST'])
 def fullslate_webhook():
-    """Handle incoming bookings from FullSlate"""
+    """Store incoming FullSlate bookings; the webhook processor handles them in the background"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Expected a JSON object'}), 400
+    
     try:
-        data = request.json
-        
-        # Get or create client
-        client = get_or_create_client(
-            name=data.get('client_name'),
-            email=data.get('email'),
-            phone=data.get('phone')
-        )
-        
-        # Create intake associated with client
-        intake = Intake(
-            client_id=client.id,
-            medical_history=data.get('medical_history', ''),
-            pregnancy_stage=data.get('pregnancy_stage'),
-            booking_id=data.get('booking_id'),
-            confirmed=False
-        )
-        db.session.add(intake)
-        db.session.commit()
-        
-        # Send notifications to all providers
-        send_booking_notification(intake)
-        
-        # Send acknowledgment to client
-        client_body = f"""
-        <h2 style="color: #2c7a7b;">Booking Received!</h2>
-        <p>Dear {client.name},</p>
-        <p>Thank you for choosing Tough Love Massage. We've received your booking request and intake form.</p>
-        <div style="background: #fff3cd; padding: 15px; border-left: 4px solid #ffc107; margin: 20px 0;">
-            <p style="margin: 0;"><strong>⏳ Pending Confirmation</strong></p>
-            <p style="margin: 10px 0 0 0;">Our team is reviewing your information and will confirm your appointment shortly.</p>
-        </div>
-        <p>You'll receive a confirmation email once your appointment has been reviewed and approved.</p>
-        <p>If you have any questions, please don't hesitate to contact us.</p>
-        <p><em>The Tough Love Massage Team</em></p>
-        """
-        send_email(client.email, 'Booking Request Received - Tough Love Massage', client_body)
-        
-        return jsonify({'status': 'success', 'intake_id': intake.id}), 200
+        event_id, created = record_webhook_event(data)
     except Exception as e:
         print(f"Webhook error: {e}")
-        return jsonify({'status': 'error', 'message': str(e)}), 400
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    
+    return jsonify({'status': 'accepted' if created else 'duplicate', 'event_id': event_id}), 200
+
+# SQL statements each GET route may issue when rendered for an admin against seeded data
+QUERY_BUDGET_DEFAULT = 10
+QUERY_BUDGETS = {
+    'provider_portal': 12,
+    'admin_dashboard': 10,
+    'admin_reports': 10,
+}
+# Routes not rendered, and why
+QUERY_BUDGET_SKIP = {
+    'static': 'serves files, not pages',
+    'logout': 'ends the session',
+    'confirm_intake': 'GET changes data',
+}
+# Query strings that get a route past argument checks to its real queries; values name sample args
+QUERY_BUDGET_QUERY_ARGS = {
+    'api_search': {'q': 'search_term'},
+    'api_slots': {'treatment': 'treatment_id'},
+}
+
+def query_budget_sample_args(admin):
+    """Path and query argument values for the query-budget check, taken from the first matching rows"""
+    return {
+        'provider_id': admin.id,
+        'intake_id': db.session.query(Intake.id).order_by(Intake.id).limit(1).scalar(),
+        'client_email': db.session.query(Client.email).order_by(Client.id).limit(1).scalar(),
+        'client_id': db.session.query(Client.id).order_by(Client.id).limit(1).scalar(),
+        'treatment_id': db.session.query(Treatment.id).filter_by(active=True).order_by(Treatment.id).limit(1).scalar(),
+        'search_term': 'massage',
+        'fmt': 'csv',
+        # Import status is read from a checkpoint file; an unknown id still renders the route (as a 404)
+        'import_id': 'query-budget',
+    }
+
+def query_budget_targets(sample_args):
+    """(rule, url, skip reason) for every GET route; url is None when the route is skipped"""
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if 'GET' not in rule.methods:
+            continue
+        if rule.endpoint in QUERY_BUDGET_SKIP:
+            yield rule, None, QUERY_BUDGET_SKIP[rule.endpoint]
+            continue
+        query_args = QUERY_BUDGET_QUERY_ARGS.get(rule.endpoint, {})
+        needed = list(rule.arguments) + list(query_args.values())
+        missing = sorted(name for name in needed if sample_args.get(name) is None)
+        if missing:
+            yield rule, None, f"no sample data for {', '.join(missing)}"
+            continue
+        with app.test_request_context():
+            url = url_for(rule.endpoint, **{argument: sample_args[argument] for argument in rule.arguments},
+                          **{name: sample_args[sample] for name, sample in query_args.items()})
+        yield rule, url, None
+
+def measure_route_queries(client, url, endpoint):
+    """Status and SQL statement count of one GET, including queries a streamed body runs"""
+    before = request_metrics.queries(endpoint)
+    response = client.get(url)
+    response.get_data()
+    response.close()
+    return response.status_code, request_metrics.queries(endpoint) - before
+
+@app.cli.command('query-budget')
+@click.option('--mode', type=click.Choice(['log', 'raise']), default='raise',
+              help='How the N+1 detector reports repeated lazy loads while routes render.')
+def query_budget_command(mode):
+    """Render every GET route as an admin and check its SQL statement count against its budget"""
+    import sys
+    admin = Provider.query.filter_by(is_admin=True).order_by(Provider.id).first()
+    if not admin:
+        print("✗ query-budget needs an admin provider; run seed_data.py first")
+        sys.exit(1)
+    sample_args = query_budget_sample_args(admin)
+    db.session.commit()
+    
+    app.config['NPLUSONE_MODE'] = mode
+    # Measure real renders, not rendered-page cache hits
+    app.config['PAGE_CACHE'] = False
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+    
+    failures = 0
+    skipped = []
+    for rule, url, reason in query_budget_targets(sample_args):
+        if url is None:
+            print(f"  ⚠ {rule.rule:<45} skipped: {reason}")
+            skipped.append(rule.rule)
+            continue
+        status, queries = measure_route_queries(client, url, rule.endpoint)
+        budget = QUERY_BUDGETS.get(rule.endpoint, QUERY_BUDGET_DEFAULT)
+        ok = status < 500 and queries <= budget
+        failures += not ok
+        print(f"  {'✓' if ok else '✗'} {url:<45} {status}  {queries:>3} / {budget} queries")
+    
+    if skipped:
+        print(f"⚠ {len(skipped)} route(s) not checked: {', '.join(skipped)}")
+    if failures:
+        print(f"✗ {failures} route(s) failed or exceeded their query budget")
+        sys.exit(1)
+    print("✓ Every checked route is within its query budget")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint, precompress and resize static assets into static/dist"""
+    manifest = build_assets(app.static_folder)
+    variants = sum(len(files) for formats in manifest['images'].values() for files in formats.values())
+    print(f"✓ Built {len(manifest['files'])} asset(s) and {variants} image variant(s) into static/dist")
+
+@app.cli.command('prerender-pages')
+@click.option('--output', type=click.Path(file_okay=False), help='Also write the pages as static HTML files here.')
+def prerender_pages_command(output):
+    """Render the cached public pages, optionally to static HTML files"""
+    rendered = prerender_pages(app, output)
+    print(f"✓ Pre-rendered {len(rendered)} page(s)" + (f" to {output}" if output else ""))
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Recreate every search document from the clients, SOAP notes and client notes tables"""
+    ensure_search_schema()
+    count = rebuild_search_index()
+    print(f"✓ Indexed {count} search document(s)")
+
+@app.cli.command('reconcile-client-stats')
+def reconcile_client_stats_command():
+    """Recompute every client's visit count, first/last visit and lifetime value from completed appointments"""
+    corrected = reconcile_client_stats()
+    print(f"✓ Corrected visit counters for {corrected} client(s)")
+
+@app.cli.command('import-csv')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows per committed batch.')
+@click.option('--restart', is_flag=True, help='Ignore the checkpoint and start from the first row.')
+@click.option('--no-create-treatments', is_flag=True, help='Skip rows whose treatment is not on the menu instead of adding it.')
+def import_csv_command(path, chunk_size, restart, no_create_treatments):
+    """Import a client list or appointment export CSV, resuming from its checkpoint"""
+    state = import_csv(path, chunk_size=chunk_size, restart=restart,
+                       create_treatments=not no_create_treatments, progress=print_progress)
+    counts = state['stats']
+    print(f"✓ Imported {state['rows']:,} {state['kind']} rows: {counts['clients']:,} clients, "
+          f"{counts['appointments']:,} new appointments, {counts['duplicates']:,} already present, "
+          f"{counts['treatments_created']} treatments added")
+    if counts['skipped']:
+        print(f"⚠ Skipped {counts['skipped']:,} invalid rows")
+        for error in state['errors'][:20]:
+            print(f"    {error}")
+
+@app.cli.command('rollup-metrics')
+@click.option('--full', is_flag=True, help='Recompute every provider-day, not just changed ones.')
+@click.option('--interval', type=int, default=0, help='Keep running, rolling up every N seconds.')
+def rollup_metrics_command(full, interval):
+    """Roll completed/cancelled appointments up into daily performance metrics"""
+    days = run_rollup(full=full)
+    if days is None:
+        print("⚠ Another rollup is already running")
+    else:
+        print(f"✓ Recomputed performance metrics for {days} provider-days")
+    if interval:
+        run_periodically(app, 'rollup-metrics', run_rollup, interval)
+
+@app.cli.command('process-webhooks')
+@click.option('--interval', type=int, default=0, help='Keep running, polling for new events every N seconds.')
+def process_webhooks_command(interval):
+    """Turn stored FullSlate webhook events into clients, intakes and notifications"""
+    handled = process_webhook_queue()
+    print(f"✓ Processed {handled} webhook event(s)")
+    if interval:
+        run_periodically(app, 'webhook-processing', process_webhook_queue, interval)
+
+@app.cli.command('replay-webhooks')
+@click.option('--status', type=click.Choice(['processed', 'failed']), help='Only replay events with this status.')
+@click.option('--since', type=click.DateTime(), help='Only replay events received on or after this time.')
+@click.option('--event-id', 'event_ids', type=int, multiple=True, help='Replay specific events.')
+@click.option('--file', 'payload_file', type=click.File('r'), help='Ingest raw payloads from a JSON-lines file instead.')
+def replay_webhooks_command(status, since, event_ids, payload_file):
+    """Replay stored (or exported) FullSlate webhook events through the processor"""
+    if payload_file:
+        import json
+        created = duplicates = 0
+        for line in payload_file:
+            if line.strip():
+                _, is_new = record_webhook_event(json.loads(line))
+                created += is_new
+                duplicates += not is_new
+        print(f"✓ Stored {created} event(s), skipped {duplicates} duplicate(s)")
+    else:
+        count = requeue_events(status=status, since=since, event_ids=event_ids)
+        print(f"✓ Re-queued {count} event(s)")
+    handled = process_webhook_queue()
+    print(f"✓ Processed {handled} webhook event(s)")
+
+@app.cli.command('send-emails')
+@click.option('--interval', type=int, default=0, help='Keep running, polling the queue every N seconds.')
+def send_emails_command(interval):
+    """Deliver queued emails"""
+    sent = deliver_all()
+    print(f"✓ Delivered {sent} queued email(s)")
+    if interval:
+        run_periodically(app, 'email-delivery', deliver_pending, interval)
+
+@app.cli.command('smtp-stub')
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', type=int, default=8025)
+def smtp_stub_command(host, port):
+    """Run a local SMTP sink (use SMTP_SERVER=<host> SMTP_PORT=<port> SMTP_STARTTLS=0)"""
+    server = StubSMTPServer(host, port)
+    print(f"✓ Stub SMTP server listening on {host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
 
 with app.app_context():
     try:
         db.create_all()
+        # create_all() skips new indexes on tables that already exist
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
         print("✓ Database tables created/verified")
     except Exception as e:
         print(f"✗ Error creating tables: {e}")
         db.session.rollback()
     
+    try:
+        ensure_search_schema()
+    except Exception as e:
+        print(f"⚠ Error preparing search index: {e}")
+        db.session.rollback()
+    
     # Initialize default locations
     try:
         location_count = Location.query.count()
@@ -1099,5 +1569,11 @@ with app.app_context():
         print("Then restart the application.")
         print("="*70 + "\n")
 
+    if app.config['PAGE_CACHE'] and app.config['PAGE_CACHE_PRERENDER']:
+        try:
+            print(f"✓ Pre-rendered {len(prerender_pages(app))} public page(s)")
+        except Exception as e:
+            print(f"⚠ Page pre-rendering failed, pages will render on first hit: {e}")
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
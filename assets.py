@@ -0,0 +1,185 @@
+"""
+Static asset pipeline
+`flask build-assets` copies static/ into static/dist/ under content-hashed filenames,
+precompresses text assets to .gz and .br, and writes resized WebP/AVIF variants of the
+location images. Templates reference assets through asset_url() and friends, which read
+static/dist/manifest.json and fall back to the plain static URL when no build exists.
+Hashed files never change, so they are served with a one-year immutable Cache-Control.
+
+Brotli output needs the brotli package and image variants need Pillow (AVIF needs
+Pillow 11.2+); the build skips whatever is missing.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+from flask import current_app, request, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = features = None
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+SKIP_DIRS = {DIST_DIR, 'uploads'}
+
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html'}
+IMAGE_TYPES = {'.png', '.jpg', '.jpeg'}
+IMAGE_WIDTHS = (480, 960, 1440)
+IMAGE_FORMATS = (('avif', 'AVIF', {'quality': 55}), ('webp', 'WEBP', {'quality': 80, 'method': 6}))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def _hashed_name(relative, data):
+    stem, ext = os.path.splitext(relative)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+
+
+def _write(dist_root, relative, data):
+    path = os.path.join(dist_root, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def _precompress(path, data):
+    # mtime=0 keeps the .gz byte-identical between builds
+    with open(path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def _image_variants(dist_root, relative, source_path):
+    """Write resized WebP/AVIF copies; returns {format: [[width, hashed_name], ...]}"""
+    variants = {}
+    with Image.open(source_path) as image:
+        image.load()
+        widths = sorted({w for w in IMAGE_WIDTHS if w < image.width} | {image.width})
+        stem = os.path.splitext(relative)[0]
+        for extension, pil_format, options in IMAGE_FORMATS:
+            if not features.check(extension):
+                continue
+            for width in widths:
+                height = round(image.height * width / image.width)
+                resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, pil_format, **options)
+                data = buffer.getvalue()
+                hashed = _hashed_name(f"{stem}-{width}w.{extension}", data)
+                _write(dist_root, hashed, data)
+                variants.setdefault(extension, []).append([width, hashed])
+    return variants
+
+
+def build_assets(static_folder):
+    """Build static/dist and its manifest; returns the manifest"""
+    dist_root = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist_root, ignore_errors=True)
+    manifest = {'files': {}, 'images': {}}
+
+    sources = []
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            path = os.path.join(root, name)
+            sources.append((os.path.relpath(path, static_folder).replace(os.sep, '/'), path))
+
+    # Stylesheets last, so url('/static/...') references can point at hashed images
+    sources.sort(key=lambda item: (os.path.splitext(item[0])[1] == '.css', item[0]))
+    for relative, path in sources:
+        with open(path, 'rb') as f:
+            data = f.read()
+        extension = os.path.splitext(relative)[1].lower()
+        if extension == '.css':
+            data = _rewrite_css_urls(data, manifest['files'])
+        hashed = _hashed_name(relative, data)
+        written = _write(dist_root, hashed, data)
+        manifest['files'][relative] = hashed
+        if extension in COMPRESSIBLE:
+            _precompress(written, data)
+        if extension in IMAGE_TYPES and Image is not None:
+            manifest['images'][relative] = _image_variants(dist_root, relative, path)
+
+    with open(os.path.join(dist_root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    _manifest_cache.clear()
+    return manifest
+
+
+def _rewrite_css_urls(data, files):
+    def replace(match):
+        hashed = files.get(match.group(2))
+        if not hashed:
+            return match.group(0)
+        return f"url({match.group(1)}/static/{DIST_DIR}/{hashed}{match.group(1)})"
+    return re.sub(r"url\((['\"]?)/static/([^'\")]+)\1\)", replace, data.decode()).encode()
+
+
+_manifest_cache = {}
+
+
+def load_manifest():
+    """The built manifest, re-read whenever a new build replaces it"""
+    path = os.path.join(current_app.static_folder, DIST_DIR, MANIFEST_NAME)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {'files': {}, 'images': {}}
+    cached = _manifest_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = (mtime, json.load(f))
+        _manifest_cache[path] = cached
+    return cached[1]
+
+
+def _dist_url(hashed):
+    return url_for('static', filename=f'{DIST_DIR}/{hashed}')
+
+
+def asset_url(filename):
+    """url_for('static', filename=...) that prefers the fingerprinted build"""
+    hashed = load_manifest()['files'].get(filename)
+    return _dist_url(hashed) if hashed else url_for('static', filename=filename)
+
+
+def asset_image_set(filename):
+    """
+    CSS image-set() preferring AVIF, then WebP, then the original, for background images.
+    Background images can't use srcset, so the largest variant of each format is offered.
+    """
+    images = load_manifest()['images'].get(filename, {})
+    candidates = [
+        f'url("{_dist_url(images[image_format][-1][1])}") type("image/{image_format}")'
+        for image_format in ('avif', 'webp') if images.get(image_format)
+    ]
+    original_type = 'jpeg' if filename.lower().endswith(('.jpg', '.jpeg')) else 'png'
+    candidates.append(f'url("{asset_url(filename)}") type("image/{original_type}")')
+    return f"image-set({', '.join(candidates)})"
+
+
+def init_assets(app):
+    app.add_template_global(asset_url)
+    app.add_template_global(asset_image_set)
+
+    @app.after_request
+    def cache_fingerprinted_assets(response):
+        dist_prefix = f"{app.static_url_path}/{DIST_DIR}/"
+        if request.path.startswith(dist_prefix) and not request.path.endswith(MANIFEST_NAME) \
+                and response.status_code in (200, 304):
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
@@ -0,0 +1,135 @@
+"""
+Authentication helpers for the provider portal
+load_user() builds one User per request carrying everything the authorization checks need,
+so routes never look the provider up again just to read is_admin.
+
+The identity itself is cached in the signed session cookie and only revalidated against
+the providers table once its TTL expires, or immediately when this process has seen the
+provider's password, active flag or admin flag change.
+"""
+import hashlib
+import hmac
+import threading
+import time
+from functools import wraps
+from flask import current_app, request, session, redirect, url_for, flash, jsonify
+from flask_login import UserMixin, current_user
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import db, Provider
+
+SESSION_KEY = 'identity'
+
+# Provider fields that invalidate cached identities
+IDENTITY_FIELDS = ('password_hash', 'active', 'is_admin')
+
+# provider_id -> time.time() of the last identity-relevant change committed in this process
+_changed_at = {}
+_changed_lock = threading.Lock()
+
+
+class User(UserMixin):
+    def __init__(self, id, username, is_admin=False, location_id=None, active=True):
+        self.id = id
+        self.username = username
+        self.is_admin = bool(is_admin)
+        self.location_id = location_id
+        self.active = active is not False
+
+    @classmethod
+    def from_provider(cls, provider):
+        return cls(provider.id, provider.username, provider.is_admin, provider.location_id, provider.active)
+
+
+def identity_version(provider):
+    """
+    Stamp that changes whenever the password, active flag or admin flag changes.
+    Keyed by SECRET_KEY so the session cookie reveals nothing that could be checked against a password guess.
+    """
+    raw = f"{provider.password_hash}|{provider.active is not False}|{bool(provider.is_admin)}"
+    key = current_app.secret_key
+    if isinstance(key, str):
+        key = key.encode()
+    return hmac.new(key, raw.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def remember_identity(provider):
+    """Cache the provider's identity in the session; call on login"""
+    session[SESSION_KEY] = {
+        'id': provider.id,
+        'username': provider.username,
+        'is_admin': bool(provider.is_admin),
+        'location_id': provider.location_id,
+        'version': identity_version(provider),
+        'checked_at': time.time()
+    }
+
+
+def forget_identity():
+    session.pop(SESSION_KEY, None)
+
+
+def _cached_identity(user_id):
+    identity = session.get(SESSION_KEY)
+    if not identity or identity.get('id') != user_id:
+        return None, None
+    ttl = current_app.config.get('IDENTITY_TTL_SECONDS', 10)
+    with _changed_lock:
+        changed_at = _changed_at.get(user_id, 0)
+    if time.time() - identity['checked_at'] < ttl and identity['checked_at'] > changed_at:
+        return identity, identity
+    return None, identity
+
+
+def load_provider_user(user_id):
+    """Build the session User, querying providers only when the cached identity needs revalidating"""
+    user_id = int(user_id)
+    fresh, cached = _cached_identity(user_id)
+    if fresh:
+        return User(fresh['id'], fresh['username'], fresh['is_admin'], fresh['location_id'])
+
+    provider = db.session.get(Provider, user_id)
+    if not provider or provider.active is False or (cached and cached['version'] != identity_version(provider)):
+        # Password or role changed, deactivated or deleted: end the session
+        forget_identity()
+        return None
+    remember_identity(provider)
+    return User.from_provider(provider)
+
+
+def admin_required(view):
+    """Allow only admins; pages redirect with a flash message, form/API posts get a 403"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not current_user.is_authenticated or not current_user.is_admin:
+            if request.method == 'GET':
+                flash('Access denied. Admin privileges required.', 'error')
+                return redirect(url_for('provider_portal'))
+            return jsonify({'error': 'Access denied'}), 403
+        return view(*args, **kwargs)
+    return wrapped
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_identity_changes(session, flush_context):
+    """Remember providers whose cached identities this transaction invalidates"""
+    pending = session.info.setdefault('identity_pending', set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Provider):
+            if obj in session.deleted or any(inspect(obj).attrs[f].history.has_changes() for f in IDENTITY_FIELDS):
+                pending.add(obj.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_identity_changes(session):
+    changed = session.info.pop('identity_pending', ())
+    if changed:
+        now = time.time()
+        with _changed_lock:
+            for provider_id in changed:
+                _changed_at[provider_id] = now
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_identity_changes(session, previous_transaction):
+    session.info.pop('identity_pending', None)
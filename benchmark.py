@@ -0,0 +1,419 @@
+"""
+Benchmarks and stress tests for Tough Love Massage
+Point DATABASE_URL at a disposable database: each command creates (and removes) its own rows
+
+    python benchmark.py webhook-throughput --count 1000
+    python benchmark.py compression --requests 50
+    python benchmark.py search-latency --repeat 5
+    python benchmark.py load-test --seed --workers 4 --threads 16 --duration 60
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import or_
+from app import app, db, notify_new_intakes
+from models import Provider, Client, Appointment, Intake, WebhookEvent, OutboundEmail, SOAPNote
+from webhooks import process_all_pending
+from search import search
+from seed_data import generate_dataset, drop_dataset, scaled_counts, BENCH_DOMAIN, BENCH_PASSWORD
+
+SEARCH_QUERIES = ['shoulder', 'pain', 'back pain', 'deep tissue', 'lower back tension', 'sm', 'anna smith']
+SEARCH_TARGET_MS = 50
+
+# Relative weight of each route in the load-test mix
+LOAD_MIX = {
+    'provider_portal': 4,
+    'fullslate_webhook': 3,
+    'admin_reports': 1,
+    'admin_providers': 1,
+    'login': 1,
+}
+
+
+def webhook_throughput(count=1000, url=None):
+    """Measure how fast the webhook endpoint acknowledges bookings and how fast the processor drains them"""
+    print("\n=== WEBHOOK THROUGHPUT ===")
+    tag = f"webhook-{int(time.time())}"
+    payloads = [{
+        'booking_id': f'{tag}-{i}',
+        'client_name': f'Webhook Client {i % 200}',
+        'email': f'{tag}-{i % 200}@example.invalid',
+        'phone': '555-0100',
+        'medical_history': 'None',
+    } for i in range(count)]
+
+    if url:
+        import urllib.request
+
+        def post(payload):
+            req = urllib.request.Request(url, data=json.dumps(payload).encode(),
+                                         headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(req) as response:
+                return response.status
+    else:
+        client = app.test_client()
+
+        def post(payload):
+            return client.post('/webhook/fullslate', json=payload).status_code
+
+    latencies = []
+    failures = 0
+    started = time.perf_counter()
+    for payload in payloads:
+        sent = time.perf_counter()
+        if post(payload) != 200:
+            failures += 1
+        latencies.append(time.perf_counter() - sent)
+    ingest_elapsed = time.perf_counter() - started
+    duplicate_ok = post(payloads[0]) == 200
+
+    with app.app_context():
+        started = time.perf_counter()
+        processed = process_all_pending(notify=notify_new_intakes)
+        process_elapsed = time.perf_counter() - started
+
+        booking_ids = [payload['booking_id'] for payload in payloads]
+        intakes = Intake.query.filter(Intake.booking_id.in_(booking_ids)).count()
+
+        client_ids = [client_id for client_id, in db.session.query(Client.id).filter(Client.email.like(f'{tag}-%'))]
+        WebhookEvent.query.filter(WebhookEvent.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+        Intake.query.filter(Intake.booking_id.in_(booking_ids)).delete(synchronize_session=False)
+        # Client acknowledgments go to the tagged address; provider notifications mention it in the body
+        OutboundEmail.query.filter(
+            or_(OutboundEmail.to_email.like(f'{tag}-%'), OutboundEmail.html_body.contains(f'{tag}-')),
+            OutboundEmail.status == 'pending'
+        ).delete(synchronize_session=False)
+        Client.query.filter(Client.id.in_(client_ids)).delete(synchronize_session=False)
+        db.session.commit()
+
+    latencies.sort()
+    print(f"  Ingested: {count} webhooks in {ingest_elapsed:.2f}s ({count / ingest_elapsed:.0f}/s)")
+    print(f"  Ack latency: p50 {latencies[len(latencies) // 2] * 1000:.1f}ms  "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms")
+    print(f"  Processed: {processed} events in {process_elapsed:.2f}s ({processed / max(process_elapsed, 1e-9):.0f}/s)")
+    print(f"  Intakes created: {intakes}  Failed posts: {failures}")
+    if failures or intakes != count or not duplicate_ok:
+        print("✗ Some webhooks were lost, rejected or duplicated")
+        return False
+    print("✓ Every webhook produced exactly one intake")
+    return True
+
+
+def compression(requests=50):
+    """Bytes on the wire and CPU per request for each encoding, public and logged-in pages"""
+    print("\n=== RESPONSE COMPRESSION ===")
+    pages = ['/', '/holliston', '/worcester/services', '/policies', '/static/css/style.css', '/provider-portal']
+    client = app.test_client()
+    with app.app_context():
+        provider_id = db.session.query(Provider.id).order_by(Provider.is_admin.desc(), Provider.id).limit(1).scalar()
+    if provider_id is None:
+        print("✗ Needs at least one provider to benchmark /provider-portal")
+        return False
+    portal_client = app.test_client()
+    with portal_client.session_transaction() as session:
+        session['_user_id'] = str(provider_id)
+
+    print(f"  {'Path':<24}{'Encoding':<10}{'Bytes':>9}{'Ratio':>8}{'CPU ms/req':>12}")
+    ok = True
+    for path in pages:
+        http = portal_client if path == '/provider-portal' else client
+        http.get(path)  # warm template and page caches
+        baseline = None
+        for encoding in ('identity', 'gzip', 'br'):
+            sizes = []
+            started = time.process_time()
+            for _ in range(requests):
+                response = http.get(path, headers={'Accept-Encoding': encoding})
+                sizes.append(len(response.get_data()))
+            cpu_ms = (time.process_time() - started) * 1000 / requests
+            served = response.headers.get('Content-Encoding', 'identity')
+            if response.status_code != 200:
+                print(f"  ✗ {path} returned {response.status_code}")
+                ok = False
+                break
+            size = sizes[-1]
+            baseline = baseline or (size, cpu_ms)
+            print(f"  {path:<24}{served:<10}{size:>9}{size / baseline[0]:>8.2f}{cpu_ms:>12.2f}")
+    return ok
+
+
+def search_latency(repeat=5, queries=SEARCH_QUERIES):
+    """Median search() time per query as an admin and as the provider with the most clients"""
+    print("\n=== SEARCH LATENCY ===")
+    with app.app_context():
+        provider_id = db.session.query(Appointment.provider_id).group_by(Appointment.provider_id)\
+            .order_by(db.func.count(db.distinct(Appointment.client_id)).desc()).limit(1).scalar()
+        search('warm up')  # the SQLite index loads on first use
+        print(f"  {db.engine.dialect.name}, provider {provider_id}")
+        print(f"  {'Query':<24}{'Admin ms':>10}{'Provider ms':>13}{'Hits':>6}")
+        ok = True
+        for query in queries:
+            medians = []
+            for scope in (None, provider_id):
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    results = search(query, scope)
+                    timings.append((time.perf_counter() - started) * 1000)
+                medians.append(sorted(timings)[len(timings) // 2])
+            ok = ok and max(medians) < SEARCH_TARGET_MS
+            print(f"  {query:<24}{medians[0]:>10.1f}{medians[1]:>13.1f}{len(results):>6}")
+    if not ok:
+        print(f"✗ Some searches took {SEARCH_TARGET_MS} ms or more")
+        return False
+    print(f"✓ Every search took under {SEARCH_TARGET_MS} ms")
+    return True
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def _start_server(workers, port):
+    """Run gunicorn against main:app with background jobs off; returns (process, log file)"""
+    log = tempfile.NamedTemporaryFile(prefix='benchmark-server-', suffix='.log', delete=False)
+    env = dict(os.environ, BACKGROUND_JOBS='0', PAGE_CACHE_PRERENDER='0')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--workers', str(workers), '--bind', f'127.0.0.1:{port}', 'main:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+    return process, log
+
+
+def _wait_ready(http, url, process=None, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        try:
+            if http.get(f'{url}/login', timeout=2).status_code == 200:
+                return True
+        except http.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def load_test(url=None, workers=4, threads=16, duration=60, port=8765, output='benchmark-results.jsonl',
+              seed=False, dataset=None, drop=False):
+    """
+    Drive the portal, admin, login and webhook routes from concurrent sessions against a
+    gunicorn server and append per-route latency percentiles and throughput to output
+    """
+    import requests as http
+
+    print("\n=== LOAD TEST ===")
+    dataset = dataset or {}
+    with app.app_context():
+        if seed:
+            started = time.perf_counter()
+            generate_dataset(**dataset)
+            print(f"✓ Dataset generated in {time.perf_counter() - started:.1f}s")
+        providers = [username for username, in db.session.query(Provider.username)
+                     .filter(Provider.username.like(f'%@{BENCH_DOMAIN}')).order_by(Provider.id)]
+        row_counts = {
+            'providers': db.session.query(Provider.id).count(),
+            'clients': db.session.query(Client.id).count(),
+            'appointments': db.session.query(Appointment.id).count(),
+            'soap_notes': db.session.query(SOAPNote.id).count(),
+        }
+    if not providers:
+        print("✗ No benchmark providers found; run with --seed first")
+        return False
+    admin = providers[0]
+
+    process = log = None
+    if url is None:
+        url = f'http://127.0.0.1:{port}'
+        process, log = _start_server(workers, port)
+        print(f"  Starting gunicorn with {workers} workers on {url}")
+    url = url.rstrip('/')
+
+    tag = f"bench-load-{int(time.time())}"
+    samples = {route: [] for route in LOAD_MIX}
+    errors = Counter()
+    routes = [route for route, weight in LOAD_MIX.items() for _ in range(weight)]
+
+    def logged_in(username):
+        session = http.Session()
+        response = session.post(f'{url}/login', data={'username': username, 'password': BENCH_PASSWORD},
+                                 allow_redirects=False)
+        return session if response.status_code == 302 and 'login' not in response.headers.get('Location', '') \
+            else None
+
+    def run(index, deadline):
+        rng = random.Random(index)
+        provider_session = logged_in(providers[index % len(providers)])
+        admin_session = logged_in(admin)
+        if provider_session is None or admin_session is None:
+            errors['login'] += 1
+            return
+        count = 0
+        while time.time() < deadline:
+            route = rng.choice(routes)
+            sent = time.perf_counter()
+            try:
+                if route == 'provider_portal':
+                    ok = provider_session.get(f'{url}/provider-portal').status_code == 200
+                elif route == 'admin_reports':
+                    ok = admin_session.get(f'{url}/admin/reports').status_code == 200
+                elif route == 'admin_providers':
+                    ok = admin_session.get(f'{url}/admin/providers').status_code == 200
+                elif route == 'login':
+                    ok = logged_in(providers[rng.randrange(len(providers))]) is not None
+                else:
+                    count += 1
+                    ok = provider_session.post(f'{url}/webhook/fullslate', json={
+                        'booking_id': f'{tag}-{index}-{count}',
+                        'client_name': f'Load Client {count}',
+                        'email': f'{tag}-{index}-{count}@{BENCH_DOMAIN}',
+                        'phone': '555-0100',
+                    }).status_code == 200
+            except http.exceptions.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - sent
+            if ok:
+                samples[route].append(elapsed)
+            else:
+                errors[route] += 1
+
+    try:
+        if not _wait_ready(http, url, process):
+            print("✗ Server did not become ready")
+            if log is not None:
+                with open(log.name) as f:
+                    print(f.read()[-4000:])
+            return False
+        print(f"  Running {threads} sessions for {duration}s")
+        started = time.perf_counter()
+        deadline = time.time() + duration
+        pool = [threading.Thread(target=run, args=(i, deadline)) for i in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+            os.unlink(log.name)
+
+    results = {}
+    print(f"  {'Route':<20}{'Requests':>9}{'Errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'Mean ms':>9}{'Req/s':>8}")
+    for route, latencies in samples.items():
+        latencies.sort()
+        stats = {
+            'requests': len(latencies),
+            'errors': errors[route],
+            'p50_ms': _percentile(latencies, 0.50),
+            'p95_ms': _percentile(latencies, 0.95),
+            'p99_ms': _percentile(latencies, 0.99),
+            'mean_ms': sum(latencies) / len(latencies) if latencies else None,
+            'rps': len(latencies) / elapsed,
+        }
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'):
+            if stats[key] is not None:
+                stats[key] = round(stats[key] * 1000, 2)
+        stats['rps'] = round(stats['rps'], 2)
+        results[route] = stats
+        print(f"  {route:<20}{stats['requests']:>9}{stats['errors']:>8}{stats['p50_ms'] or 0:>9.1f}"
+              f"{stats['p95_ms'] or 0:>9.1f}{stats['p99_ms'] or 0:>9.1f}{stats['mean_ms'] or 0:>9.1f}{stats['rps']:>8.1f}")
+
+    record = {
+        'commit': _git_commit(),
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+        'server': {'url': url, 'workers': workers if process else None},
+        'threads': threads,
+        'duration_seconds': round(elapsed, 2),
+        'dataset': dict(dataset, rows=row_counts),
+        'routes': results,
+    }
+    with open(output, 'a') as f:
+        f.write(json.dumps(record, sort_keys=True) + '\n')
+    print(f"  Results appended to {output}")
+
+    with app.app_context():
+        WebhookEvent.query.filter(WebhookEvent.booking_id.like(f'{tag}-%')).delete(synchronize_session=False)
+        db.session.commit()
+        if drop:
+            drop_dataset()
+
+    if sum(errors.values()):
+        print(f"✗ {sum(errors.values())} requests failed")
+        return False
+    print("✓ Load test complete")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    webhooks = commands.add_parser('webhook-throughput', help='Post synthetic FullSlate webhooks and drain them')
+    webhooks.add_argument('--count', type=int, default=1000)
+    webhooks.add_argument('--url', help='POST to a running server instead of the in-process test client')
+
+    compress = commands.add_parser('compression', help='Compare bytes and CPU per request across encodings')
+    compress.add_argument('--requests', type=int, default=50)
+
+    searches = commands.add_parser('search-latency', help='Time search() against the current dataset')
+    searches.add_argument('--repeat', type=int, default=5)
+
+    load = commands.add_parser('load-test', help='Drive the main routes against gunicorn and record latency')
+    load.add_argument('--url', help='Test a running server instead of starting gunicorn')
+    load.add_argument('--workers', type=int, default=4, help='gunicorn workers')
+    load.add_argument('--port', type=int, default=8765)
+    load.add_argument('--threads', type=int, default=16, help='Concurrent client sessions')
+    load.add_argument('--duration', type=int, default=60, help='Seconds to run')
+    load.add_argument('--output', default='benchmark-results.jsonl', help='Results file; one JSON line per run')
+    load.add_argument('--seed', action='store_true', help='Generate the benchmark dataset first')
+    load.add_argument('--scale', type=int, help='Dataset size as in seed_data.py --scale; overrides the counts below')
+    load.add_argument('--providers', type=int, default=50)
+    load.add_argument('--clients', type=int, default=100_000)
+    load.add_argument('--appointments', type=int, default=1_000_000)
+    load.add_argument('--soap-notes', type=int, default=200_000)
+    load.add_argument('--random-seed', type=int, default=42)
+    load.add_argument('--drop', action='store_true', help='Remove the benchmark dataset afterwards')
+
+    args = parser.parse_args()
+    if args.command == 'webhook-throughput':
+        ok = webhook_throughput(args.count, args.url)
+    elif args.command == 'compression':
+        ok = compression(args.requests)
+    elif args.command == 'search-latency':
+        ok = search_latency(args.repeat)
+    elif args.command == 'load-test':
+        dataset = scaled_counts(args.scale) if args.scale else {
+            'providers': args.providers, 'clients': args.clients,
+            'appointments': args.appointments, 'soap_notes': args.soap_notes
+        }
+        dataset['seed'] = args.random_seed
+        ok = load_test(args.url, args.workers, args.threads, args.duration, args.port, args.output,
+                       args.seed, dataset if args.seed else None, args.drop)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
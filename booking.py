@@ -0,0 +1,104 @@
+"""
+Transactional appointment booking
+Bookings for a provider-day are serialized with a lock, then checked against the provider's
+treatments, availability, overlapping appointments, buffer time and daily limits in the same transaction
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError, IntegrityError
+from models import db, Provider, ProviderTreatment, Treatment, Appointment
+from slots import load_provider_days, to_unit
+
+MAX_ATTEMPTS = 5
+
+# serialization_failure, deadlock_detected, lock_not_available
+RETRYABLE_PGCODES = {'40001', '40P01', '55P03'}
+
+
+class BookingError(Exception):
+    """Raised when the requested time can't be booked"""
+
+
+def _lock_provider_day(provider_id, day):
+    """Block other bookings for this provider-day until the transaction ends"""
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(
+            text('SELECT pg_advisory_xact_lock(:provider_id, :day)'),
+            {'provider_id': provider_id, 'day': day.toordinal()}
+        )
+    else:
+        # No advisory locks elsewhere: a no-op UPDATE takes the provider's row (or SQLite's database) write lock
+        db.session.execute(
+            Provider.__table__.update().where(Provider.id == provider_id).values(id=Provider.id)
+        )
+
+
+def _is_retryable(error):
+    pgcode = getattr(error.orig, 'pgcode', None)
+    if pgcode in RETRYABLE_PGCODES:
+        return True
+    return 'database is locked' in str(error.orig)
+
+
+def book_appointment(provider_id, client_id, day, start_time, treatment_id=None, duration_minutes=60,
+                     status='scheduled', notes=None, fullslate_booking_id=None, created_by_provider_id=None):
+    """
+    Book an appointment if the provider is still free, retrying on serialization failures.
+    Returns the new Appointment or raises BookingError.
+    """
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        try:
+            _lock_provider_day(provider_id, day)
+
+            provider = db.session.get(Provider, provider_id)
+            if provider is None or provider.active is False:
+                raise BookingError('That provider is not taking bookings')
+            treatment = db.session.get(Treatment, treatment_id) if treatment_id else None
+            if treatment_id and not treatment:
+                raise BookingError('Unknown treatment')
+            # The same rule get_bookable_provider_ids() applies when offering slots
+            if treatment and not ProviderTreatment.query.filter_by(
+                    provider_id=provider_id, treatment_id=treatment.id).first():
+                raise BookingError(f'{provider.full_name} does not offer {treatment.name}')
+            duration = (treatment.duration_minutes if treatment else duration_minutes) or 60
+            end_time = (datetime.combine(day, start_time) + timedelta(minutes=duration)).time()
+            if end_time <= start_time:
+                raise BookingError('Appointments cannot run past midnight')
+
+            # Read the provider-day inside the lock rather than from the slot cache
+            provider_day = load_provider_days([provider_id], day, day)[(provider_id, day)]
+            start_unit = to_unit(start_time)
+            if not provider_day.fits(start_unit, to_unit(end_time, round_up=True) - start_unit):
+                raise BookingError('That time is no longer available')
+            if treatment and provider_day.at_limit(treatment.id):
+                raise BookingError(f'Daily limit reached for {treatment.name}')
+
+            appointment = Appointment(
+                provider_id=provider_id,
+                client_id=client_id,
+                treatment_id=treatment.id if treatment else None,
+                appointment_date=day,
+                start_time=start_time,
+                end_time=end_time,
+                duration_minutes=duration,
+                status=status,
+                notes=notes,
+                fullslate_booking_id=fullslate_booking_id,
+                created_by_provider_id=created_by_provider_id
+            )
+            db.session.add(appointment)
+            db.session.commit()
+            return appointment
+        except BookingError:
+            db.session.rollback()
+            raise
+        except IntegrityError:
+            db.session.rollback()
+            raise BookingError('That booking conflicts with an existing appointment')
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt == MAX_ATTEMPTS or not _is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
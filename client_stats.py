@@ -0,0 +1,158 @@
+"""
+Denormalized per-client visit counters
+Client.visit_count, first_visit, last_visit and lifetime_value are adjusted in the same
+transaction whenever an appointment moves into or out of 'completed' (or a completed
+appointment changes client, date or treatment). reconcile_client_stats() recomputes every
+client with one set-based UPDATE ... FROM for backfills and after bulk loads.
+"""
+from sqlalchemy import event, inspect, select, update, func, case, exists, or_, and_
+from sqlalchemy.orm import Session
+from models import db, Client, Appointment, Treatment
+
+COMPLETED = 'completed'
+COUNTER_FIELDS = ['visit_count', 'first_visit', 'last_visit', 'lifetime_value']
+
+# Appointment columns whose old value decides which counters a change affects
+TRACKED_FIELDS = ('status', 'client_id', 'appointment_date', 'treatment_id')
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the previous value even when the attribute was expired, so history always shows the transition
+for _field in TRACKED_FIELDS:
+    event.listen(getattr(Appointment, _field), 'set', _keep_old_value, active_history=True, retval=True)
+
+
+def _old_value(obj, attr):
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(obj, attr)
+
+
+def _visit(obj, old=False):
+    """(client_id, date, treatment_id) for an appointment that counts as a visit, else None"""
+    values = [_old_value(obj, f) if old else getattr(obj, f) for f in TRACKED_FIELDS]
+    status, client_id, appointment_date, treatment_id = values
+    if status != COMPLETED or client_id is None:
+        return None
+    return client_id, appointment_date, treatment_id
+
+
+@event.listens_for(Session, 'after_flush')
+def apply_visit_changes(session, flush_context):
+    """Adjust the counters of clients whose completed appointments this flush added or removed"""
+    added, removed = [], []
+    for obj in session.new:
+        if isinstance(obj, Appointment):
+            visit = _visit(obj)
+            if visit:
+                added.append(visit)
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            visit = _visit(obj, old=True)
+            if visit:
+                removed.append(visit)
+    for obj in session.dirty:
+        if not isinstance(obj, Appointment):
+            continue
+        before, after = _visit(obj, old=True), _visit(obj)
+        if before != after:
+            if before:
+                removed.append(before)
+            if after:
+                added.append(after)
+    if not added and not removed:
+        return
+
+    connection = session.connection()
+    treatment_ids = {visit[2] for visit in added + removed if visit[2] is not None}
+    prices = dict(connection.execute(
+        select(Treatment.id, Treatment.price).where(Treatment.id.in_(treatment_ids))
+    ).all()) if treatment_ids else {}
+
+    changes = {}
+    for sign, visits in ((1, added), (-1, removed)):
+        for client_id, appointment_date, treatment_id in visits:
+            change = changes.setdefault(client_id, {'visits': 0, 'value': 0.0, 'dates': [], 'removed': False})
+            change['visits'] += sign
+            change['value'] += sign * (prices.get(treatment_id) or 0.0)
+            if sign > 0:
+                change['dates'].append(appointment_date)
+            else:
+                change['removed'] = True
+
+    for client_id, change in changes.items():
+        values = {
+            'visit_count': func.coalesce(Client.visit_count, 0) + change['visits'],
+            'lifetime_value': func.coalesce(Client.lifetime_value, 0.0) + change['value'],
+        }
+        if change['removed']:
+            # A removed visit may have been the first or last one; re-read them from the appointments left
+            completed = and_(Appointment.client_id == client_id, Appointment.status == COMPLETED)
+            values['first_visit'] = select(func.min(Appointment.appointment_date)).where(completed).scalar_subquery()
+            values['last_visit'] = select(func.max(Appointment.appointment_date)).where(completed).scalar_subquery()
+        elif change['dates']:
+            earliest, latest = min(change['dates']), max(change['dates'])
+            values['first_visit'] = case(
+                (or_(Client.first_visit.is_(None), Client.first_visit > earliest), earliest), else_=Client.first_visit)
+            values['last_visit'] = case(
+                (or_(Client.last_visit.is_(None), Client.last_visit < latest), latest), else_=Client.last_visit)
+        connection.execute(update(Client).where(Client.id == client_id).values(**values))
+
+    session.info.setdefault('client_stats_changed', set()).update(changes)
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def expire_changed_counters(session, flush_context):
+    """Loaded Client objects would otherwise keep showing the counters from before the UPDATE"""
+    for client_id in session.info.pop('client_stats_changed', ()):
+        client = session.identity_map.get(inspect(Client).identity_key_from_primary_key((client_id,)))
+        if client is not None:
+            session.expire(client, COUNTER_FIELDS)
+
+
+def reconcile_client_stats():
+    """
+    Recompute every client's counters from their completed appointments.
+    Only rows that drifted are written. Returns the number of clients corrected.
+    """
+    completed = Appointment.status == COMPLETED
+    totals = select(
+        Appointment.client_id,
+        func.count(Appointment.id).label('visits'),
+        func.min(Appointment.appointment_date).label('first_visit'),
+        func.max(Appointment.appointment_date).label('last_visit'),
+        func.coalesce(func.sum(Treatment.price), 0.0).label('value')
+    ).outerjoin(Treatment, Treatment.id == Appointment.treatment_id)\
+     .where(completed)\
+     .group_by(Appointment.client_id)\
+     .subquery()
+
+    corrected = db.session.execute(
+        update(Client)
+        .where(Client.id == totals.c.client_id)
+        .where(or_(
+            Client.visit_count.is_distinct_from(totals.c.visits),
+            Client.first_visit.is_distinct_from(totals.c.first_visit),
+            Client.last_visit.is_distinct_from(totals.c.last_visit),
+            Client.lifetime_value.is_distinct_from(totals.c.value)
+        ))
+        .values(visit_count=totals.c.visits, first_visit=totals.c.first_visit,
+                last_visit=totals.c.last_visit, lifetime_value=totals.c.value),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+
+    # Clients whose completed appointments are all gone
+    corrected += db.session.execute(
+        update(Client)
+        .where(~exists().where(Appointment.client_id == Client.id, completed))
+        .where(or_(Client.visit_count.is_distinct_from(0), Client.lifetime_value.is_distinct_from(0.0),
+                   Client.first_visit.isnot(None), Client.last_visit.isnot(None)))
+        .values(visit_count=0, lifetime_value=0.0, first_visit=None, last_visit=None),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    db.session.commit()
+    return corrected
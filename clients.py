@@ -0,0 +1,123 @@
+"""
+Bulk client upsert
+Client records are written in batches with INSERT ... ON CONFLICT (email) DO UPDATE ... RETURNING,
+so each batch costs one round-trip and concurrent writers can't trip the unique email constraint.
+"""
+from datetime import datetime
+from sqlalchemy import func, select
+from models import db, Client
+from search import refresh_documents
+
+BATCH_SIZE = 500
+
+# Columns refreshed when an incoming record matches an existing email
+UPDATE_FIELDS = ('name', 'phone')
+
+
+def _dialect_insert():
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def normalize_email(email):
+    """Emails are matched case-insensitively, so they are stored trimmed and lowercased"""
+    return (email or '').strip().lower()
+
+
+def _normalize(records):
+    """Accept (name, email, phone) tuples or dicts and merge duplicates; later non-blank values win"""
+    rows = {}
+    for record in records:
+        if not isinstance(record, dict):
+            name, email, phone = (tuple(record) + (None,))[:3]
+            record = {'name': name, 'email': email, 'phone': phone}
+        email = normalize_email(record.get('email'))
+        if not email:
+            continue
+        record = {**record, 'email': email}
+        row = rows.setdefault(email, {})
+        row.update((key, value) for key, value in record.items() if value not in (None, '') or key not in row)
+    return rows
+
+
+def _upsert_batch(insert, rows, update):
+    # All rows in one statement must share the same columns
+    columns = sorted({key for row in rows for key in row})
+    values = [{column: row.get(column) for column in columns} for row in rows]
+    stmt = insert(Client).values(values)
+    if update:
+        # Blank incoming values never overwrite what is already stored
+        set_ = {
+            field: func.coalesce(func.nullif(stmt.excluded[field], ''), getattr(Client, field))
+            for field in UPDATE_FIELDS if field in columns
+        }
+        set_['updated_at'] = datetime.utcnow()
+    else:
+        # A no-op update still lets RETURNING report the existing row
+        set_ = {'email': stmt.excluded.email}
+    stmt = stmt.on_conflict_do_update(index_elements=[Client.email], set_=set_)
+    return db.session.execute(stmt.returning(Client.email, Client.id)).all()
+
+
+def _fallback_batch(rows, update):
+    existing = {client.email: client for client in Client.query.filter(Client.email.in_([row['email'] for row in rows]))}
+    for row in rows:
+        client = existing.get(row['email'])
+        if client is None:
+            client = Client(**row)
+            db.session.add(client)
+            existing[row['email']] = client
+        elif update:
+            for field in UPDATE_FIELDS:
+                if row.get(field) and getattr(client, field) != row[field]:
+                    setattr(client, field, row[field])
+    db.session.flush()
+    return [(email, client.id) for email, client in existing.items()]
+
+
+def upsert_clients(records, batch_size=BATCH_SIZE, update=True, commit=False):
+    """
+    Insert or update clients keyed by email and return {email: client_id}, emails normalized.
+    records are (name, email, phone) tuples or dicts of Client columns; extra columns are only
+    used for new clients. With update=False existing clients are left untouched.
+    Client objects already loaded in the session are not refreshed.
+    """
+    rows = _normalize(records)
+    insert = _dialect_insert()
+    ids = {}
+    # Sorted emails keep concurrent batches locking rows in the same order
+    emails = sorted(rows)
+    for start in range(0, len(emails), batch_size):
+        batch = [rows[email] for email in emails[start:start + batch_size]]
+        if insert is not None:
+            result = _upsert_batch(insert, batch, update)
+        else:
+            result = _fallback_batch(batch, update)
+        ids.update(result)
+    if insert is not None and ids:
+        # Core upserts skip the ORM flush events that keep search documents current
+        refresh_documents(db.session, 'client', ids.values())
+    if commit:
+        db.session.commit()
+    return ids
+
+
+def upsert_client(name, email, phone=None, commit=False):
+    """Upsert a single client and return its id"""
+    return upsert_clients([(name, email, phone)], commit=commit).get(normalize_email(email))
+
+
+def load_clients(client_ids):
+    """Load clients by id in one query, refreshing any stale copies in the session"""
+    if not client_ids:
+        return {}
+    clients = db.session.execute(
+        select(Client).where(Client.id.in_(set(client_ids))).execution_options(populate_existing=True)
+    ).scalars()
+    return {client.id: client for client in clients}
@@ -0,0 +1,227 @@
+"""
+Response compression middleware
+Negotiates brotli or gzip from Accept-Encoding and compresses text responses as they
+stream. Small bodies, already-encoded responses and non-text types pass through untouched.
+Static files with a prebuilt .br/.gz sibling (see assets.py) are answered with the
+sibling instead of being compressed on every request.
+"""
+import os
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml',
+                      'image/svg+xml')
+SIBLING_EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header"""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header, available=None):
+    """Best of br/gzip the client accepts, or None for identity"""
+    accepted = parse_accept_encoding(header)
+    available = available or (('br', 'gzip') if brotli is not None else ('gzip',))
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Compressor:
+    def __init__(self, encoding, gzip_level, brotli_quality):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+            self.compress = self._compressor.process
+            self.flush = self._compressor.finish
+        else:
+            # wbits=31 writes a gzip header and trailer
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self.compress = self._compressor.compress
+            self.flush = self._compressor.flush
+
+
+def _weak(etag):
+    # The encoded body differs from the original, so a strong validator no longer applies
+    return etag if etag.startswith('W/') else f'W/{etag}'
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size=512, gzip_level=6, brotli_quality=4,
+                 static_folder=None, static_url_path='/static'):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.static_folder = static_folder
+        self.static_prefix = static_url_path.rstrip('/') + '/'
+
+    def __call__(self, environ, start_response):
+        # HEAD has no body to encode, so it is answered exactly as the app answers it
+        if environ.get('REQUEST_METHOD') not in ('GET', 'POST') or environ.get('HTTP_RANGE'):
+            return self.app(environ, start_response)
+        header = environ.get('HTTP_ACCEPT_ENCODING', '')
+        encoding = choose_encoding(header)
+
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            return _no_write
+
+        app_iter = self.app(environ, capture)
+
+        sibling = self._static_sibling(environ, header)
+        if sibling and captured['status'].startswith('200'):
+            _close(app_iter)
+            return self._send_sibling(sibling, captured, environ, start_response)
+
+        headers = captured['headers']
+        if encoding is None or not self._compressible(captured['status'], headers):
+            if self._compressible(captured['status'], headers):
+                _add_vary(headers)
+            start_response(captured['status'], headers, captured['exc_info'])
+            return app_iter
+
+        length = _header(headers, 'Content-Length')
+        if length is not None and int(length) < self.min_size:
+            _add_vary(headers)
+            start_response(captured['status'], headers, captured['exc_info'])
+            return app_iter
+
+        return self._compress(app_iter, encoding, captured, start_response)
+
+    def _compressible(self, status, headers):
+        code = status.split(' ', 1)[0]
+        if code in ('204', '206', '304') or code.startswith('1'):
+            return False
+        if _header(headers, 'Content-Encoding'):
+            return False
+        if 'no-transform' in (_header(headers, 'Cache-Control') or ''):
+            return False
+        content_type = (_header(headers, 'Content-Type') or '').lower()
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _compress(self, app_iter, encoding, captured, start_response):
+        iterator = iter(app_iter)
+        # Read just enough to know whether the body clears min_size
+        head, size = [], 0
+        for chunk in iterator:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= self.min_size:
+                break
+        else:
+            headers = captured['headers']
+            _add_vary(headers)
+            start_response(captured['status'], headers, captured['exc_info'])
+            _close(app_iter)
+            return head
+
+        headers = [(name, value) for name, value in captured['headers']
+                   if name.lower() != 'content-length']
+        headers = [(name, _weak(value) if name.lower() == 'etag' else value) for name, value in headers]
+        headers.append(('Content-Encoding', encoding))
+        _add_vary(headers)
+        start_response(captured['status'], headers, captured['exc_info'])
+        return self._stream(head, iterator, app_iter, _Compressor(encoding, self.gzip_level, self.brotli_quality))
+
+    def _stream(self, head, iterator, app_iter, compressor):
+        try:
+            for chunk in head:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            for chunk in iterator:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            _close(app_iter)
+
+    def _static_sibling(self, environ, header):
+        """Path of a precompressed sibling for a static file request, if one exists"""
+        path = environ.get('PATH_INFO', '')
+        if not self.static_folder or not path.startswith(self.static_prefix) or '..' in path:
+            return None
+        filename = os.path.join(self.static_folder, path[len(self.static_prefix):])
+        available = [coding for coding, extension in SIBLING_EXTENSIONS.items()
+                     if os.path.isfile(filename + extension)]
+        encoding = choose_encoding(header, available) if available else None
+        if encoding is None:
+            return None
+        return encoding, filename + SIBLING_EXTENSIONS[encoding]
+
+    def _send_sibling(self, sibling, captured, environ, start_response):
+        encoding, path = sibling
+        size = os.path.getsize(path)
+        headers = [(name, _weak(value) if name.lower() == 'etag' else value)
+                   for name, value in captured['headers'] if name.lower() != 'content-length']
+        headers += [('Content-Encoding', encoding), ('Content-Length', str(size))]
+        _add_vary(headers)
+        start_response(captured['status'], headers, captured['exc_info'])
+        wrapper = environ.get('wsgi.file_wrapper')
+        f = open(path, 'rb')
+        if wrapper:
+            return wrapper(f, CHUNK_SIZE)
+        return _read_file(f)
+
+
+def _read_file(f):
+    with f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _no_write(data):
+    raise RuntimeError('CompressionMiddleware does not support the WSGI write() callable')
+
+
+def _header(headers, name):
+    name = name.lower()
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+def _add_vary(headers):
+    for index, (key, value) in enumerate(headers):
+        if key.lower() == 'vary':
+            if 'accept-encoding' not in value.lower():
+                headers[index] = (key, f'{value}, Accept-Encoding')
+            return
+    headers.append(('Vary', 'Accept-Encoding'))
+
+
+def _close(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close:
+        close()
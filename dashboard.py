@@ -0,0 +1,191 @@
+"""
+Data access helpers for the provider portal dashboard
+Each helper loads everything a portal section needs in a fixed number of queries
+"""
+import base64
+from dataclasses import dataclass
+from datetime import date, time
+from sqlalchemy import func, select, and_, true, tuple_
+from sqlalchemy.orm import joinedload, contains_eager
+from models import db, Client, Treatment, Intake, Appointment, SOAPNote, MedicalAlert, PerformanceMetric
+
+OPEN_STATUSES = ('scheduled', 'confirmed')
+MAX_PAGE_SIZE = 200
+
+
+@dataclass(frozen=True)
+class PortalStats:
+    """Headline numbers shown on the provider portal"""
+    total_clients: int = 0
+    total_appointments: int = 0
+    completed_this_month: int = 0
+    total_revenue_month: float = 0.0
+    total_sessions_month: int = 0
+
+
+def get_todays_appointments(provider_id, day):
+    """Open appointments for a provider on one day, with client and treatment loaded"""
+    return Appointment.query.options(
+        joinedload(Appointment.client),
+        joinedload(Appointment.treatment)
+    ).filter(
+        Appointment.provider_id == provider_id,
+        Appointment.appointment_date == day,
+        Appointment.status.in_(OPEN_STATUSES)
+    ).order_by(Appointment.start_time).all()
+
+
+def get_upcoming_appointments(provider_id, start_date, limit=10):
+    """Next open appointments from start_date onwards, with client and treatment loaded"""
+    return Appointment.query.options(
+        joinedload(Appointment.client),
+        joinedload(Appointment.treatment)
+    ).filter(
+        Appointment.provider_id == provider_id,
+        Appointment.appointment_date >= start_date,
+        Appointment.status.in_(OPEN_STATUSES)
+    ).order_by(Appointment.appointment_date, Appointment.start_time).limit(limit).all()
+
+
+def get_unconfirmed_intakes():
+    """Intakes awaiting confirmation, with client loaded"""
+    return Intake.query.options(
+        joinedload(Intake.client)
+    ).filter_by(confirmed=False).all()
+
+
+def get_recent_soap_notes(provider_id, limit=5):
+    """Most recent SOAP notes written by a provider, with client loaded"""
+    return SOAPNote.query.options(
+        joinedload(SOAPNote.client)
+    ).filter_by(provider_id=provider_id).order_by(SOAPNote.created_at.desc()).limit(limit).all()
+
+
+def get_active_alerts():
+    """Active medical alerts, with client populated from the same join"""
+    return MedicalAlert.query.join(MedicalAlert.client).options(
+        contains_eager(MedicalAlert.client)
+    ).filter(MedicalAlert.is_active.is_(True)).all()
+
+
+def get_active_alert_counts(client_ids):
+    """
+    Count active medical alerts for many clients in one grouped query.
+    Returns {client_id: count} with an entry (possibly 0) for every requested id.
+    """
+    client_ids = {cid for cid in client_ids if cid is not None}
+    if not client_ids:
+        return {}
+
+    # (client_id, is_active) is covered by idx_alert_client_active
+    rows = db.session.query(
+        MedicalAlert.client_id,
+        func.count(MedicalAlert.id)
+    ).filter(
+        MedicalAlert.client_id.in_(client_ids),
+        MedicalAlert.is_active.is_(True)
+    ).group_by(MedicalAlert.client_id).all()
+
+    counts = dict.fromkeys(client_ids, 0)
+    counts.update({client_id: count for client_id, count in rows})
+    return counts
+
+
+def get_portal_stats(provider_id, today):
+    """
+    Compute the portal's headline stats for a provider in a single SQL statement.
+    Appointment counts use conditional aggregation; monthly revenue and sessions
+    come from the performance_metrics rollup, cross joined as a one-row subquery.
+    """
+    month_start = today.replace(day=1)
+
+    appointment_totals = select(
+        func.count(func.distinct(Appointment.client_id)).label('total_clients'),
+        func.count(Appointment.id).label('total_appointments'),
+        func.count(Appointment.id).filter(and_(
+            Appointment.status == 'completed',
+            Appointment.appointment_date >= month_start
+        )).label('completed_this_month')
+    ).where(Appointment.provider_id == provider_id).subquery()
+
+    metric_totals = select(
+        func.coalesce(func.sum(PerformanceMetric.total_revenue), 0.0).label('total_revenue_month'),
+        func.coalesce(func.sum(PerformanceMetric.sessions_completed), 0).label('total_sessions_month')
+    ).where(
+        PerformanceMetric.provider_id == provider_id,
+        PerformanceMetric.metric_date >= month_start
+    ).subquery()
+
+    row = db.session.execute(
+        select(appointment_totals, metric_totals).select_from(
+            appointment_totals.join(metric_totals, true())
+        )
+    ).one()
+
+    return PortalStats(
+        total_clients=row.total_clients,
+        total_appointments=row.total_appointments,
+        completed_this_month=row.completed_this_month,
+        total_revenue_month=float(row.total_revenue_month),
+        total_sessions_month=int(row.total_sessions_month)
+    )
+
+
+def encode_cursor(appointment_date, start_time, appointment_id):
+    """Opaque keyset cursor pointing just after one appointment"""
+    raw = f"{appointment_date.isoformat()}|{start_time.isoformat()}|{appointment_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError for anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        day, start, appointment_id = raw.split('|')
+        return date.fromisoformat(day), time.fromisoformat(start), int(appointment_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def get_appointment_page(provider_id, start_date=None, end_date=None, statuses=None, after=None, limit=50):
+    """
+    One page of a provider's appointments in (appointment_date, start_time, id) order.
+    Seeks past the `after` key instead of using OFFSET, so every page costs the same;
+    client and treatment names come from the same statement.
+    Returns (rows, next_cursor) where next_cursor is None on the last page.
+    """
+    key = tuple_(Appointment.appointment_date, Appointment.start_time, Appointment.id)
+    query = select(
+        Appointment.id,
+        Appointment.appointment_date,
+        Appointment.start_time,
+        Appointment.end_time,
+        Appointment.status,
+        Appointment.client_id,
+        Client.name.label('client_name'),
+        Appointment.treatment_id,
+        Treatment.name.label('treatment_name')
+    ).outerjoin(Client, Client.id == Appointment.client_id)\
+     .outerjoin(Treatment, Treatment.id == Appointment.treatment_id)\
+     .where(Appointment.provider_id == provider_id)
+
+    # Range filters lead with appointment_date so idx_appointment_provider_date drives the scan
+    if start_date:
+        query = query.where(Appointment.appointment_date >= start_date)
+    if end_date:
+        query = query.where(Appointment.appointment_date <= end_date)
+    if statuses:
+        query = query.where(Appointment.status.in_(statuses))
+    if after:
+        query = query.where(Appointment.appointment_date >= after[0], key > tuple_(*after))
+
+    rows = db.session.execute(
+        query.order_by(Appointment.appointment_date, Appointment.start_time, Appointment.id).limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.appointment_date, last.start_time, last.id)
+    return rows, next_cursor
@@ -0,0 +1,164 @@
+"""
+Streaming exports for admin reports
+Rows come from a server-side cursor (yield_per) one batch at a time and are encoded as
+they arrive, so memory stays flat however many appointments match. CSV and JSON Lines
+need nothing extra; Parquet needs pyarrow and is unavailable without it.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from sqlalchemy import select
+from models import db, Appointment, Provider, Client, Treatment, Location
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXPORT_BATCH_SIZE = 5000
+
+# (name, column, parquet type name)
+APPOINTMENT_COLUMNS = (
+    ('id', Appointment.id, 'int64'),
+    ('appointment_date', Appointment.appointment_date, 'date32'),
+    ('start_time', Appointment.start_time, 'time'),
+    ('end_time', Appointment.end_time, 'time'),
+    ('duration_minutes', Appointment.duration_minutes, 'int64'),
+    ('status', Appointment.status, 'string'),
+    ('confirmed', Appointment.confirmed, 'bool_'),
+    ('provider_id', Appointment.provider_id, 'int64'),
+    ('provider_name', Provider.full_name, 'string'),
+    ('location_id', Provider.location_id, 'int64'),
+    ('location_name', Location.name, 'string'),
+    ('client_id', Appointment.client_id, 'int64'),
+    ('client_name', Client.name, 'string'),
+    ('client_email', Client.email, 'string'),
+    ('treatment_id', Appointment.treatment_id, 'int64'),
+    ('treatment_name', Treatment.name, 'string'),
+    ('price', Treatment.price, 'float64'),
+    ('created_at', Appointment.created_at, 'timestamp'),
+)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def appointment_export_query(start=None, end=None, location_id=None):
+    """Appointments with provider, location, client and treatment details, oldest first"""
+    query = select(*[column.label(name) for name, column, _ in APPOINTMENT_COLUMNS])\
+        .join(Provider, Provider.id == Appointment.provider_id)\
+        .join(Client, Client.id == Appointment.client_id)\
+        .outerjoin(Treatment, Treatment.id == Appointment.treatment_id)\
+        .outerjoin(Location, Location.id == Provider.location_id)
+    if start:
+        query = query.where(Appointment.appointment_date >= start)
+    if end:
+        query = query.where(Appointment.appointment_date <= end)
+    if location_id:
+        query = query.where(Provider.location_id == location_id)
+    return query.order_by(Appointment.appointment_date, Appointment.start_time, Appointment.id)
+
+
+def parquet_available():
+    return pyarrow is not None
+
+
+def _batches(query, batch_size):
+    result = db.session.execute(query.execution_options(yield_per=batch_size))
+    try:
+        yield from result.partitions()
+    finally:
+        result.close()
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(names, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _jsonl_chunks(names, batches):
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(names, map(_json_value, row)))) + '\n' for row in rows)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain()"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_type(name):
+    if name == 'time':
+        return pyarrow.time64('us')
+    if name == 'timestamp':
+        return pyarrow.timestamp('us')
+    return getattr(pyarrow, name)()
+
+
+def _parquet_chunks(columns, batches):
+    """One row group per batch, flushed to the response as soon as it is written"""
+    schema = pyarrow.schema([(name, _parquet_type(kind)) for name, _, kind in columns])
+    sink = _ChunkSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression='snappy')
+    try:
+        for rows in batches:
+            writer.write_batch(pyarrow.RecordBatch.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(zip(*rows), schema)],
+                schema=schema
+            ))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(query, fmt, columns=APPOINTMENT_COLUMNS, batch_size=EXPORT_BATCH_SIZE):
+    """Generator of encoded chunks for one export; fmt is a key of EXPORT_FORMATS"""
+    batches = _batches(query, batch_size)
+    names = [name for name, _, _ in columns]
+    if fmt == 'csv':
+        return _csv_chunks(names, batches)
+    if fmt == 'jsonl':
+        return _jsonl_chunks(names, batches)
+    if fmt == 'parquet':
+        if not parquet_available():
+            raise RuntimeError('Parquet export needs pyarrow installed')
+        return _parquet_chunks(columns, batches)
+    raise ValueError(f'Unknown export format: {fmt}')
@@ -0,0 +1,329 @@
+"""
+Bulk CSV import of clients and historical appointments
+Files are read in chunks; each chunk is validated, its providers, treatments and clients are
+resolved through in-memory lookups, and its rows are written with batched multi-row inserts
+and committed. A JSON checkpoint next to the file records how far the import got, so an
+interrupted import resumes after the last committed chunk. Appointment inserts skip rows that
+already exist (same booking id, or same provider and start time), so replaying a chunk is safe.
+
+A file with an appointment_date column is an appointment export (one row per booking, carrying
+its client); anything else is a client list.
+"""
+import csv
+import itertools
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from sqlalchemy import select, insert
+from models import db, Appointment, Treatment, Provider
+from clients import upsert_clients
+from slot_cache import slot_cache
+from client_stats import reconcile_client_stats
+
+CHUNK_SIZE = 5000
+MAX_REPORTED_ERRORS = 100
+
+STATUSES = ('scheduled', 'confirmed', 'completed', 'cancelled')
+
+# Header names seen in FullSlate and other booking-system exports, mapped to ours
+HEADER_ALIASES = {
+    'email': 'client_email', 'customer_email': 'client_email',
+    'name': 'client_name', 'client': 'client_name', 'customer': 'client_name', 'customer_name': 'client_name',
+    'phone': 'client_phone', 'customer_phone': 'client_phone',
+    'date': 'appointment_date', 'time': 'start_time', 'start': 'start_time', 'end': 'end_time',
+    'duration': 'duration_minutes', 'service': 'treatment', 'treatment_name': 'treatment',
+    'staff': 'provider', 'employee': 'provider', 'provider_email': 'provider', 'provider_name': 'provider',
+    'booking_id': 'fullslate_booking_id', 'price': 'treatment_price',
+}
+
+# Optional Client columns copied from a client list when present
+CLIENT_FIELDS = ('preferred_pressure', 'focus_areas', 'allergies', 'music_preference',
+                 'temperature_preference', 'aromatherapy_preference')
+
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%m/%d/%y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M%p', '%I:%M:%S %p')
+
+
+def _normalize_header(name):
+    key = (name or '').strip().lower().replace(' ', '_').replace('-', '_')
+    return HEADER_ALIASES.get(key, key)
+
+
+def _parse(value, formats, convert, label):
+    value = (value or '').strip()
+    try:
+        return convert(datetime.fromisoformat(value))
+    except ValueError:
+        pass
+    for fmt in formats:
+        try:
+            return convert(datetime.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError(f'{label} {value!r} is not a recognised format' if value else f'{label} is required')
+
+
+# History repeats the same few thousand dates and times, so parsed values are memoized
+@lru_cache(maxsize=65536)
+def _parse_date(value, label='appointment_date'):
+    return _parse(value, DATE_FORMATS, datetime.date, label)
+
+
+@lru_cache(maxsize=4096)
+def _parse_time(value, label='start_time'):
+    return _parse(value, TIME_FORMATS, datetime.time, label)
+
+
+def _client_record(row, full=False):
+    email = (row.get('client_email') or '').strip().lower()
+    if not email or '@' not in email:
+        raise ValueError('client_email is missing or invalid')
+    record = {
+        'email': email,
+        'name': (row.get('client_name') or '').strip() or email,
+        'phone': (row.get('client_phone') or '').strip() or None,
+    }
+    if full:
+        if row.get('date_of_birth'):
+            record['date_of_birth'] = _parse_date(row['date_of_birth'], 'date_of_birth')
+        for field in CLIENT_FIELDS:
+            if row.get(field):
+                record[field] = row[field].strip()
+    return record
+
+
+class Lookups:
+    """Provider, treatment and client ids by natural key, loaded once and grown as the import goes"""
+
+    def __init__(self, create_treatments=True):
+        self.providers = {}
+        for provider in db.session.execute(select(Provider.id, Provider.username, Provider.email, Provider.full_name)):
+            for key in (provider.username, provider.email, provider.full_name, str(provider.id)):
+                if key:
+                    self.providers.setdefault(key.strip().lower(), provider.id)
+        self.treatments = {
+            name.strip().lower(): (treatment_id, duration)
+            for treatment_id, name, duration in db.session.execute(
+                select(Treatment.id, Treatment.name, Treatment.duration_minutes))
+        }
+        self.clients = {}
+        self.create_treatments = create_treatments
+        self.created_treatments = 0
+
+    def provider(self, value):
+        provider_id = self.providers.get((value or '').strip().lower())
+        if provider_id is None:
+            raise ValueError(f'unknown provider {value!r}' if value else 'provider is required')
+        return provider_id
+
+    def treatment(self, row):
+        """(id, duration) for the row's treatment, creating treatments the menu no longer has"""
+        name = (row.get('treatment') or '').strip()
+        if not name:
+            return None, None
+        found = self.treatments.get(name.lower())
+        if found is None:
+            if not self.create_treatments:
+                raise ValueError(f'unknown treatment {name!r}')
+            price = float(row['treatment_price']) if row.get('treatment_price') else None
+            duration = int(row['duration_minutes']) if row.get('duration_minutes') else 60
+            treatment = Treatment(name=name, price=price, duration_minutes=duration, active=False)
+            db.session.add(treatment)
+            db.session.flush()
+            found = self.treatments[name.lower()] = (treatment.id, duration)
+            self.created_treatments += 1
+        return found
+
+
+def _appointment_row(row, lookups):
+    """Validated appointment values plus its client record; raises ValueError for bad rows"""
+    client = _client_record(row)
+    provider_id = lookups.provider(row.get('provider'))
+    day = _parse_date(row.get('appointment_date'))
+    start = _parse_time(row.get('start_time'))
+    treatment_id, treatment_duration = lookups.treatment(row)
+    try:
+        duration = int(row['duration_minutes']) if row.get('duration_minutes') else (treatment_duration or 60)
+    except ValueError:
+        raise ValueError(f"duration_minutes {row['duration_minutes']!r} is not a number")
+    if row.get('end_time'):
+        end = _parse_time(row['end_time'], 'end_time')
+    else:
+        end = (datetime.combine(day, start) + timedelta(minutes=duration)).time()
+
+    status = (row.get('status') or '').strip().lower().replace('canceled', 'cancelled')
+    if not status:
+        status = 'completed' if day < datetime.now().date() else 'scheduled'
+    if status not in STATUSES:
+        raise ValueError(f'status must be one of {", ".join(STATUSES)}')
+
+    return client, {
+        'provider_id': provider_id,
+        'client_email': client['email'],
+        'treatment_id': treatment_id,
+        'appointment_date': day,
+        'start_time': start,
+        'end_time': end,
+        'duration_minutes': duration,
+        'status': status,
+        'confirmed': status in ('confirmed', 'completed'),
+        'notes': (row.get('notes') or '').strip() or None,
+        'fullslate_booking_id': (row.get('fullslate_booking_id') or '').strip() or None,
+    }
+
+
+def _insert_appointments(rows):
+    """Multi-row insert that skips appointments already present; returns how many were new"""
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        db.session.execute(insert(Appointment), rows)
+        return len(rows)
+    stmt = dialect_insert(Appointment).on_conflict_do_nothing().returning(Appointment.id)
+    return len(db.session.execute(stmt, rows).all())
+
+
+def _import_clients(chunk, lookups, stats, errors):
+    records = []
+    for line, row in chunk:
+        try:
+            records.append(_client_record(row, full=True))
+        except ValueError as e:
+            _record_error(stats, errors, line, e)
+    lookups.clients.update(upsert_clients(records, update=True))
+    stats['clients'] += len(records)
+
+
+def _import_appointments(chunk, lookups, stats, errors):
+    clients, rows = {}, []
+    for line, row in chunk:
+        try:
+            client, appointment = _appointment_row(row, lookups)
+        except ValueError as e:
+            _record_error(stats, errors, line, e)
+            continue
+        if client['email'] not in lookups.clients:
+            clients.setdefault(client['email'], client)
+        rows.append(appointment)
+
+    if clients:
+        # History never overwrites the contact details of clients that already exist
+        lookups.clients.update(upsert_clients(clients.values(), update=False))
+        stats['clients'] += len(clients)
+    for appointment in rows:
+        appointment['client_id'] = lookups.clients[appointment.pop('client_email')]
+    if rows:
+        inserted = _insert_appointments(rows)
+        stats['appointments'] += inserted
+        stats['duplicates'] += len(rows) - inserted
+
+
+def _record_error(stats, errors, line, error):
+    stats['skipped'] += 1
+    if len(errors) < MAX_REPORTED_ERRORS:
+        errors.append(f'line {line}: {error}')
+
+
+def checkpoint_path(path):
+    return f'{path}.checkpoint'
+
+
+def read_checkpoint(path):
+    """Progress saved for an import of path, or None"""
+    try:
+        with open(checkpoint_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_checkpoint(path, state):
+    temporary = checkpoint_path(path) + '.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(state, f)
+    os.replace(temporary, checkpoint_path(path))
+
+
+def print_progress(state):
+    stats = state['stats']
+    print(f"  … {state['rows']:,} rows ({state['rows_per_second']:,.0f}/s): {stats['clients']:,} clients, "
+          f"{stats['appointments']:,} appointments, {stats['duplicates']:,} duplicates, {stats['skipped']:,} skipped")
+
+
+def import_csv(path, chunk_size=CHUNK_SIZE, restart=False, create_treatments=True, progress=print_progress):
+    """
+    Import a client list or appointment export, resuming from its checkpoint unless restart.
+    Returns the final checkpoint state: rows read, per-kind counts, the first errors and whether it finished.
+    On failure the checkpoint records the error and keeps the last committed chunk.
+    """
+    source = os.stat(path)
+    state = None if restart else read_checkpoint(path)
+    if state and (state['source_size'] != source.st_size or state['source_mtime'] != source.st_mtime):
+        print(f"⚠ {path} changed since its checkpoint; starting over")
+        state = None
+    if state and state.get('finished'):
+        return state
+    if state is None:
+        state = {
+            'source_size': source.st_size, 'source_mtime': source.st_mtime, 'rows': 0, 'finished': False,
+            'stats': {'clients': 0, 'appointments': 0, 'duplicates': 0, 'skipped': 0, 'treatments_created': 0},
+            'errors': [], 'rows_per_second': 0.0
+        }
+    state.pop('failed', None)
+    try:
+        _import_rows(path, state, chunk_size, create_treatments, progress)
+    except Exception as e:
+        db.session.rollback()
+        # Counts from the failed chunk were rolled back with it
+        state = read_checkpoint(path) or state
+        state['failed'] = str(e)
+        _write_checkpoint(path, state)
+        raise
+
+    # Core inserts skip the ORM events behind the slot cache and client counters.
+    # Search documents were refreshed by upsert_clients; rollups pick new appointments up by updated_at.
+    if state['kind'] == 'appointments':
+        slot_cache.invalidate_all()
+        reconcile_client_stats()
+    state['finished'] = True
+    _write_checkpoint(path, state)
+    return state
+
+
+def _import_rows(path, state, chunk_size, create_treatments, progress):
+    stats, errors = state['stats'], state['errors']
+    lookups = Lookups(create_treatments=create_treatments)
+
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [_normalize_header(name) for name in next(reader, [])]
+        if 'appointment_date' in header:
+            kind, import_chunk = 'appointments', _import_appointments
+        elif 'client_email' in header:
+            kind, import_chunk = 'clients', _import_clients
+        else:
+            raise ValueError('CSV needs an email column (client list) or an appointment_date column (appointments)')
+        state['kind'] = kind
+
+        rows = ((reader.line_num, dict(zip(header, values))) for values in reader if any(values))
+        # Rows up to the checkpoint were committed by an earlier run
+        rows = itertools.islice(rows, state['rows'], None)
+        started, done_at_start = time.monotonic(), state['rows']
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            created_before = lookups.created_treatments
+            import_chunk(chunk, lookups, stats, errors)
+            db.session.commit()
+            stats['treatments_created'] += lookups.created_treatments - created_before
+            state['rows'] += len(chunk)
+            state['rows_per_second'] = (state['rows'] - done_at_start) / max(time.monotonic() - started, 1e-6)
+            _write_checkpoint(path, state)
+            if progress:
+                progress(state)
@@ -0,0 +1,239 @@
+"""
+Request instrumentation
+Records SQL statement count and time, template render time and total latency for every
+request. Each response reports them in X-Query-Count and Server-Timing headers; per-endpoint
+totals are exposed in Prometheus text format for /metrics, and slow requests are logged
+with the statements they ran.
+
+Totals are per process: under gunicorn each worker reports its own numbers.
+
+With NPLUSONE_MODE=log or raise, repeated lazy loads of the same relationship within one
+request are reported (or raised as NPlusOneError) along with the template line or
+application frame that triggered them.
+"""
+import bisect
+import os
+import sys
+import threading
+import time
+from flask import current_app, g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LOGGED_QUERIES = 200
+
+
+class RequestMetrics:
+    """Per-endpoint counters and latency histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._endpoints = {}
+
+    def record(self, endpoint, method, status, latency, query_count, db_time, template_time):
+        with self._lock:
+            key = (endpoint, method, str(status))
+            self._requests[key] = self._requests.get(key, 0) + 1
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = {
+                    'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'latency': 0.0,
+                    'queries': 0, 'db_time': 0.0, 'template_time': 0.0
+                }
+            index = bisect.bisect_left(LATENCY_BUCKETS, latency)
+            if index < len(LATENCY_BUCKETS):
+                stats['buckets'][index] += 1
+            stats['count'] += 1
+            stats['latency'] += latency
+            stats['queries'] += query_count
+            stats['db_time'] += db_time
+            stats['template_time'] += template_time
+
+    def queries(self, endpoint):
+        """SQL statements recorded for an endpoint so far"""
+        with self._lock:
+            return self._endpoints.get(endpoint, {}).get('queries', 0)
+
+    def prometheus_text(self, counters=None, gauges=None):
+        """
+        Everything recorded so far in Prometheus exposition format, plus extra
+        {prefix: {name: value}} counters (exported as <prefix>_<name>_total) and gauges
+        """
+        with self._lock:
+            requests = dict(self._requests)
+            endpoints = {name: dict(stats, buckets=list(stats['buckets'])) for name, stats in self._endpoints.items()}
+
+        lines = [
+            '# HELP http_requests_total Requests handled, by endpoint, method and status.',
+            '# TYPE http_requests_total counter'
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Request latency, by endpoint.',
+            '# TYPE http_request_duration_seconds histogram'
+        ]
+        for endpoint, stats in sorted(endpoints.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats['buckets']):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {stats["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["latency"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats["count"]}')
+
+        for name, field, help_text in (
+            ('http_request_db_queries_total', 'queries', 'SQL statements executed, by endpoint.'),
+            ('http_request_db_seconds_total', 'db_time', 'Time spent executing SQL, by endpoint.'),
+            ('http_request_template_seconds_total', 'template_time', 'Time spent rendering templates, by endpoint.'),
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            for endpoint, stats in sorted(endpoints.items()):
+                value = stats[field]
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {value:.6f}' if isinstance(value, float)
+                             else f'{name}{{endpoint="{endpoint}"}} {value}')
+
+        for kind, suffix, groups in (('counter', '_total', counters), ('gauge', '', gauges)):
+            for prefix, values in (groups or {}).items():
+                for key, value in sorted(values.items()):
+                    if isinstance(value, (int, float)):
+                        lines.append(f'# TYPE {prefix}_{key}{suffix} {kind}')
+                        lines.append(f'{prefix}_{key}{suffix} {float(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+def _tracking():
+    return has_request_context() and 'query_count' in g
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if _tracking():
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    if not _tracking():
+        return
+    started = conn.info.get('query_started')
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    g.query_count += 1
+    g.db_time += elapsed
+    if len(g.queries) < MAX_LOGGED_QUERIES:
+        g.queries.append((elapsed, ' '.join(statement.split())))
+
+
+def _template_started(sender, template, context, **extra):
+    if _tracking():
+        g.template_started.append(time.perf_counter())
+
+
+def _template_finished(sender, template, context, **extra):
+    if _tracking() and g.template_started:
+        g.template_time += time.perf_counter() - g.template_started.pop()
+
+
+class NPlusOneError(Exception):
+    """Raised in NPLUSONE_MODE=raise when a request repeats the same lazy load"""
+
+
+def _load_site():
+    """Innermost template line, or failing that application frame, that is running right now"""
+    app_frame = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        template = frame.f_globals.get('__jinja_template__')
+        if template is not None:
+            return f"{template.filename or template.name}:{template.get_corresponding_lineno(frame.f_lineno)}"
+        filename = frame.f_code.co_filename
+        if app_frame is None and 'site-packages' not in filename and not filename.startswith(sys.prefix) \
+                and not filename.endswith('instrumentation.py'):
+            app_frame = f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return app_frame or 'unknown location'
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def detect_repeated_lazy_loads(orm_execute_state):
+    if not orm_execute_state.is_select:
+        return
+    parent = orm_execute_state.lazy_loaded_from
+    if parent is None or not _tracking() or 'lazy_loads' not in g:
+        return
+    mode = current_app.config.get('NPLUSONE_MODE', 'off')
+    if mode not in ('log', 'raise'):
+        return
+    # Same parent class and same SQL means the same relationship loaded for another row
+    key = (parent.class_.__name__, str(orm_execute_state.statement))
+    count = g.lazy_loads.get(key, 0) + 1
+    g.lazy_loads[key] = count
+    if count != current_app.config.get('NPLUSONE_THRESHOLD', 2):
+        return
+    target = orm_execute_state.bind_mapper.class_.__name__ if orm_execute_state.bind_mapper else '?'
+    message = (f"N+1 query: {key[0]} -> {target} lazy-loaded repeatedly in {request.endpoint} "
+               f"at {_load_site()}")
+    if mode == 'raise':
+        raise NPlusOneError(message)
+    print(f"⚠ {message}")
+
+
+def init_instrumentation(app):
+    app.config.setdefault('SLOW_REQUEST_MS', int(os.environ.get('SLOW_REQUEST_MS', '500')))
+    app.config.setdefault('SERVER_TIMING', os.environ.get('SERVER_TIMING', '1') == '1')
+    # off | log | raise
+    app.config.setdefault('NPLUSONE_MODE', os.environ.get('NPLUSONE_MODE', 'off'))
+    app.config.setdefault('NPLUSONE_THRESHOLD', int(os.environ.get('NPLUSONE_THRESHOLD', '2')))
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.db_time = 0.0
+        g.template_time = 0.0
+        g.template_started = []
+        g.queries = []
+        g.lazy_loads = {}
+
+    @app.after_request
+    def record_request(response):
+        if 'request_started' not in g:
+            return response
+        latency = time.perf_counter() - g.request_started
+        endpoint = request.endpoint or 'unmatched'
+        if response.is_streamed:
+            # A streamed body runs its queries after this hook; record the request once it is sent
+            request_globals = g._get_current_object()
+            method, status = request.method, response.status_code
+            response.call_on_close(lambda: request_metrics.record(
+                endpoint, method, status, time.perf_counter() - request_globals.request_started,
+                request_globals.query_count, request_globals.db_time, request_globals.template_time
+            ))
+        else:
+            request_metrics.record(endpoint, request.method, response.status_code, latency,
+                                   g.query_count, g.db_time, g.template_time)
+
+        # Statements run so far; a streamed body's own queries only reach the per-endpoint totals
+        response.headers['X-Query-Count'] = str(g.query_count)
+        if app.config['SERVER_TIMING']:
+            response.headers['Server-Timing'] = (
+                f'db;dur={g.db_time * 1000:.1f};desc="{g.query_count} queries", '
+                f'tpl;dur={g.template_time * 1000:.1f}, '
+                f'total;dur={latency * 1000:.1f}'
+            )
+
+        if latency * 1000 >= app.config['SLOW_REQUEST_MS']:
+            print(f"⚠ Slow request: {request.method} {request.path} ({endpoint}) {latency * 1000:.0f}ms, "
+                  f"{g.query_count} queries in {g.db_time * 1000:.0f}ms, templates {g.template_time * 1000:.0f}ms")
+            for elapsed, statement in g.queries:
+                print(f"    {elapsed * 1000:7.1f}ms  {statement[:300]}")
+        return response
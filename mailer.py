@@ -0,0 +1,276 @@
+"""
+Outbound email queue
+Request handlers only enqueue messages into outbound_emails. A delivery worker claims
+batches, sends them over one reused authenticated SMTP connection, and retries
+failures with exponential backoff.
+"""
+import base64
+import os
+import smtplib
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from models import db, OutboundEmail
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 30
+
+
+def render_email_html(body):
+    """Wrap an HTML fragment in the branded email layout"""
+    return f"""
+        <!DOCTYPE html>
+        <html>
+        <head>
+            <meta charset="UTF-8">
+            <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        </head>
+        <body style="font-family: 'Montserrat', Arial, sans-serif; line-height: 1.6; color: #333; max-width: 600px; margin: 0 auto; padding: 20px;">
+            <div style="background: linear-gradient(135deg, #2c7a7b 0%, #1a4d4d 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0;">
+                <h1 style="margin: 0; font-family: 'Playfair Display', serif; font-size: 28px;">Tough Love Massage</h1>
+                <p style="margin: 10px 0 0 0; font-size: 14px; opacity: 0.9;">Discover Ultimate Rejuvenation</p>
+            </div>
+            <div style="background: #ffffff; padding: 30px; border: 1px solid #e0f2f1; border-top: none; border-radius: 0 0 10px 10px;">
+                {body}
+            </div>
+            <div style="text-align: center; margin-top: 20px; padding: 20px; color: #666; font-size: 12px;">
+                <p>Tough Love Massage | Downtown Studio & Suburban Retreat</p>
+                <p style="margin: 5px 0;">
+                    <a href="mailto:info@toughlovemassage.com" style="color: #2c7a7b; text-decoration: none;">Contact Us</a> |
+                    <a href="https://toughlovemassage.com/policies" style="color: #2c7a7b; text-decoration: none;">Privacy Policy</a>
+                </p>
+            </div>
+        </body>
+        </html>
+        """
+
+
+def enqueue_emails(messages, commit=False):
+    """Queue (to_email, subject, body) tuples for background delivery, in the caller's transaction unless commit"""
+    emails = [
+        OutboundEmail(to_email=to_email, subject=subject, html_body=render_email_html(body))
+        for to_email, subject, body in messages
+        if to_email
+    ]
+    db.session.add_all(emails)
+    if commit:
+        db.session.commit()
+    return emails
+
+
+def enqueue_email(to_email, subject, body, commit=False):
+    """Queue a single HTML email for background delivery"""
+    return enqueue_emails([(to_email, subject, body)], commit=commit)
+
+
+class SMTPConnectionPool:
+    """Keeps one authenticated SMTP connection open between batches and reconnects when it drops"""
+
+    def __init__(self, server, port, username, password, starttls=True, idle_timeout=60):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self._connection = None
+        self._last_used = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            server=os.environ.get('SMTP_SERVER', 'smtp.gmail.com'),
+            port=int(os.environ.get('SMTP_PORT', '587')),
+            username=os.environ.get('SMTP_USERNAME', 'no-reply@toughlovemassage.com'),
+            password=os.environ.get('SMTP_PASSWORD', ''),
+            starttls=os.environ.get('SMTP_STARTTLS', '1') == '1'
+        )
+
+    @property
+    def dev_mode(self):
+        # With no credentials and no explicit server, log messages instead of sending them
+        return not self.password and not os.environ.get('SMTP_SERVER')
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.server, self.port, timeout=30)
+        connection.ehlo()
+        if self.starttls:
+            connection.starttls()
+            connection.ehlo()
+        if self.password:
+            connection.login(self.username, self.password)
+        return connection
+
+    def _get(self):
+        if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            try:
+                self._connection.noop()
+            except smtplib.SMTPException:
+                self.close()
+        if self._connection is None:
+            self._connection = self._connect()
+        return self._connection
+
+    def send(self, message):
+        with self._lock:
+            try:
+                self._get().send_message(message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # The server dropped an idle connection; reconnect once and resend
+                self.close()
+                self._get().send_message(message)
+            self._last_used = time.monotonic()
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except Exception:
+                pass
+            self._connection = None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool.from_env()
+        return _pool
+
+
+def _build_message(email, sender):
+    message = MIMEMultipart('alternative')
+    message['From'] = f"Tough Love Massage <{sender}>"
+    message['To'] = email.to_email
+    message['Subject'] = email.subject
+    message.attach(MIMEText(email.html_body, 'html'))
+    return message
+
+
+def deliver_pending(pool=None, batch_size=BATCH_SIZE):
+    """
+    Send one batch of due emails. Rows are claimed with FOR UPDATE SKIP LOCKED so
+    several workers can drain the queue without sending anything twice.
+    Returns the number of emails sent.
+    """
+    pool = pool or get_pool()
+    now = datetime.utcnow()
+    batch = OutboundEmail.query.filter(
+        OutboundEmail.status == 'pending',
+        OutboundEmail.next_attempt_at <= now
+    ).order_by(OutboundEmail.id).limit(batch_size).with_for_update(skip_locked=True).all()
+
+    sent = 0
+    for email in batch:
+        email.attempts = (email.attempts or 0) + 1
+        try:
+            if pool.dev_mode:
+                print(f"📧 [DEV MODE] Email would be sent to {email.to_email}")
+                print(f"   Subject: {email.subject}")
+            else:
+                pool.send(_build_message(email, pool.username))
+            email.status = 'sent'
+            email.sent_at = datetime.utcnow()
+            email.last_error = None
+            sent += 1
+        except Exception as e:
+            pool.close()
+            email.last_error = str(e)
+            if email.attempts >= MAX_ATTEMPTS:
+                email.status = 'failed'
+                print(f"✗ Giving up on email to {email.to_email} after {email.attempts} attempts: {e}")
+            else:
+                email.next_attempt_at = datetime.utcnow() + timedelta(
+                    seconds=BACKOFF_BASE_SECONDS * 2 ** (email.attempts - 1)
+                )
+                print(f"⚠ Email to {email.to_email} failed (attempt {email.attempts}), retrying later: {e}")
+
+    db.session.commit()
+    if sent and not pool.dev_mode:
+        print(f"✓ Sent {sent} queued email(s)")
+    return sent
+
+
+def deliver_all(pool=None, batch_size=BATCH_SIZE):
+    """Drain every due email, batch by batch"""
+    total = 0
+    while True:
+        sent = deliver_pending(pool, batch_size)
+        total += sent
+        if sent < batch_size:
+            return total
+
+
+class _StubSMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP (EHLO, AUTH, MAIL, RCPT, DATA) to accept messages from smtplib"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply('220 localhost stub SMTP ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250-localhost')
+                self.reply('250 AUTH PLAIN LOGIN')
+            elif verb == 'AUTH':
+                if command.upper().startswith('AUTH LOGIN'):
+                    self.reply('334 ' + base64.b64encode(b'Username:').decode())
+                    self.rfile.readline()
+                    self.reply('334 ' + base64.b64encode(b'Password:').decode())
+                    self.rfile.readline()
+                self.reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip('<> '), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip('<> '))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                self.server.messages.append({'from': sender, 'to': recipients, 'data': b''.join(lines)})
+                print(f"📨 Stub SMTP received message from {sender} to {', '.join(recipients)}")
+                self.reply('250 OK: queued')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    """Local SMTP sink for development: accepts any login and keeps messages in memory"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=8025):
+        super().__init__((host, port), _StubSMTPHandler)
+        self.messages = []
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='stub-smtp', daemon=True)
+        thread.start()
+        return thread
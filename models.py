@@ -11,6 +11,9 @@ db = SQLAlchemy(model_class=Base)
 
 class Client(db.Model):
     __tablename__ = 'clients'
+    __table_args__ = (
+        db.Index('idx_client_lifetime_value', 'lifetime_value'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
@@ -45,6 +48,9 @@ class Client(db.Model):
 
 class Intake(db.Model):
     __tablename__ = 'intakes'
+    __table_args__ = (
+        db.Index('idx_intake_client', 'client_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey('clients.id'), nullable=False)
@@ -163,6 +169,9 @@ class ProviderDailyLimit(db.Model):
 
 class ClientNote(db.Model):
     __tablename__ = 'client_notes'
+    __table_args__ = (
+        db.Index('idx_client_note_client', 'client_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     provider_id = db.Column(db.Integer, db.ForeignKey('providers.id'), nullable=False)
@@ -200,6 +209,9 @@ class Appointment(db.Model):
         db.UniqueConstraint('provider_id', 'appointment_date', 'start_time', name='_provider_datetime_uc'),
         db.Index('idx_appointment_date_status', 'appointment_date', 'status'),
         db.Index('idx_appointment_provider_date', 'provider_id', 'appointment_date'),
+        db.Index('idx_appointment_client_date', 'client_id', 'appointment_date'),
+        # rollups.run_rollup() finds the appointments changed since its last run by updated_at
+        db.Index('idx_appointment_updated_at', 'updated_at'),
     )
     
     id = db.Column(db.Integer, primary_key=True)
@@ -233,6 +245,7 @@ class SOAPNote(db.Model):
     __tablename__ = 'soap_notes'
     __table_args__ = (
         db.UniqueConstraint('appointment_id', name='_one_soap_per_appointment'),
+        db.Index('idx_soap_client', 'client_id'),
     )
     
     id = db.Column(db.Integer, primary_key=True)
@@ -294,6 +307,9 @@ class MedicalAlert(db.Model):
 
 class PerformanceMetric(db.Model):
     __tablename__ = 'performance_metrics'
+    __table_args__ = (
+        db.Index('idx_metric_provider_date', 'provider_id', 'metric_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     provider_id = db.Column(db.Integer, db.ForeignKey('providers.id'), nullable=False)
@@ -316,3 +332,86 @@ class PerformanceMetric(db.Model):
     def __repr__(self):
         return f'<Metrics P{self.provider_id} on {self.metric_date}>'
 
+# Provider-days to re-roll that appointments.updated_at can't reveal (deleted or rescheduled appointments)
+class MetricDirtyDay(db.Model):
+    __tablename__ = 'metric_dirty_days'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    provider_id = db.Column(db.Integer, nullable=False)
+    metric_date = db.Column(db.Date, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<MetricDirtyDay P{self.provider_id} on {self.metric_date}>'
+
+class RollupState(db.Model):
+    __tablename__ = 'rollup_state'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    last_run_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<RollupState {self.name} at {self.last_run_at}>'
+
+class OutboundEmail(db.Model):
+    __tablename__ = 'outbound_emails'
+    __table_args__ = (
+        db.Index('idx_email_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    to_email = db.Column(db.String(200), nullable=False)
+    subject = db.Column(db.String(500), nullable=False)
+    html_body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<OutboundEmail to {self.to_email} ({self.status})>'
+
+class WebhookEvent(db.Model):
+    __tablename__ = 'webhook_events'
+    __table_args__ = (
+        db.UniqueConstraint('source', 'booking_id', name='_webhook_source_booking_uc'),
+        db.Index('idx_webhook_status', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    source = db.Column(db.String(50), nullable=False, default='fullslate')
+    booking_id = db.Column(db.String(100))  # webhooks.dedupe_key(): sha256:<payload hash> when the booking has no id
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending')  # pending, processed, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    intake_id = db.Column(db.Integer, db.ForeignKey('intakes.id'))
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<WebhookEvent {self.source} {self.booking_id} ({self.status})>'
+
+# One row per searchable record; see search.py. On Postgres a generated tsvector column and
+# GIN indexes are added by search.ensure_search_schema().
+class SearchDocument(db.Model):
+    __tablename__ = 'search_documents'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'source_id', name='_search_kind_source_uc'),
+        db.Index('idx_search_client', 'client_id'),
+        # InvertedIndex.sync() finds changed documents by id, so SQLite must never reuse one
+        {'sqlite_autoincrement': True},
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # client, soap_note, client_note
+    source_id = db.Column(db.Integer, nullable=False)
+    client_id = db.Column(db.Integer, nullable=False)
+    title = db.Column(db.String(200))
+    body = db.Column(db.Text)
+    provider_id = db.Column(db.Integer)  # author of a note document; private client notes are filtered on it
+    
+    def __repr__(self):
+        return f'<SearchDocument {self.kind} {self.source_id}>'
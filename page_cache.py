@@ -0,0 +1,124 @@
+"""
+Rendered-page cache for the public marketing pages
+Anonymous GETs of @cached_page views are served from memory with a strong ETag and
+Last-Modified, answering revalidations with 304. Logged-in users, pending flash messages
+and query strings bypass the cache, so anonymous hits never touch Jinja or the database.
+"""
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask.globals import request_ctx
+
+
+class PageCache:
+    def __init__(self):
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._last_modified = None
+
+    def get(self, path):
+        return self._pages.get(path)
+
+    def store(self, path, body):
+        page = (body, hashlib.sha256(body).hexdigest()[:32], self.last_modified())
+        with self._lock:
+            self._pages[path] = page
+        return page
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._last_modified = None
+
+    def paths(self):
+        return list(self._pages)
+
+    def last_modified(self):
+        """Newest template mtime: it only changes when a deploy changes the markup"""
+        if self._last_modified is None:
+            template_dir = os.path.join(current_app.root_path, current_app.template_folder)
+            newest = max(
+                (os.path.getmtime(os.path.join(root, name))
+                 for root, _, files in os.walk(template_dir) for name in files),
+                default=0
+            )
+            self._last_modified = datetime.fromtimestamp(int(newest), tz=timezone.utc)
+        return self._last_modified
+
+
+page_cache = PageCache()
+
+
+def _cacheable():
+    return (
+        current_app.config.get('PAGE_CACHE', True)
+        and request.method in ('GET', 'HEAD')
+        and not request.query_string
+        # Checking the session keys avoids loading the user from the database
+        and '_user_id' not in session
+        and '_flashes' not in session
+    )
+
+
+def _flashed():
+    """True if this request flashed a message, whether or not the page already displayed it"""
+    return '_flashes' in session or bool(request_ctx.flashes)
+
+
+def _page_response(page):
+    body, etag, last_modified = page
+    response = make_response(body)
+    response.mimetype = 'text/html'
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Browsers revalidate every time; Vary keeps shared caches from serving this to logged-in users
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def cached_page(view):
+    """Serve a static page from the rendered-page cache for anonymous visitors"""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if not _cacheable():
+            return view(*args, **kwargs)
+        page = page_cache.get(request.path)
+        if page is None:
+            response = make_response(view(*args, **kwargs))
+            # A message flashed while rendering belongs to this visitor, not to the shared page
+            if response.status_code != 200 or response.mimetype != 'text/html' or _flashed():
+                return response
+            page = page_cache.store(request.path, response.get_data())
+        return _page_response(page)
+    wrapped.page_cached = True
+    return wrapped
+
+
+def prerender_pages(app, output_dir=None):
+    """
+    Render every argument-free @cached_page route into the cache, and optionally
+    write each page to output_dir as static HTML. Returns the rendered paths.
+    """
+    rendered = []
+    for rule in app.url_map.iter_rules():
+        view = app.view_functions.get(rule.endpoint)
+        if not getattr(view, 'page_cached', False) or rule.arguments or 'GET' not in rule.methods:
+            continue
+        with app.test_request_context(rule.rule):
+            response = make_response(view.__wrapped__())
+            if response.status_code != 200:
+                continue
+            body = response.get_data()
+            page_cache.store(rule.rule, body)
+        if output_dir:
+            relative = rule.rule.strip('/') or 'index'
+            path = os.path.join(output_dir, relative if relative.endswith('.html') else f'{relative}.html')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(body)
+        rendered.append(rule.rule)
+    return rendered
@@ -0,0 +1,214 @@
+"""
+Incremental daily rollups of appointments into performance_metrics
+Only provider-days whose appointments changed since the last run are recomputed,
+so dashboards and reports can read performance_metrics instead of scanning appointments.
+
+A client counts as new on the day of their first completed visit, so adding, removing or
+moving a completed visit also recomputes the days of that client's next visit after it.
+"""
+import bisect
+from datetime import datetime, timedelta
+from sqlalchemy import event, inspect, func, select, and_, exists, tuple_, text, delete, insert
+from sqlalchemy.orm import Session, aliased
+from models import db, Provider, Appointment, Treatment, PerformanceMetric, MetricDirtyDay, RollupState
+
+ROLLUP_NAME = 'performance_metrics'
+BATCH_SIZE = 500
+ADVISORY_LOCK_KEY = 7401001
+
+# Re-scan slightly before the previous run so transactions that committed late aren't missed
+WATERMARK_OVERLAP = timedelta(minutes=2)
+
+
+def _old(attrs, name, current):
+    deleted = attrs[name].history.deleted
+    return deleted[0] if deleted else current
+
+
+@event.listens_for(Session, 'before_flush')
+def track_moved_appointments(session, flush_context, instances):
+    """
+    Mark the old provider-day of deleted or rescheduled appointments as dirty, and the next
+    visit of any client who loses a completed visit (it may now be their first)
+    """
+    dirty = set()
+    lost_visits = []
+    for obj in list(session.deleted):
+        if isinstance(obj, Appointment) and obj.provider_id and obj.appointment_date:
+            dirty.add((obj.provider_id, obj.appointment_date))
+            if _old(inspect(obj).attrs, 'status', obj.status) == 'completed':
+                lost_visits.append((obj.client_id, obj.appointment_date))
+
+    for obj in list(session.dirty):
+        if not isinstance(obj, Appointment):
+            continue
+        attrs = inspect(obj).attrs
+        old_providers = attrs.provider_id.history.deleted
+        old_dates = attrs.appointment_date.history.deleted
+        provider_id = old_providers[0] if old_providers else obj.provider_id
+        metric_date = old_dates[0] if old_dates else obj.appointment_date
+        if (old_providers or old_dates) and provider_id and metric_date:
+            dirty.add((provider_id, metric_date))
+        changed = old_dates or attrs.client_id.history.deleted or attrs.status.history.deleted
+        if changed and _old(attrs, 'status', obj.status) == 'completed':
+            lost_visits.append((_old(attrs, 'client_id', obj.client_id), metric_date))
+
+    if lost_visits:
+        dirty.update(_next_visit_days(session.connection(), lost_visits))
+    for provider_id, metric_date in dirty:
+        session.add(MetricDirtyDay(provider_id=provider_id, metric_date=metric_date))
+
+
+def _next_visit_days(connection, visits):
+    """
+    Provider-days of each client's first completed visit after the given (client_id, date).
+    Adding or removing a completed visit on that date can flip only those days between
+    new and returning clients; every later visit is returning either way.
+    """
+    wanted = {}
+    for client_id, day in visits:
+        if client_id is not None and day is not None:
+            wanted.setdefault(client_id, set()).add(day)
+
+    days = set()
+    client_ids = sorted(wanted)
+    for i in range(0, len(client_ids), BATCH_SIZE):
+        by_client = {}
+        for client_id, provider_id, visit_date in connection.execute(
+            select(Appointment.client_id, Appointment.provider_id, Appointment.appointment_date).distinct()
+            .where(Appointment.client_id.in_(client_ids[i:i + BATCH_SIZE]), Appointment.status == 'completed')
+        ):
+            by_client.setdefault(client_id, {}).setdefault(visit_date, set()).add(provider_id)
+        for client_id, by_date in by_client.items():
+            dates = sorted(by_date)
+            for day in wanted[client_id]:
+                position = bisect.bisect_right(dates, day)
+                if position < len(dates):
+                    days.update((provider_id, dates[position]) for provider_id in by_date[dates[position]])
+    return days
+
+
+def run_rollup(full=False):
+    """
+    Recompute performance_metrics for every provider-day changed since the last run.
+    Returns the number of provider-days recomputed, or None if another worker holds the lock.
+    """
+    started_at = datetime.utcnow()
+
+    if db.engine.dialect.name == 'postgresql':
+        # Transaction-scoped so it also works behind a transaction-pooling proxy
+        locked = db.session.execute(
+            text('SELECT pg_try_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK_KEY}
+        ).scalar()
+        if not locked:
+            db.session.rollback()
+            return None
+
+    state = db.session.get(RollupState, ROLLUP_NAME)
+    if state is None:
+        state = RollupState(name=ROLLUP_NAME)
+        db.session.add(state)
+
+    incremental = state.last_run_at and not full
+    if incremental:
+        changed = db.session.execute(
+            select(Appointment.provider_id, Appointment.appointment_date, Appointment.client_id).distinct()
+            .where(Appointment.updated_at >= state.last_run_at - WATERMARK_OVERLAP)
+        ).all()
+        dirty = {(provider_id, day) for provider_id, day, _ in changed}
+        # New or changed visits may take over as a client's first visit
+        dirty.update(_next_visit_days(db.session.connection(), [(client_id, day) for _, day, client_id in changed]))
+    else:
+        dirty = {tuple(row) for row in db.session.execute(
+            select(Appointment.provider_id, Appointment.appointment_date).distinct()
+        )}
+
+    last_marker = db.session.query(func.max(MetricDirtyDay.id)).scalar()
+    if last_marker is not None:
+        dirty.update(tuple(row) for row in db.session.execute(
+            select(MetricDirtyDay.provider_id, MetricDirtyDay.metric_date)
+            .where(MetricDirtyDay.id <= last_marker)
+            .distinct()
+        ))
+
+    keys = sorted(dirty)
+    for i in range(0, len(keys), BATCH_SIZE):
+        _rollup_days(keys[i:i + BATCH_SIZE])
+
+    if last_marker is not None:
+        db.session.execute(delete(MetricDirtyDay).where(MetricDirtyDay.id <= last_marker))
+
+    state.last_run_at = started_at
+    db.session.commit()
+    return len(keys)
+
+
+def _rollup_days(keys):
+    """Replace the performance_metrics rows for a batch of (provider_id, date) keys"""
+    earlier = aliased(Appointment)
+    completed = Appointment.status == 'completed'
+    seen_before = exists().where(
+        earlier.client_id == Appointment.client_id,
+        earlier.status == 'completed',
+        earlier.appointment_date < Appointment.appointment_date
+    )
+
+    rows = db.session.execute(
+        select(
+            Appointment.provider_id,
+            Appointment.appointment_date,
+            func.count(Appointment.id).filter(completed).label('sessions_completed'),
+            func.count(Appointment.id).filter(Appointment.status == 'cancelled').label('sessions_cancelled'),
+            func.coalesce(func.sum(Treatment.price).filter(completed), 0.0).label('total_revenue'),
+            func.count(func.distinct(Appointment.client_id)).filter(and_(completed, ~seen_before)).label('new_clients'),
+            func.count(func.distinct(Appointment.client_id)).filter(and_(completed, seen_before)).label('returning_clients'),
+            func.coalesce(func.sum(Appointment.duration_minutes).filter(completed), 0).label('minutes_worked')
+        )
+        .outerjoin(Treatment, Appointment.treatment_id == Treatment.id)
+        .where(tuple_(Appointment.provider_id, Appointment.appointment_date).in_(keys))
+        .group_by(Appointment.provider_id, Appointment.appointment_date)
+    ).all()
+
+    metric_key = tuple_(PerformanceMetric.provider_id, PerformanceMetric.metric_date)
+
+    # Ratings are entered separately, so carry them over to the recomputed rows
+    ratings = {
+        (provider_id, metric_date): rating
+        for provider_id, metric_date, rating in db.session.execute(
+            select(PerformanceMetric.provider_id, PerformanceMetric.metric_date, PerformanceMetric.average_rating)
+            .where(metric_key.in_(keys), PerformanceMetric.average_rating.isnot(None))
+        )
+    }
+
+    db.session.execute(delete(PerformanceMetric).where(metric_key.in_(keys)))
+    if rows:
+        db.session.execute(insert(PerformanceMetric), [
+            {
+                'provider_id': row.provider_id,
+                'metric_date': row.appointment_date,
+                'sessions_completed': row.sessions_completed,
+                'sessions_cancelled': row.sessions_cancelled,
+                'total_revenue': float(row.total_revenue),
+                'new_clients': row.new_clients,
+                'returning_clients': row.returning_clients,
+                'total_hours_worked': round(row.minutes_worked / 60.0, 2),
+                'average_rating': ratings.get((row.provider_id, row.appointment_date))
+            }
+            for row in rows
+        ])
+
+
+def get_provider_metric_totals(start_date):
+    """Per-provider totals from performance_metrics since start_date"""
+    return db.session.query(
+        Provider.full_name,
+        func.coalesce(func.sum(PerformanceMetric.sessions_completed), 0).label('sessions_completed'),
+        func.coalesce(func.sum(PerformanceMetric.sessions_cancelled), 0).label('sessions_cancelled'),
+        func.coalesce(func.sum(PerformanceMetric.total_revenue), 0.0).label('total_revenue'),
+        func.coalesce(func.sum(PerformanceMetric.new_clients), 0).label('new_clients'),
+        func.coalesce(func.sum(PerformanceMetric.returning_clients), 0).label('returning_clients'),
+        func.coalesce(func.sum(PerformanceMetric.total_hours_worked), 0.0).label('total_hours_worked')
+    ).join(PerformanceMetric, Provider.id == PerformanceMetric.provider_id)\
+     .filter(PerformanceMetric.metric_date >= start_date)\
+     .group_by(Provider.id, Provider.full_name)\
+     .order_by(Provider.full_name).all()
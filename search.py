@@ -0,0 +1,523 @@
+"""
+Full-text search over clients, SOAP notes and client notes
+Each searchable record is flattened into a search_documents row, kept current in the same
+transaction by ORM flush events (and by upsert_clients() for bulk writes).
+
+On Postgres the rows carry a generated, weighted tsvector column with a GIN index, ranked
+with ts_rank_cd, plus a pg_trgm index on client names for fuzzy matches when full-text
+search finds nothing. Elsewhere (SQLite test runs) an in-process inverted index is built
+from search_documents on first use and catches up on every search with the rows any process
+wrote since.
+
+Client notes are private to their author: providers only find their own, on top of the
+clients they may see. At 100k clients and 40k notes (`python benchmark.py search-latency`)
+both paths answer in under 50 ms, because neither ranks every match of a common word:
+Postgres ranks the newest MAX_RANKED_MATCHES matches, and the in-process index expands a
+prefix to its MAX_PREFIX_TERMS most common words, scores a provider's few documents directly
+and stops walking a single word's postings once the top results are settled.
+The pg_trgm fallback has not been measured.
+"""
+import bisect
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from sqlalchemy import Integer, event, inspect, select, insert, delete, literal, literal_column, func, or_, text
+from sqlalchemy.orm import Session
+from models import db, Client, SOAPNote, ClientNote, SearchDocument
+from timeline import provider_client_ids
+
+TEXT_SEARCH_CONFIG = 'english'
+TRIGRAM_THRESHOLD = 0.3
+PREFIX_WEIGHT = 0.5
+MAX_PREFIX_TERMS = 50
+MAX_RANKED_MATCHES = 2000
+MAX_RESULTS = 50
+REFRESH_CHUNK = 500
+SNIPPET_CHARS = 160
+
+# Source columns that feed each document; changes to anything else don't touch the index
+INDEXED_FIELDS = {
+    Client: ('name', 'email', 'phone', 'focus_areas', 'allergies'),
+    SOAPNote: ('client_id', 'provider_id', 'subjective', 'objective', 'assessment', 'plan', 'areas_worked',
+               'techniques_used'),
+    ClientNote: ('client_id', 'provider_id', 'notes'),
+}
+KINDS = {Client: 'client', SOAPNote: 'soap_note', ClientNote: 'client_note'}
+
+
+def _joined(*columns):
+    expression = func.coalesce(columns[0], '')
+    for column in columns[1:]:
+        expression = expression + literal(' ') + func.coalesce(column, '')
+    return expression
+
+
+def _document_select(kind):
+    """SELECT producing search_documents rows (kind, source_id, client_id, title, body, provider_id) for one kind"""
+    if kind == 'client':
+        return select(literal('client'), Client.id, Client.id, Client.name,
+                      _joined(Client.email, Client.phone, Client.focus_areas, Client.allergies),
+                      literal(None, Integer)), Client.id
+    if kind == 'soap_note':
+        return select(literal('soap_note'), SOAPNote.id, SOAPNote.client_id, literal(None),
+                      _joined(SOAPNote.subjective, SOAPNote.objective, SOAPNote.assessment, SOAPNote.plan,
+                              SOAPNote.areas_worked, SOAPNote.techniques_used), SOAPNote.provider_id), SOAPNote.id
+    return select(literal('client_note'), ClientNote.id, ClientNote.client_id, literal(None),
+                  ClientNote.notes, ClientNote.provider_id), ClientNote.id
+
+
+DOCUMENT_COLUMNS = ['kind', 'source_id', 'client_id', 'title', 'body', 'provider_id']
+
+
+def refresh_documents(session, kind, source_ids):
+    """Rewrite the documents for these source rows from their current state, in the caller's transaction"""
+    source_ids = sorted(set(source_ids))
+    connection = session.connection()
+    for start in range(0, len(source_ids), REFRESH_CHUNK):
+        chunk = source_ids[start:start + REFRESH_CHUNK]
+        query, id_column = _document_select(kind)
+        connection.execute(delete(SearchDocument).where(SearchDocument.kind == kind,
+                                                        SearchDocument.source_id.in_(chunk)))
+        connection.execute(insert(SearchDocument).from_select(DOCUMENT_COLUMNS, query.where(id_column.in_(chunk))))
+
+
+def rebuild_search_index():
+    """Recreate every document with one INSERT ... SELECT per kind; returns the document count"""
+    db.session.execute(delete(SearchDocument))
+    for kind in ('client', 'soap_note', 'client_note'):
+        query, _ = _document_select(kind)
+        db.session.execute(insert(SearchDocument).from_select(DOCUMENT_COLUMNS, query))
+    db.session.commit()
+    _local_index.reset()
+    return db.session.query(func.count(SearchDocument.id)).scalar()
+
+
+def ensure_search_schema():
+    """
+    Add the Postgres tsvector column, GIN index and trigram index. On SQLite, recreate
+    search_documents if it predates AUTOINCREMENT ids, which InvertedIndex.sync() relies on.
+    Tables from before note authors were indexed get the provider_id column and a rebuild.
+    """
+    if db.engine.dialect.name == 'sqlite':
+        table_sql = db.session.execute(text(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'search_documents'"
+        )).scalar()
+        db.session.commit()
+        if table_sql and ('AUTOINCREMENT' not in table_sql.upper() or 'provider_id' not in table_sql):
+            SearchDocument.__table__.drop(db.engine)
+            SearchDocument.__table__.create(db.engine)
+            print(f"✓ Recreated search documents ({rebuild_search_index()} documents)")
+        return
+    if db.engine.dialect.name != 'postgresql':
+        return
+    columns = {column['name'] for column in inspect(db.engine).get_columns('search_documents')}
+    if 'provider_id' not in columns:
+        db.session.execute(text("ALTER TABLE search_documents ADD COLUMN provider_id INTEGER"))
+        db.session.commit()
+        print(f"✓ Indexed note authors ({rebuild_search_index()} documents)")
+    db.session.execute(text(f"""
+        ALTER TABLE search_documents ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+            setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(body, '')), 'B')
+        ) STORED
+    """))
+    db.session.execute(text(
+        "CREATE INDEX IF NOT EXISTS idx_search_vector ON search_documents USING GIN (search_vector)"
+    ))
+    db.session.commit()
+    try:
+        db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        db.session.execute(text(
+            "CREATE INDEX IF NOT EXISTS idx_search_title_trgm ON search_documents USING GIN (title gin_trgm_ops)"
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠ pg_trgm unavailable, fuzzy name matching disabled: {e}")
+
+
+def tokenize(value):
+    return re.findall(r'\w+', (value or '').lower())
+
+
+def _trigrams(value):
+    """pg_trgm-style trigrams: each word padded with two leading spaces and one trailing"""
+    grams = set()
+    for word in tokenize(value):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class InvertedIndex:
+    """
+    In-memory index over search_documents for databases without full-text search.
+    Terms are prefix-matched, every term must match, and documents are ranked with BM25;
+    title (client name) terms count double.
+    """
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._postings = {}
+        self._documents = {}
+        # client_id -> document keys, for scoring a provider's few clients directly
+        self._client_documents = {}
+        self._total_length = 0
+        self._terms = None
+        # Trigrams of client names, for fuzzy matching
+        self._gram_postings = {}
+        self._title_grams = {}
+        self._loaded = False
+        # Highest search_documents.id indexed so far
+        self._watermark = 0
+
+    def _add(self, key, client_id, title, body, author_id=None):
+        counts = Counter(tokenize(body))
+        for term in tokenize(title):
+            counts[term] += 2
+        length = sum(counts.values())
+        self._documents[key] = (client_id, title, body, length, counts, author_id)
+        self._client_documents.setdefault(client_id, set()).add(key)
+        self._total_length += length
+        for term, count in counts.items():
+            self._postings.setdefault(term, {})[key] = count
+        if key[0] == 'client':
+            grams = self._title_grams[key] = _trigrams(title)
+            for gram in grams:
+                self._gram_postings.setdefault(gram, set()).add(key)
+        self._terms = None
+
+    def _remove(self, key):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        self._total_length -= document[3]
+        self._client_documents[document[0]].discard(key)
+        for term in document[4]:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del self._postings[term]
+        for gram in self._title_grams.pop(key, ()):
+            self._gram_postings[gram].discard(key)
+        self._terms = None
+
+    def sync(self):
+        """
+        Load everything on first use, afterwards the documents written since the last sync by
+        any process. refresh_documents() rewrites a document as a new row and ids are never
+        reused, so rows above the watermark are exactly the new and changed ones; a count that
+        no longer matches means documents were deleted outright, and the index is reloaded.
+        """
+        with self._lock:
+            if self._loaded:
+                count = db.session.query(func.count(SearchDocument.id)).scalar()
+                self._add_rows(SearchDocument.id > self._watermark)
+                if len(self._documents) == count:
+                    return
+                self._clear()
+            self._add_rows()
+            self._loaded = True
+
+    def _add_rows(self, *criteria):
+        query = select(SearchDocument.id, SearchDocument.kind, SearchDocument.source_id, SearchDocument.client_id,
+                       SearchDocument.title, SearchDocument.body, SearchDocument.provider_id)\
+            .where(*criteria).order_by(SearchDocument.id)
+        for document_id, kind, source_id, client_id, title, body, author_id in db.session.execute(query)\
+                .yield_per(5000):
+            self._remove((kind, source_id))
+            self._add((kind, source_id), client_id, title, body, author_id)
+            self._watermark = document_id
+
+    def _expand(self, term):
+        """
+        Indexed terms starting with term, as (term, weight): exact matches outrank words that
+        merely start with the term. Short prefixes can match thousands of words (every email
+        address starting with that letter), so only the MAX_PREFIX_TERMS most common are kept.
+        """
+        if self._terms is None:
+            self._terms = sorted(self._postings)
+        terms = self._terms
+        start = end = bisect.bisect_left(terms, term)
+        while end < len(terms) and terms[end].startswith(term):
+            end += 1
+        matches = terms[start:end]
+        if len(matches) > MAX_PREFIX_TERMS:
+            matches = heapq.nlargest(MAX_PREFIX_TERMS, matches,
+                                     key=lambda indexed: (indexed == term, len(self._postings[indexed])))
+        return [(indexed, 1.0 if indexed == term else PREFIX_WEIGHT) for indexed in matches]
+
+    def search(self, query, client_ids=None, kinds=None, limit=20, author_id=None):
+        """
+        [(key, client_id, title, body, score)] best first; client_ids=None means every client.
+        With author_id, client notes written by anyone else are left out.
+
+        Admin searches score the postings term by term, starting from the rarest term and
+        intersecting each further term from whichever side is smaller. A provider sees a few
+        hundred clients, so their documents are scored directly instead of walking postings
+        that are mostly other providers' clients.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self._documents)
+            if not total:
+                return []
+            # BM25 with the document-length normalisation folded into two constants
+            base = self.K1 * (1 - self.B)
+            per_length = self.K1 * self.B * total / self._total_length
+            expanded = []
+            for term in terms:
+                matches = [(indexed, weight * self._idf(len(self._postings[indexed]), total))
+                           for indexed, weight in self._expand(term)]
+                if not matches:
+                    return []
+                expanded.append(matches)
+
+            wanted = None
+            if client_ids is not None or kinds or author_id is not None:
+                def wanted(key, document):
+                    return ((client_ids is None or document[0] in client_ids) and (not kinds or key[0] in kinds)
+                            and (author_id is None or key[0] != 'client_note' or document[5] == author_id))
+
+            candidates = None
+            if client_ids is not None:
+                candidates = [key for client_id in client_ids for key in self._client_documents.get(client_id, ())]
+            rarest = min(sum(len(self._postings[indexed]) for indexed, _ in matches) for matches in expanded)
+            if candidates is not None and len(candidates) < rarest:
+                scores = self._score_documents(candidates, expanded, wanted, base, per_length)
+            else:
+                scores = self._score_postings(expanded, wanted, limit, base, per_length)
+            best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+            return [(key, *self._documents[key][:3], score) for key, score in best]
+
+    def _idf(self, document_frequency, total):
+        """BM25 idf, times the (K1 + 1) of the term-frequency numerator"""
+        return (self.K1 + 1) * math.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+
+    def _score_postings(self, expanded, wanted, limit, base, per_length):
+        """
+        {key: score} of the wanted documents (all when wanted is None) matching every term,
+        walking each term's postings.
+        A single term's words are walked from the highest possible score down (a word never
+        scores more than its weighted idf), stopping once limit documents already beat the next
+        word's best, so a one-letter prefix doesn't score every common word starting with it.
+        """
+        documents = self._documents
+        expanded = sorted(expanded, key=lambda matches: sum(len(self._postings[indexed]) for indexed, _ in matches))
+        single = len(expanded) == 1
+        scores = {}
+        # One entry per scored document, its first score: never above its final one, so
+        # top[0] never overstates the limit-th best score
+        top = []
+        for indexed, idf in sorted(expanded[0], key=lambda match: -match[1]):
+            if single and len(top) == limit and top[0] >= idf:
+                break
+            for key, count in self._postings[indexed].items():
+                document = documents[key]
+                if wanted and not wanted(key, document):
+                    continue
+                score = idf * count / (count + base + per_length * document[3])
+                previous = scores.get(key)
+                if previous is None:
+                    if len(top) < limit:
+                        heapq.heappush(top, score)
+                    elif score > top[0]:
+                        heapq.heapreplace(top, score)
+                if score > (previous or 0.0):
+                    scores[key] = score
+        for matches in expanded[1:]:
+            best = {}
+            for indexed, idf in matches:
+                postings = self._postings[indexed]
+                if len(postings) < len(scores):
+                    pairs = ((key, count) for key, count in postings.items() if key in scores)
+                else:
+                    pairs = ((key, postings[key]) for key in scores if key in postings)
+                for key, count in pairs:
+                    score = idf * count / (count + base + per_length * documents[key][3])
+                    if score > best.get(key, 0.0):
+                        best[key] = score
+            scores = {key: scores[key] + score for key, score in best.items()}
+            if not scores:
+                break
+        return scores
+
+    def _score_documents(self, candidates, expanded, wanted, base, per_length):
+        """{key: score} of the wanted candidates matching every term, reading each document's own terms"""
+        scores = {}
+        for key in candidates:
+            document = self._documents[key]
+            if wanted and not wanted(key, document):
+                continue
+            length, counts = document[3], document[4]
+            total_score = 0.0
+            for matches in expanded:
+                best = 0.0
+                for indexed, idf in matches:
+                    count = counts.get(indexed)
+                    if count:
+                        best = max(best, idf * count / (count + base + per_length * length))
+                if not best:
+                    break
+                total_score += best
+            else:
+                scores[key] = total_score
+        return scores
+
+    def fuzzy_clients(self, query, client_ids=None, limit=20):
+        """Client documents whose name is trigram-similar to query"""
+        grams = _trigrams(query)
+        if not grams:
+            return []
+        with self._lock:
+            overlap = Counter()
+            for gram in grams:
+                overlap.update(self._gram_postings.get(gram, ()))
+            ranked = []
+            for key, shared in overlap.items():
+                client_id, title, body = self._documents[key][:3]
+                if client_ids is not None and client_id not in client_ids:
+                    continue
+                similarity = shared / (len(grams) + len(self._title_grams[key]) - shared)
+                if similarity >= TRIGRAM_THRESHOLD:
+                    ranked.append((key, client_id, title, body, similarity))
+            ranked.sort(key=lambda item: (-item[4], item[0]))
+            return ranked[:limit]
+
+
+_local_index = InvertedIndex()
+
+
+def reset_local_index():
+    """Drop the in-process index after bulk changes; it reloads on the next search"""
+    _local_index.reset()
+
+
+_trigram_available = None
+
+
+def _has_trigram():
+    global _trigram_available
+    if _trigram_available is None:
+        _trigram_available = bool(db.session.execute(
+            text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        ).scalar())
+    return _trigram_available
+
+
+def _search_postgres(query, provider_id, kinds, limit):
+    terms = tokenize(query)
+    vector = literal_column('search_documents.search_vector')
+    # Every term, each as a prefix, so partially typed names still match
+    tsquery = func.to_tsquery(TEXT_SEARCH_CONFIG, ' & '.join(f'{term}:*' for term in terms))
+    rank = func.ts_rank_cd(vector, tsquery)
+    matches = select(SearchDocument.id).where(vector.op('@@')(tsquery))
+    if provider_id is not None:
+        matches = matches.where(SearchDocument.client_id.in_(provider_client_ids(provider_id)),
+                                or_(SearchDocument.kind != 'client_note', SearchDocument.provider_id == provider_id))
+    if kinds:
+        matches = matches.where(SearchDocument.kind.in_(kinds))
+    # Ranking reads every candidate's tsvector, so a word in most notes is ranked among its
+    # newest MAX_RANKED_MATCHES documents only
+    matches = matches.order_by(SearchDocument.id.desc()).limit(MAX_RANKED_MATCHES)
+    statement = select(SearchDocument.kind, SearchDocument.source_id, SearchDocument.client_id,
+                       SearchDocument.title, SearchDocument.body, rank.label('rank'))\
+        .where(SearchDocument.id.in_(matches))
+    rows = db.session.execute(
+        statement.order_by(rank.desc(), SearchDocument.kind, SearchDocument.source_id).limit(limit)
+    ).all()
+    if rows or not _has_trigram() or (kinds and 'client' not in kinds):
+        return [((row.kind, row.source_id), row.client_id, row.title, row.body, float(row.rank)) for row in rows]
+
+    similarity = func.similarity(SearchDocument.title, query)
+    statement = select(SearchDocument.kind, SearchDocument.source_id, SearchDocument.client_id,
+                       SearchDocument.title, SearchDocument.body, similarity.label('rank'))\
+        .where(SearchDocument.kind == 'client', SearchDocument.title.op('%')(query))
+    if provider_id is not None:
+        statement = statement.where(SearchDocument.client_id.in_(provider_client_ids(provider_id)))
+    rows = db.session.execute(statement.order_by(similarity.desc(), SearchDocument.source_id).limit(limit)).all()
+    return [((row.kind, row.source_id), row.client_id, row.title, row.body, float(row.rank)) for row in rows]
+
+
+def _search_local(query, provider_id, kinds, limit):
+    _local_index.sync()
+    client_ids = None
+    if provider_id is not None:
+        client_ids = {client_id for client_id, in db.session.execute(provider_client_ids(provider_id))}
+    results = _local_index.search(query, client_ids, kinds, limit, author_id=provider_id)
+    if not results and (not kinds or 'client' in kinds):
+        results = _local_index.fuzzy_clients(query, client_ids, limit)
+    return results
+
+
+def snippet(body, query):
+    """Excerpt of body around the first query term"""
+    body = ' '.join((body or '').split())
+    if len(body) <= SNIPPET_CHARS:
+        return body
+    lowered = body.lower()
+    positions = [lowered.find(term) for term in tokenize(query)]
+    position = min((p for p in positions if p >= 0), default=0)
+    start = max(0, position - SNIPPET_CHARS // 3)
+    excerpt = body[start:start + SNIPPET_CHARS]
+    return ('…' if start else '') + excerpt + ('…' if start + SNIPPET_CHARS < len(body) else '')
+
+
+def search(query, provider_id=None, kinds=None, limit=20):
+    """
+    Ranked documents matching query, limited to the clients provider_id may see (see
+    timeline.provider_client_ids; all clients when provider_id is None) and, among client
+    notes, to the ones provider_id wrote. Returns [{'kind', 'id', 'client_id', 'client_name',
+    'snippet', 'rank'}].
+    """
+    limit = min(max(limit, 1), MAX_RESULTS)
+    if not tokenize(query):
+        return []
+    if db.engine.dialect.name == 'postgresql':
+        results = _search_postgres(query, provider_id, kinds, limit)
+    else:
+        results = _search_local(query, provider_id, kinds, limit)
+
+    names = dict(db.session.query(Client.id, Client.name).filter(Client.id.in_({r[1] for r in results})))
+    return [
+        {
+            'kind': key[0],
+            'id': key[1],
+            'client_id': client_id,
+            'client_name': names.get(client_id, title),
+            'snippet': snippet(body, query),
+            'rank': round(score, 4)
+        }
+        for key, client_id, title, body, score in results
+    ]
+
+
+@event.listens_for(Session, 'after_flush')
+def refresh_changed_documents(session, flush_context):
+    """Rewrite the documents of indexed rows this flush inserted, changed or deleted"""
+    changed = {}
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        fields = INDEXED_FIELDS.get(type(obj))
+        if fields is None:
+            continue
+        if obj in session.dirty and not any(inspect(obj).attrs[f].history.has_changes() for f in fields):
+            continue
+        if obj.id is not None:
+            changed.setdefault(KINDS[type(obj)], set()).add(obj.id)
+    for kind, source_ids in changed.items():
+        refresh_documents(session, kind, source_ids)
@@ -3,12 +3,82 @@ Data seeding script for Tough Love Massage Provider Portal
 Creates sample clients, appointments, SOAP notes, medical alerts, and performance metrics
 Also migrates any existing intakes that don't have associated clients
 """
+import argparse
+import csv
+import io
+import itertools
 import os
+import random
 import sys
 from datetime import datetime, date, time, timedelta
+from sqlalchemy import insert, delete, select, or_, func, text
+from werkzeug.security import generate_password_hash
 from app import app, db
 from models import (Client, Intake, Appointment, Treatment, SOAPNote, 
-                    MedicalAlert, PerformanceMetric, Provider)
+                    MedicalAlert, PerformanceMetric, Provider, ProviderTreatment,
+                    ProviderAvailability, ProviderDailyLimit, ClientNote, WebhookEvent, OutboundEmail,
+                    MetricDirtyDay, SearchDocument)
+from clients import upsert_clients, load_clients
+from slot_cache import slot_cache
+from search import rebuild_search_index, reset_local_index
+from client_stats import reconcile_client_stats
+
+# Generated benchmark rows are recognisable by this email domain and can be dropped again
+BENCH_DOMAIN = 'bench.invalid'
+BENCH_PASSWORD = 'benchmark'
+
+DEFAULT_TREATMENTS = [
+    ('60-Minute Therapeutic Massage', 60, 95.00, 'Full body relaxation'),
+    ('90-Minute Deep Tissue', 90, 125.00, 'Intense muscle work'),
+    ('30-Minute Focused Session', 30, 55.00, 'Target specific areas'),
+    ('Prenatal Massage', 60, 100.00, 'Safe pregnancy massage'),
+    ('Thai Massage', 90, 140.00, 'Traditional Thai techniques'),
+]
+
+SOAP_EXAMPLES = [
+    {
+        'subjective': 'Client reports chronic lower back pain, worse in mornings. Pain level 7/10. Sitting at desk 8 hours/day.',
+        'objective': 'Moderate tension in lumbar paraspinals, reduced ROM in forward flexion. Trigger points identified in QL bilaterally.',
+        'assessment': 'Chronic mechanical low back pain, likely postural. Good response to deep tissue work. Client tolerated pressure well.',
+        'plan': 'Continue biweekly sessions. Recommended stretching routine. Consider adding hip flexor work next session.',
+        'pain_before': 7,
+        'pain_after': 3
+    },
+    {
+        'subjective': 'Client feeling stressed, tight shoulders and neck. Headaches 2-3x/week. Sleep quality poor.',
+        'objective': 'Significant tension in upper traps, levator scapulae, and SCM. Limited cervical rotation bilaterally.',
+        'assessment': 'Tension headaches, stress-related myofascial pain. Client very responsive to myofascial release techniques.',
+        'plan': 'Weekly sessions recommended. Taught self-massage for SCM. Suggested stress management resources.',
+        'pain_before': 6,
+        'pain_after': 2
+    },
+    {
+        'subjective': 'Runner training for marathon. No acute pain, seeking maintenance and recovery support.',
+        'objective': 'Moderate tightness in hamstrings, IT bands, and calves. Good overall muscle tone. No adhesions noted.',
+        'assessment': 'Sports massage for maintenance. Preventive care appropriate. Client has good body awareness.',
+        'plan': 'Continue every 2 weeks during training. Focus on legs, add hip flexors as needed.',
+        'pain_before': 2,
+        'pain_after': 1
+    }
+]
+
+MEDICAL_HISTORIES = [
+    'None', 'Lower back pain', 'Neck and shoulder tension', 'Previous knee surgery',
+    'High blood pressure, controlled', 'Migraines', 'Fibromyalgia', 'Runner, recurring IT band tightness'
+]
+
+ALERT_EXAMPLES = [
+    ('allergy', 'high', 'Nut oil allergy - use hypoallergenic lotion only'),
+    ('medical_condition', 'medium', 'Controlled hypertension - avoid prolonged prone position'),
+    ('medical_condition', 'high', 'Blood thinners - light pressure only'),
+    ('pregnancy', 'medium', 'Second trimester - side-lying positioning'),
+    ('injury', 'low', 'Healing rotator cuff strain - avoid deep work on right shoulder'),
+]
+
+FIRST_NAMES = ['Sarah', 'Michael', 'Emily', 'David', 'Lisa', 'James', 'Maria', 'Robert', 'Jennifer', 'William',
+               'Linda', 'Daniel', 'Patricia', 'Thomas', 'Susan', 'Kevin', 'Karen', 'Brian', 'Nancy', 'Jason']
+LAST_NAMES = ['Johnson', 'Chen', 'Rodriguez', 'Thompson', 'Park', 'Smith', 'Garcia', 'Miller', 'Davis', 'Wilson',
+              'Martinez', 'Anderson', 'Taylor', 'Moore', 'Jackson', 'Lee', 'Harris', 'Clark', 'Lewis', 'Walker']
 
 def migrate_existing_intakes():
     """Migrate existing intakes to have client associations"""
@@ -21,6 +91,8 @@ def migrate_existing_intakes():
     
     print(f"Found {len(intakes_without_client)} intakes without client associations")
     
+    records = []
+    linkable = []
     for intake in intakes_without_client:
         # Use old client_name and email fields if they exist
         client_name = getattr(intake, 'client_name', None)
@@ -30,20 +102,15 @@ def migrate_existing_intakes():
             print(f"  ⚠ Skipping intake {intake.id} - missing name or email")
             continue
         
-        # Find or create client
-        client = Client.query.filter_by(email=client_email).first()
-        if not client:
-            client = Client(
-                name=client_name,
-                email=client_email,
-                phone='',
-                first_visit=intake.created_at or datetime.now()
-            )
-            db.session.add(client)
-            print(f"  + Created client: {client_name}")
-        
-        intake.client_id = client.id
-        print(f"  ✓ Linked intake {intake.id} to client {client.name}")
+        records.append({'name': client_name, 'email': client_email, 'phone': '',
+                        'first_visit': (intake.created_at or datetime.now()).date()})
+        linkable.append((intake, client_email))
+    
+    # Existing clients are linked as-is; missing ones are created in the same statement
+    client_ids = upsert_clients(records, update=False)
+    for intake, client_email in linkable:
+        intake.client_id = client_ids[client_email]
+        print(f"  ✓ Linked intake {intake.id} to client {client_email}")
     
     db.session.commit()
     print(f"✓ Migration complete: {len(intakes_without_client)} intakes migrated")
@@ -53,7 +120,7 @@ def seed_sample_data(provider_id=1):
     print("\n=== SEEDING SAMPLE DATA ===")
     
     # Check if provider exists
-    provider = Provider.query.get(provider_id)
+    provider = db.session.get(Provider, provider_id)
     if not provider:
         print(f"✗ Provider with ID {provider_id} not found")
         print("  Please create a provider account first by setting ADMIN_EMAIL and ADMIN_PASSWORD")
@@ -64,11 +131,8 @@ def seed_sample_data(provider_id=1):
     # Create sample treatments
     print("\n--- Creating Treatments ---")
     treatments = [
-        Treatment(name='60-Minute Therapeutic Massage', duration_minutes=60, price=95.00, description='Full body relaxation'),
-        Treatment(name='90-Minute Deep Tissue', duration_minutes=90, price=125.00, description='Intense muscle work'),
-        Treatment(name='30-Minute Focused Session', duration_minutes=30, price=55.00, description='Target specific areas'),
-        Treatment(name='Prenatal Massage', duration_minutes=60, price=100.00, description='Safe pregnancy massage'),
-        Treatment(name='Thai Massage', duration_minutes=90, price=140.00, description='Traditional Thai techniques'),
+        Treatment(name=name, duration_minutes=duration, price=price, description=description)
+        for name, duration, price, description in DEFAULT_TREATMENTS
     ]
     
     for treatment in treatments:
@@ -125,29 +189,16 @@ def seed_sample_data(provider_id=1):
         }
     ]
     
-    clients = []
-    for client_data in sample_clients:
-        existing = Client.query.filter_by(email=client_data['email']).first()
-        if existing:
-            clients.append(existing)
-            print(f"  ✓ Client already exists: {existing.name}")
-        else:
-            client = Client(
-                name=client_data['name'],
-                email=client_data['email'],
-                phone=client_data['phone'],
-                preferred_pressure=client_data['preferred_pressure'],
-                focus_areas=client_data['focus_areas'],
-                notes=client_data['notes'],
-                first_visit=datetime.now() - timedelta(days=180),
-                total_visits=5,
-                lifetime_value=475.00
-            )
-            db.session.add(client)
-            clients.append(client)
-            print(f"  + Created client: {client.name}")
-    
+    # 'notes' in the samples is descriptive only; client notes live in ClientNote
+    client_ids = upsert_clients([
+        dict({key: value for key, value in client_data.items() if key != 'notes'},
+             first_visit=(datetime.now() - timedelta(days=180)).date(), visit_count=5, lifetime_value=475.00)
+        for client_data in sample_clients
+    ], update=False)
     db.session.commit()
+    loaded = load_clients(client_ids.values())
+    clients = [loaded[client_ids[client_data['email']]] for client_data in sample_clients]
+    print(f"  ✓ {len(clients)} sample clients ready")
     
     # Create medical alerts
     print("\n--- Creating Medical Alerts ---")
@@ -212,6 +263,8 @@ def seed_sample_data(provider_id=1):
             appointment_date=apt_data['date'],
             start_time=apt_data['time'],
             duration_minutes=apt_data['treatment'].duration_minutes,
+            end_time=(datetime.combine(apt_data['date'], apt_data['time'])
+                      + timedelta(minutes=apt_data['treatment'].duration_minutes)).time(),
             status=apt_data['status'],
             created_at=datetime.now() - timedelta(days=30)
         )
@@ -224,32 +277,7 @@ def seed_sample_data(provider_id=1):
     print("\n--- Creating SOAP Notes ---")
     completed_appointments = Appointment.query.filter_by(status='completed', provider_id=provider_id).limit(5).all()
     
-    soap_examples = [
-        {
-            'subjective': 'Client reports chronic lower back pain, worse in mornings. Pain level 7/10. Sitting at desk 8 hours/day.',
-            'objective': 'Moderate tension in lumbar paraspinals, reduced ROM in forward flexion. Trigger points identified in QL bilaterally.',
-            'assessment': 'Chronic mechanical low back pain, likely postural. Good response to deep tissue work. Client tolerated pressure well.',
-            'plan': 'Continue biweekly sessions. Recommended stretching routine. Consider adding hip flexor work next session.',
-            'pain_before': 7,
-            'pain_after': 3
-        },
-        {
-            'subjective': 'Client feeling stressed, tight shoulders and neck. Headaches 2-3x/week. Sleep quality poor.',
-            'objective': 'Significant tension in upper traps, levator scapulae, and SCM. Limited cervical rotation bilaterally.',
-            'assessment': 'Tension headaches, stress-related myofascial pain. Client very responsive to myofascial release techniques.',
-            'plan': 'Weekly sessions recommended. Taught self-massage for SCM. Suggested stress management resources.',
-            'pain_before': 6,
-            'pain_after': 2
-        },
-        {
-            'subjective': 'Runner training for marathon. No acute pain, seeking maintenance and recovery support.',
-            'objective': 'Moderate tightness in hamstrings, IT bands, and calves. Good overall muscle tone. No adhesions noted.',
-            'assessment': 'Sports massage for maintenance. Preventive care appropriate. Client has good body awareness.',
-            'plan': 'Continue every 2 weeks during training. Focus on legs, add hip flexors as needed.',
-            'pain_before': 2,
-            'pain_after': 1
-        }
-    ]
+    soap_examples = SOAP_EXAMPLES
     
     for i, apt in enumerate(completed_appointments[:3]):
         if i < len(soap_examples):
@@ -264,7 +292,6 @@ def seed_sample_data(provider_id=1):
                 plan=example['plan'],
                 pain_level_before=example['pain_before'],
                 pain_level_after=example['pain_after'],
-                session_duration=apt.duration_minutes,
                 created_at=apt.appointment_date
             )
             db.session.add(soap_note)
@@ -284,8 +311,8 @@ def seed_sample_data(provider_id=1):
             metric_date=metric_date,
             sessions_completed=sessions,
             total_revenue=revenue,
-            avg_session_duration=65,
-            client_satisfaction=4.5 + (i % 5) * 0.1,
+            total_hours_worked=round(sessions * 65 / 60, 2),
+            average_rating=4.5 + (i % 5) * 0.1,
             new_clients=1 if i % 7 == 0 else 0,
             returning_clients=sessions - (1 if i % 7 == 0 else 0)
         )
@@ -306,9 +333,359 @@ def seed_sample_data(provider_id=1):
     print(f"  - Performance Metrics: 30 days")
     print(f"\nYou can now view the populated dashboard at /provider-portal")
 
+def _reserve_ids(table, count):
+    """First of `count` consecutive primary keys nobody else will be handed"""
+    if count <= 0:
+        return 1
+    if db.engine.dialect.name == 'postgresql':
+        sequence = db.session.execute(text('SELECT pg_get_serial_sequence(:table, :column)'),
+                                      {'table': table.name, 'column': 'id'}).scalar()
+        last = db.session.execute(text('SELECT setval(:sequence, nextval(:sequence) + :count - 1)'),
+                                  {'sequence': sequence, 'count': count}).scalar()
+        return last - count + 1
+    return (db.session.execute(select(func.max(table.c.id))).scalar() or 0) + 1
+
+
+def _copy_rows(table, batch):
+    """Stream a batch through COPY FROM STDIN, filling in the Python-side column defaults COPY can't see"""
+    columns = list(batch[0])
+    defaults = {}
+    for column in table.columns:
+        if column.name not in batch[0] and column.default is not None and not column.primary_key:
+            arg = column.default.arg
+            defaults[column.name] = arg(None) if callable(arg) else arg
+    columns += list(defaults)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow([_copy_value(row[name] if name in row else defaults[name]) for name in columns])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def _copy_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def _bulk_load(table, rows, batch_size):
+    """Load row dicts with Postgres COPY, or insert() executemany batches elsewhere; returns the row count"""
+    use_copy = db.engine.dialect.name == 'postgresql'
+    count = 0
+    batch = []
+    for row in itertools.chain(rows, [None]):
+        if row is not None:
+            batch.append(row)
+            if len(batch) < batch_size:
+                continue
+        if batch:
+            if use_copy:
+                _copy_rows(table, batch)
+            else:
+                db.session.execute(insert(table), batch)
+            db.session.commit()
+            count += len(batch)
+            batch = []
+    return count
+
+
+def _bench_treatments():
+    treatments = Treatment.query.filter_by(active=True).order_by(Treatment.id).all()
+    if not treatments:
+        db.session.execute(insert(Treatment.__table__), [
+            {'name': name, 'duration_minutes': duration, 'price': price, 'description': description, 'active': True}
+            for name, duration, price, description in DEFAULT_TREATMENTS
+        ])
+        treatments = Treatment.query.filter_by(active=True).order_by(Treatment.id).all()
+    return [(treatment.id, treatment.duration_minutes or 60, treatment.price or 0.0) for treatment in treatments]
+
+
+def _weekly_hours(rng):
+    """{weekday: (start_minute, end_minute)} for 4-6 working days a week"""
+    days = sorted(rng.sample(range(7), rng.randint(4, 6)))
+    hours = {}
+    for day in days:
+        start = rng.choice((8, 9, 10)) * 60
+        hours[day] = (start, start + rng.choice((7, 8, 9)) * 60)
+    return hours
+
+
+def _schedule(rng, hours, count, first_day, step, treatments, buffer_minutes):
+    """
+    Yield `count` (day, start_minute, treatment) slots walking day by day from first_day,
+    inside the provider's working hours and separated by at least the buffer
+    """
+    day = first_day
+    produced = 0
+    while produced < count:
+        window = hours.get(day.weekday())
+        if window:
+            minute = window[0] + rng.choice((0, 0, 30, 60))
+            while produced < count:
+                treatment = rng.choice(treatments)
+                duration = treatment[1]
+                if minute + duration > window[1]:
+                    break
+                yield day, minute, treatment
+                produced += 1
+                # Gaps stand in for the slots nobody booked
+                minute += duration + buffer_minutes + rng.choice((0, 0, 0, 15, 30, 60))
+        day += timedelta(days=step)
+
+
+def _minute_time(minute):
+    return time(minute // 60, minute % 60)
+
+
+def scaled_counts(scale):
+    """Row counts for `seed --scale N`: scale 10 is 50 providers, 100k clients and 1M appointments"""
+    return {
+        'providers': max(1, 5 * scale),
+        'clients': 10_000 * scale,
+        'appointments': 100_000 * scale,
+        'soap_notes': 20_000 * scale,
+        'intakes': 3_000 * scale,
+        'alerts': 500 * scale,
+    }
+
+
+def generate_dataset(providers=50, clients=100_000, appointments=1_000_000, soap_notes=200_000,
+                     intakes=None, alerts=None, seed=42, batch_size=5000, anchor_date=None):
+    """
+    Bulk-generate a benchmark dataset: providers with weekly availability, clients, intakes,
+    medical alerts, appointments inside working hours and buffers, SOAP notes on completed
+    appointments, and the performance metrics rolled up from them.
+
+    Rows are loaded with Postgres COPY, or insert() executemany batches on other databases,
+    using primary keys reserved up front so nothing has to be read back. The same seed and
+    anchor_date (default today) produce the same data. Every row uses the bench.invalid
+    email domain so drop_dataset() can remove it again. Returns the generated row counts.
+    """
+    rng = random.Random(seed)
+    anchor_date = anchor_date or date.today()
+    intakes = clients // 3 if intakes is None else intakes
+    alerts = clients // 20 if alerts is None else alerts
+    started = datetime.now()
+    treatments = _bench_treatments()
+    password_hash = generate_password_hash(BENCH_PASSWORD)
+    counts = {}
+
+    first_provider = _reserve_ids(Provider.__table__, providers)
+    provider_ids = list(range(first_provider, first_provider + providers))
+    buffers = {provider_id: rng.choice((0, 10, 15, 15, 30)) for provider_id in provider_ids}
+    counts['providers'] = _bulk_load(Provider.__table__, ({
+        'id': provider_id,
+        'username': f'bench-provider-{i}@{BENCH_DOMAIN}',
+        'password_hash': password_hash,
+        'full_name': f'{FIRST_NAMES[i % len(FIRST_NAMES)]} {LAST_NAMES[(i * 7) % len(LAST_NAMES)]}',
+        'email': f'bench-provider-{i}@{BENCH_DOMAIN}',
+        'is_admin': i == 0,
+        'active': True,
+        'buffer_time_minutes': buffers[provider_id]
+    } for i, provider_id in enumerate(provider_ids)), batch_size)
+
+    hours = {provider_id: _weekly_hours(rng) for provider_id in provider_ids}
+    _bulk_load(ProviderAvailability.__table__, ({
+        'provider_id': provider_id,
+        'day_of_week': day,
+        'start_time': _minute_time(start),
+        'end_time': _minute_time(end),
+        'active': True
+    } for provider_id in provider_ids for day, (start, end) in hours[provider_id].items()), batch_size)
+    _bulk_load(ProviderTreatment.__table__, (
+        {'provider_id': provider_id, 'treatment_id': treatment_id}
+        for provider_id in provider_ids for treatment_id, _, _ in treatments
+    ), batch_size)
+
+    first_client = _reserve_ids(Client.__table__, clients)
+    counts['clients'] = _bulk_load(Client.__table__, ({
+        'id': first_client + i,
+        'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        'email': f'bench-client-{i}@{BENCH_DOMAIN}',
+        'phone': f'617-555-{i % 10000:04d}',
+        'date_of_birth': anchor_date - timedelta(days=rng.randint(18 * 365, 80 * 365)),
+        'preferred_pressure': rng.choice(('Light', 'Medium', 'Firm', 'Deep')),
+        'is_active': True
+    } for i in range(clients)), batch_size)
+
+    counts['intakes'] = _bulk_load(Intake.__table__, ({
+        'client_id': first_client + rng.randrange(clients),
+        'medical_history': rng.choice(MEDICAL_HISTORIES),
+        'booking_id': f'bench-intake-{i}',
+        'confirmed': rng.random() < 0.8,
+        'assigned_provider_id': rng.choice(provider_ids),
+        'created_at': datetime.combine(anchor_date - timedelta(days=rng.randint(0, 365)), time(12))
+    } for i in range(intakes)), batch_size)
+
+    counts['alerts'] = _bulk_load(MedicalAlert.__table__, ({
+        'client_id': first_client + rng.randrange(clients),
+        'alert_type': alert_type,
+        'severity': severity,
+        'description': description,
+        'is_active': rng.random() < 0.9,
+        'created_by_provider_id': rng.choice(provider_ids)
+    } for alert_type, severity, description in (rng.choice(ALERT_EXAMPLES) for _ in range(alerts))), batch_size)
+    print(f"  + {counts['providers']} providers, {counts['clients']} clients, "
+          f"{counts['intakes']} intakes, {counts['alerts']} alerts")
+
+    first_appointment = _reserve_ids(Appointment.__table__, appointments)
+    first_note = _reserve_ids(SOAPNote.__table__, soap_notes)
+    notes = []
+    # (provider_id, day) -> [completed, cancelled, revenue, minutes, completed client ids]
+    days = {}
+    first_completed = {}
+    # Roughly 68% of appointments end up completed; attach notes to enough of them
+    note_probability = min(1.0, soap_notes / max(appointments * 0.6, 1))
+
+    def appointment_rows():
+        appointment_id = first_appointment
+        per_provider, remainder = divmod(appointments, len(provider_ids))
+        for index, provider_id in enumerate(provider_ids):
+            count = per_provider + (1 if index < remainder else 0)
+            future = count // 5
+            for past, slots in (
+                (True, _schedule(rng, hours[provider_id], count - future, anchor_date - timedelta(days=1), -1,
+                                 treatments, buffers[provider_id])),
+                (False, _schedule(rng, hours[provider_id], future, anchor_date, 1, treatments, buffers[provider_id])),
+            ):
+                for day, minute, (treatment_id, duration, price) in slots:
+                    if past:
+                        roll = rng.random()
+                        status = 'completed' if roll < 0.85 else 'cancelled' if roll < 0.95 else 'no_show'
+                    else:
+                        status = 'confirmed' if rng.random() < 0.6 else 'scheduled'
+                    client_id = first_client + rng.randrange(clients)
+                    start, end = _minute_time(minute), _minute_time(minute + duration)
+                    created_at = datetime.combine(day - timedelta(days=rng.randint(1, 30)), start)
+                    yield {
+                        'id': appointment_id,
+                        'provider_id': provider_id,
+                        'client_id': client_id,
+                        'treatment_id': treatment_id,
+                        'appointment_date': day,
+                        'start_time': start,
+                        'end_time': end,
+                        'duration_minutes': duration,
+                        'status': status,
+                        'confirmed': status != 'scheduled',
+                        'created_at': created_at,
+                        'updated_at': created_at
+                    }
+                    totals = days.setdefault((provider_id, day), [0, 0, 0.0, 0, set()])
+                    if status == 'completed':
+                        totals[0] += 1
+                        totals[2] += price
+                        totals[3] += duration
+                        totals[4].add(client_id)
+                        if first_completed.get(client_id, day) >= day:
+                            first_completed[client_id] = day
+                    elif status == 'cancelled':
+                        totals[1] += 1
+                    if status == 'completed' and len(notes) < soap_notes and rng.random() < note_probability:
+                        example = rng.choice(SOAP_EXAMPLES)
+                        written_at = datetime.combine(day, end)
+                        notes.append({
+                            'id': first_note + len(notes),
+                            'appointment_id': appointment_id,
+                            'provider_id': provider_id,
+                            'client_id': client_id,
+                            'subjective': example['subjective'],
+                            'objective': example['objective'],
+                            'assessment': example['assessment'],
+                            'plan': example['plan'],
+                            'pain_level_before': example['pain_before'],
+                            'pain_level_after': example['pain_after'],
+                            'created_at': written_at,
+                            'updated_at': written_at
+                        })
+                    appointment_id += 1
+
+    counts['appointments'] = _bulk_load(Appointment.__table__, appointment_rows(), batch_size)
+    counts['soap_notes'] = _bulk_load(SOAPNote.__table__, notes, batch_size)
+    print(f"  + {counts['appointments']} appointments, {counts['soap_notes']} SOAP notes")
+
+    # Same figures rollups.run_rollup() would compute, without re-reading every appointment.
+    # updated_at is in the past, so incremental rollups leave these days alone.
+    counts['metrics'] = _bulk_load(PerformanceMetric.__table__, ({
+        'provider_id': provider_id,
+        'metric_date': day,
+        'sessions_completed': completed,
+        'sessions_cancelled': cancelled,
+        'total_revenue': float(revenue),
+        'new_clients': sum(1 for client_id in client_ids if first_completed[client_id] == day),
+        'returning_clients': sum(1 for client_id in client_ids if first_completed[client_id] < day),
+        'total_hours_worked': round(minutes / 60.0, 2)
+    } for (provider_id, day), (completed, cancelled, revenue, minutes, client_ids) in sorted(days.items())),
+        batch_size)
+    
+    # Bulk loads bypass the ORM events that keep client visit counters current
+    reconcile_client_stats()
+    slot_cache.invalidate_all()
+    rebuild_search_index()
+    elapsed = (datetime.now() - started).total_seconds()
+    print(f"✓ Generated {sum(counts.values())} rows in {elapsed:.1f}s")
+    return counts
+
+
+def drop_dataset():
+    """Delete everything generate_dataset() created"""
+    bench_providers = select(Provider.id).where(Provider.username.like(f'%@{BENCH_DOMAIN}')).scalar_subquery()
+    bench_clients = select(Client.id).where(Client.email.like(f'%@{BENCH_DOMAIN}')).scalar_subquery()
+    statements = [
+        delete(SOAPNote).where(or_(SOAPNote.provider_id.in_(bench_providers), SOAPNote.client_id.in_(bench_clients))),
+        delete(Intake).where(or_(Intake.client_id.in_(bench_clients), Intake.assigned_provider_id.in_(bench_providers))),
+        delete(MedicalAlert).where(or_(MedicalAlert.client_id.in_(bench_clients),
+                                       MedicalAlert.created_by_provider_id.in_(bench_providers))),
+        delete(ClientNote).where(or_(ClientNote.provider_id.in_(bench_providers), ClientNote.client_id.in_(bench_clients))),
+        delete(Appointment).where(or_(Appointment.provider_id.in_(bench_providers), Appointment.client_id.in_(bench_clients))),
+        delete(PerformanceMetric).where(PerformanceMetric.provider_id.in_(bench_providers)),
+        delete(MetricDirtyDay).where(MetricDirtyDay.provider_id.in_(bench_providers)),
+        delete(ProviderTreatment).where(ProviderTreatment.provider_id.in_(bench_providers)),
+        delete(ProviderAvailability).where(ProviderAvailability.provider_id.in_(bench_providers)),
+        delete(ProviderDailyLimit).where(ProviderDailyLimit.provider_id.in_(bench_providers)),
+        delete(WebhookEvent).where(WebhookEvent.booking_id.like('bench-%')),
+        delete(OutboundEmail).where(OutboundEmail.to_email.like(f'%@{BENCH_DOMAIN}')),
+        delete(SearchDocument).where(SearchDocument.client_id.in_(bench_clients)),
+        delete(Client).where(Client.email.like(f'%@{BENCH_DOMAIN}')),
+        delete(Provider).where(Provider.username.like(f'%@{BENCH_DOMAIN}')),
+    ]
+    for statement in statements:
+        db.session.execute(statement, execution_options={'synchronize_session': False})
+    db.session.commit()
+    slot_cache.invalidate_all()
+    reset_local_index()
+    print("✓ Benchmark dataset removed")
+
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description='Seed the database with sample or generated benchmark data')
+    parser.add_argument('--scale', type=int,
+                        help='Generate a synthetic dataset non-interactively; 1 = 5 providers, 10k clients, 100k appointments')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+    parser.add_argument('--anchor-date', type=date.fromisoformat,
+                        help='Date treated as today (YYYY-MM-DD) so runs on different days match')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--drop', action='store_true', help='Remove previously generated data first')
+    args = parser.parse_args()
+    
     with app.app_context():
+        if args.drop:
+            drop_dataset()
+        if args.scale is not None:
+            print(f"\n=== GENERATING DATASET (scale {args.scale}, seed {args.seed}) ===")
+            generate_dataset(**scaled_counts(args.scale), seed=args.seed, batch_size=args.batch_size,
+                             anchor_date=args.anchor_date)
+            return
+        if args.drop:
+            return
+        
         print("\n" + "="*50)
         print("TOUGH LOVE MASSAGE - DATA SEEDING SCRIPT")
         print("="*50)
@@ -0,0 +1,302 @@
+"""
+Per-provider-per-day cache of slot bitmaps
+An in-process LRU sits in front of an optional Redis tier shared by every gunicorn worker.
+Entries are invalidated from SQLAlchemy session events when the rows behind them change;
+the local TTL bounds how long another worker's invalidation can go unseen.
+
+Shared entries carry the provider's generation (a Redis counter bumped on every invalidation)
+they were read under. A worker only writes back a bitmap if the generation is unchanged since
+before its database read, and readers ignore entries from an older generation, so a slow
+worker can never put a stale bitmap back after another worker's booking.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from models import Appointment, Provider, ProviderAvailability, ProviderDailyLimit
+from slots import ProviderDay, load_provider_days
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+SHARED_KEY_PREFIX = 'slots:'
+SHARED_TTL_SECONDS = 24 * 60 * 60
+# Bumped by invalidate_all(); per-provider counters live under GENERATION_KEY:<provider_id>
+GENERATION_KEY = 'slots:gen'
+GENERATION_FIELD = '_gen'
+
+# stats() entries that only ever grow; the rest are point-in-time values
+COUNTER_STATS = ('local_hits', 'local_misses', 'shared_hits', 'shared_misses', 'loads', 'invalidations')
+
+# Provider fields that change a provider's bitmaps
+PROVIDER_SLOT_FIELDS = ('buffer_time_minutes', 'active')
+
+
+class SlotCache:
+    """Two-tier cache of ProviderDay bitmaps keyed by (provider_id, day)"""
+
+    def __init__(self, max_entries=5000, local_ttl=30, shared=None):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.shared = shared
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = dict.fromkeys(COUNTER_STATS, 0)
+
+    @classmethod
+    def from_env(cls):
+        shared = None
+        redis_url = os.environ.get('SLOT_CACHE_REDIS_URL') or os.environ.get('REDIS_URL')
+        if redis_url and redis is None:
+            print("⚠ REDIS_URL is set but the redis package is not installed; slot cache is per-worker only")
+        elif redis_url:
+            shared = redis.Redis.from_url(redis_url, socket_timeout=0.5)
+        return cls(
+            max_entries=int(os.environ.get('SLOT_CACHE_MAX_ENTRIES', '5000')),
+            local_ttl=float(os.environ.get('SLOT_CACHE_LOCAL_TTL', '30')),
+            shared=shared
+        )
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._local)
+        stats['shared_enabled'] = self.shared is not None
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get_provider_days(self, provider_ids, start_date, end_date):
+        """Drop-in replacement for slots.load_provider_days that reads through both tiers"""
+        provider_ids = sorted(set(provider_ids))
+        wanted = [(provider_id, day) for provider_id in provider_ids
+                  for day in _date_range(start_date, end_date)]
+        found = {}
+        now = time.monotonic()
+
+        with self._lock:
+            generation = self._generation
+            for key in wanted:
+                entry = self._local.get(key)
+                if entry and entry[0] > now:
+                    self._local.move_to_end(key)
+                    found[key] = entry[1]
+        self._count('local_hits', len(found))
+        self._count('local_misses', len(wanted) - len(found))
+
+        missing = [key for key in wanted if key not in found]
+        shared_generations = None
+        if missing and self.shared is not None:
+            from_shared, shared_generations = self._shared_get(missing)
+            self._count('shared_hits', len(from_shared))
+            self._count('shared_misses', len(missing) - len(from_shared))
+            found.update(from_shared)
+            self._store_local(from_shared, generation)
+            missing = [key for key in missing if key not in from_shared]
+
+        if missing:
+            loaded = load_provider_days(
+                {provider_id for provider_id, _ in missing},
+                min(day for _, day in missing),
+                max(day for _, day in missing)
+            )
+            loaded = {key: loaded[key] for key in missing if key in loaded}
+            self._count('loads', len(loaded))
+            found.update(loaded)
+            if self._store_local(loaded, generation) and shared_generations:
+                self._shared_set(loaded, shared_generations)
+
+        return found
+
+    def _store_local(self, provider_days, generation):
+        """Cache freshly read entries unless an invalidation happened while they were being read"""
+        expires_at = time.monotonic() + self.local_ttl
+        with self._lock:
+            if generation != self._generation:
+                return False
+            for key, provider_day in provider_days.items():
+                self._local[key] = (expires_at, provider_day)
+                self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+        return True
+
+    def _shared_get(self, keys):
+        """Entries of the current generation, plus {provider_id: generation} read alongside them"""
+        by_provider = {}
+        for provider_id, day in keys:
+            by_provider.setdefault(provider_id, []).append(day)
+        try:
+            pipe = self.shared.pipeline(transaction=True)
+            pipe.get(GENERATION_KEY)
+            for provider_id, days in by_provider.items():
+                pipe.get(_generation_key(provider_id))
+                pipe.hmget(f'{SHARED_KEY_PREFIX}{provider_id}', [GENERATION_FIELD] + [day.isoformat() for day in days])
+            results = pipe.execute()
+        except Exception as e:
+            print(f"⚠ Slot cache shared tier unavailable: {e}")
+            return {}, None
+
+        found, generations = {}, {}
+        epoch = results[0]
+        for index, (provider_id, days) in enumerate(by_provider.items()):
+            generation = _generation(epoch, results[1 + 2 * index])
+            stored_generation, *values = results[2 + 2 * index]
+            generations[provider_id] = generation
+            if _text(stored_generation) != generation:
+                continue
+            for day, value in zip(days, values):
+                if value is not None:
+                    found[(provider_id, day)] = _decode(provider_id, day, value)
+        return found, generations
+
+    def _shared_set(self, provider_days, generations):
+        """Write bitmaps back, per provider, only if no invalidation happened since generations was read"""
+        by_provider = {}
+        for (provider_id, day), provider_day in provider_days.items():
+            by_provider.setdefault(provider_id, {})[day.isoformat()] = _encode(provider_day)
+        for provider_id, mapping in by_provider.items():
+            key = f'{SHARED_KEY_PREFIX}{provider_id}'
+            try:
+                with self.shared.pipeline(transaction=True) as pipe:
+                    pipe.watch(GENERATION_KEY, _generation_key(provider_id))
+                    generation = _generation(pipe.get(GENERATION_KEY), pipe.get(_generation_key(provider_id)))
+                    if generation != generations.get(provider_id):
+                        continue
+                    stored_generation = _text(pipe.hget(key, GENERATION_FIELD))
+                    pipe.multi()
+                    if stored_generation != generation:
+                        # Days cached under an older generation must not be served alongside these
+                        pipe.delete(key)
+                    pipe.hset(key, mapping=dict(mapping, **{GENERATION_FIELD: generation}))
+                    pipe.expire(key, SHARED_TTL_SECONDS)
+                    pipe.execute()
+            except redis.WatchError:
+                # Invalidated while we were writing; the next reader loads fresh rows
+                continue
+            except Exception as e:
+                print(f"⚠ Slot cache shared tier unavailable: {e}")
+                return
+
+    def invalidate(self, provider_id, day=None):
+        """Forget one provider-day, or every day for a provider when day is None"""
+        with self._lock:
+            self._generation += 1
+            if day is None:
+                for key in [key for key in self._local if key[0] == provider_id]:
+                    del self._local[key]
+            else:
+                self._local.pop((provider_id, day), None)
+            self._stats['invalidations'] += 1
+
+        if self.shared is not None:
+            try:
+                # A new generation retires every shared day of this provider, including ones being written right now
+                pipe = self.shared.pipeline(transaction=True)
+                pipe.incr(_generation_key(provider_id))
+                pipe.delete(f'{SHARED_KEY_PREFIX}{provider_id}')
+                pipe.execute()
+            except Exception as e:
+                print(f"⚠ Slot cache shared tier unavailable: {e}")
+
+    def invalidate_all(self):
+        """Forget everything, e.g. after bulk writes that bypass the ORM"""
+        with self._lock:
+            self._generation += 1
+            self._local.clear()
+            self._stats['invalidations'] += 1
+
+        if self.shared is not None:
+            try:
+                # Older hashes stop matching and are replaced on their next write or expire
+                self.shared.incr(GENERATION_KEY)
+            except Exception as e:
+                print(f"⚠ Slot cache shared tier unavailable: {e}")
+
+
+def _generation_key(provider_id):
+    return f'{GENERATION_KEY}:{provider_id}'
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _generation(epoch, provider_generation):
+    """Combined generation of invalidate_all() and per-provider invalidations, as stored in hashes"""
+    return f'{int(epoch or 0)}.{int(provider_generation or 0)}'
+
+
+def _encode(provider_day):
+    return json.dumps({
+        'free': format(provider_day.free_mask, 'x'),
+        'counts': provider_day.treatment_counts,
+        'limits': provider_day.daily_limits
+    })
+
+
+def _decode(provider_id, day, value):
+    data = json.loads(value)
+    return ProviderDay(
+        provider_id,
+        day,
+        int(data['free'], 16),
+        treatment_counts={int(k): v for k, v in data['counts'].items()},
+        daily_limits={int(k): v for k, v in data['limits'].items()}
+    )
+
+
+def _date_range(start_date, end_date):
+    for ordinal in range(start_date.toordinal(), end_date.toordinal() + 1):
+        yield date.fromordinal(ordinal)
+
+
+slot_cache = SlotCache.from_env()
+
+
+def _old_value(obj, attr):
+    deleted = inspect(obj).attrs[attr].history.deleted
+    return deleted[0] if deleted else None
+
+
+@event.listens_for(Session, 'after_flush')
+def collect_slot_invalidations(session, flush_context):
+    """Remember which provider-days this transaction touched"""
+    pending = session.info.setdefault('slot_cache_pending', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Appointment):
+            pending.add((obj.provider_id, obj.appointment_date))
+            old_provider = _old_value(obj, 'provider_id')
+            old_date = _old_value(obj, 'appointment_date')
+            if old_provider is not None or old_date is not None:
+                pending.add((old_provider or obj.provider_id, old_date or obj.appointment_date))
+        elif isinstance(obj, (ProviderAvailability, ProviderDailyLimit)):
+            pending.add((obj.provider_id, None))
+            old_provider = _old_value(obj, 'provider_id')
+            if old_provider is not None:
+                pending.add((old_provider, None))
+        elif isinstance(obj, Provider):
+            if obj in session.deleted or any(inspect(obj).attrs[f].history.has_changes() for f in PROVIDER_SLOT_FIELDS):
+                pending.add((obj.id, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def apply_slot_invalidations(session):
+    """Invalidate only once the change is visible to other connections"""
+    for provider_id, day in session.info.pop('slot_cache_pending', ()):
+        if provider_id is not None:
+            slot_cache.invalidate(provider_id, day)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def discard_slot_invalidations(session, previous_transaction):
+    session.info.pop('slot_cache_pending', None)
@@ -0,0 +1,208 @@
+"""
+Bookable slot computation
+Each provider-day is a bitmap of 5-minute units: weekly availability windows set bits,
+existing appointments (widened by the provider's buffer time) clear them. A treatment
+can start wherever enough consecutive free bits line up.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from sqlalchemy import select
+from models import db, Provider, ProviderTreatment, ProviderAvailability, ProviderDailyLimit, Appointment
+
+UNIT_MINUTES = 5
+UNITS_PER_DAY = 24 * 60 // UNIT_MINUTES
+SLOT_STEP_MINUTES = 15
+MAX_RANGE_DAYS = 31
+
+# Appointments in these states no longer occupy the provider's time
+NON_BLOCKING_STATUSES = ('cancelled',)
+
+
+@dataclass
+class ProviderDay:
+    """Free-time bitmap for one provider on one day (bit i = minutes [i*5, i*5+5) are free)"""
+    provider_id: int
+    day: date
+    free_mask: int = 0
+    treatment_counts: dict = field(default_factory=dict)
+    daily_limits: dict = field(default_factory=dict)
+
+    def at_limit(self, treatment_id):
+        """True if the provider's daily limit for a treatment is already used up"""
+        limit = self.daily_limits.get(treatment_id)
+        return limit is not None and self.treatment_counts.get(treatment_id, 0) >= limit
+
+    def fits(self, start_unit, units):
+        """True if `units` consecutive units starting at start_unit are all free"""
+        if start_unit < 0 or units <= 0 or start_unit + units > UNITS_PER_DAY:
+            return False
+        block = _range_mask(start_unit, start_unit + units)
+        return self.free_mask & block == block
+
+    def start_units(self, units, step_units=1, not_before=0):
+        """Every start unit (aligned to step_units) where `units` free units fit"""
+        starts = _run_starts(self.free_mask, units) & _step_mask(step_units)
+        starts &= ~((1 << not_before) - 1)
+        units_found = []
+        while starts:
+            lowest = starts & -starts
+            units_found.append(lowest.bit_length() - 1)
+            starts ^= lowest
+        return units_found
+
+
+def _range_mask(start_unit, end_unit):
+    start_unit = max(0, start_unit)
+    end_unit = min(UNITS_PER_DAY, end_unit)
+    if end_unit <= start_unit:
+        return 0
+    return ((1 << (end_unit - start_unit)) - 1) << start_unit
+
+
+def _run_starts(mask, units):
+    """Bits set where a run of at least `units` set bits begins"""
+    if units <= 0:
+        return 0
+    runs, length = mask, 1
+    while length < units:
+        shift = min(length, units - length)
+        runs &= runs >> shift
+        length += shift
+    return runs
+
+
+_step_masks = {}
+
+
+def _step_mask(step_units):
+    if step_units not in _step_masks:
+        mask = 0
+        for i in range(0, UNITS_PER_DAY, step_units):
+            mask |= 1 << i
+        _step_masks[step_units] = mask
+    return _step_masks[step_units]
+
+
+def to_unit(value, round_up=False):
+    """Convert a time of day to a unit index, rounding down unless round_up"""
+    minutes = value.hour * 60 + value.minute
+    if round_up and (value.second or value.microsecond):
+        minutes += 1
+    units, remainder = divmod(minutes, UNIT_MINUTES)
+    return units + (1 if round_up and remainder else 0)
+
+
+def unit_to_str(unit):
+    return f"{unit * UNIT_MINUTES // 60:02d}:{unit * UNIT_MINUTES % 60:02d}"
+
+
+def units_for(minutes):
+    return -(-int(minutes or 0) // UNIT_MINUTES)
+
+
+def _date_range(start_date, end_date):
+    day = start_date
+    while day <= end_date:
+        yield day
+        day += timedelta(days=1)
+
+
+def load_provider_days(provider_ids, start_date, end_date):
+    """
+    Build ProviderDay bitmaps for every provider and date in [start_date, end_date].
+    Uses four queries regardless of the number of providers or days.
+    Returns {(provider_id, day): ProviderDay}.
+    """
+    provider_ids = sorted(set(provider_ids))
+    if not provider_ids:
+        return {}
+
+    buffers = dict(db.session.execute(
+        select(Provider.id, Provider.buffer_time_minutes).where(Provider.id.in_(provider_ids))
+    ).all())
+
+    weekly = defaultdict(int)
+    for provider_id, day_of_week, start_time, end_time in db.session.execute(
+        select(ProviderAvailability.provider_id, ProviderAvailability.day_of_week,
+               ProviderAvailability.start_time, ProviderAvailability.end_time)
+        .where(ProviderAvailability.provider_id.in_(provider_ids),
+               ProviderAvailability.active.isnot(False))
+    ):
+        weekly[(provider_id, day_of_week)] |= _range_mask(to_unit(start_time, round_up=True), to_unit(end_time))
+
+    limits = defaultdict(dict)
+    for provider_id, treatment_id, max_per_day in db.session.execute(
+        select(ProviderDailyLimit.provider_id, ProviderDailyLimit.treatment_id, ProviderDailyLimit.max_per_day)
+        .where(ProviderDailyLimit.provider_id.in_(provider_ids))
+    ):
+        limits[provider_id][treatment_id] = max_per_day
+
+    days = {}
+    for provider_id in provider_ids:
+        for day in _date_range(start_date, end_date):
+            days[(provider_id, day)] = ProviderDay(
+                provider_id, day, weekly[(provider_id, day.weekday())],
+                daily_limits=dict(limits[provider_id])
+            )
+
+    # idx_appointment_provider_date covers this range scan
+    for provider_id, day, start_time, end_time, duration, treatment_id in db.session.execute(
+        select(Appointment.provider_id, Appointment.appointment_date, Appointment.start_time,
+               Appointment.end_time, Appointment.duration_minutes, Appointment.treatment_id)
+        .where(Appointment.provider_id.in_(provider_ids),
+               Appointment.appointment_date >= start_date,
+               Appointment.appointment_date <= end_date,
+               Appointment.status.notin_(NON_BLOCKING_STATUSES))
+    ):
+        provider_day = days.get((provider_id, day))
+        if provider_day is None:
+            continue
+        start_unit = to_unit(start_time)
+        end_unit = to_unit(end_time, round_up=True) if end_time else start_unit
+        end_unit = max(end_unit, start_unit + units_for(duration))
+        buffer_units = units_for(buffers.get(provider_id) or 0)
+        provider_day.free_mask &= ~_range_mask(start_unit - buffer_units, end_unit + buffer_units)
+        if treatment_id is not None:
+            provider_day.treatment_counts[treatment_id] = provider_day.treatment_counts.get(treatment_id, 0) + 1
+
+    return days
+
+
+def get_bookable_provider_ids(treatment_id, location_id=None):
+    """Active providers who offer a treatment, optionally at one location"""
+    query = select(Provider.id).join(
+        ProviderTreatment, ProviderTreatment.provider_id == Provider.id
+    ).where(
+        ProviderTreatment.treatment_id == treatment_id,
+        Provider.active.isnot(False)
+    )
+    if location_id is not None:
+        query = query.where(Provider.location_id == location_id)
+    return [provider_id for provider_id, in db.session.execute(query.distinct())]
+
+
+def find_free_slots(treatment, start_date, end_date, location_id=None, now=None,
+                    step_minutes=SLOT_STEP_MINUTES, load_days=load_provider_days):
+    """
+    Free start times for a treatment across all eligible providers.
+    Returns {day: {start_unit: [provider_id, ...]}} with only days that have slots.
+    """
+    now = now or datetime.now()
+    provider_ids = get_bookable_provider_ids(treatment.id, location_id)
+    if not provider_ids:
+        return {}
+
+    units = units_for(treatment.duration_minutes or 60)
+    step_units = max(1, step_minutes // UNIT_MINUTES)
+
+    slots = defaultdict(lambda: defaultdict(list))
+    for (provider_id, day), provider_day in sorted(load_days(provider_ids, start_date, end_date).items()):
+        if day < now.date():
+            continue
+        if provider_day.at_limit(treatment.id):
+            continue
+        not_before = to_unit(now.time(), round_up=True) if day == now.date() else 0
+        for start_unit in provider_day.start_units(units, step_units, not_before):
+            slots[day][start_unit].append(provider_id)
+    return slots
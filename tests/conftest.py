@@ -0,0 +1,109 @@
+"""
+Shared fixtures: the app runs against a throwaway SQLite database with background jobs,
+page caching and compression off, so tests see every query and response as rendered.
+"""
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+from flask.testing import FlaskClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_database = os.path.join(tempfile.mkdtemp(prefix='massage-tests-'), 'test.db')
+os.environ.update({
+    'DATABASE_URL': f'sqlite:///{_database}',
+    'BACKGROUND_JOBS': '0',
+    'PAGE_CACHE': '0',
+    'COMPRESSION': '0',
+    'ADMIN_EMAIL': 'admin@example.com',
+    'ADMIN_PASSWORD': 'admin-password',
+})
+for _name in ('REDIS_URL', 'SLOT_CACHE_REDIS_URL', 'METRICS_TOKEN'):
+    os.environ.pop(_name, None)
+
+_sequence = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def db(app):
+    from models import db
+    with app.app_context():
+        yield db
+        db.session.rollback()
+        db.session.remove()
+
+
+@pytest.fixture
+def make_provider(db):
+    from models import Provider
+
+    def make(**fields):
+        number = next(_sequence)
+        provider = Provider(**{'username': f'provider{number}', 'email': f'provider{number}@example.com',
+                               'full_name': f'Provider {number}', 'password_hash': 'not-a-real-hash', **fields})
+        db.session.add(provider)
+        db.session.commit()
+        return provider
+    return make
+
+
+@pytest.fixture
+def make_client(db):
+    from models import Client
+
+    def make(**fields):
+        number = next(_sequence)
+        client = Client(**{'name': f'Client {number}', 'email': f'client{number}@example.com', **fields})
+        db.session.add(client)
+        db.session.commit()
+        return client
+    return make
+
+
+@pytest.fixture
+def treatment(db):
+    from models import Treatment
+    treatment = Treatment(name=f'Test Treatment {next(_sequence)}', duration_minutes=60, price=100.0)
+    db.session.add(treatment)
+    db.session.commit()
+    return treatment
+
+
+class FreshSessionClient(FlaskClient):
+    """
+    Requests made while a test holds an app context reuse it, and with it the test's
+    SQLAlchemy session and Flask-Login's cached user on g. Start every request with an
+    empty session and no signed-in user so it loads (and counts) everything itself, as it
+    would in production.
+    """
+
+    def open(self, *args, **kwargs):
+        from flask import g
+        from models import db
+        db.session.remove()
+        g.pop('_login_user', None)
+        return super().open(*args, **kwargs)
+
+
+@pytest.fixture
+def login(app):
+    """Test client signed in as the provider with this id"""
+    app.test_client_class = FreshSessionClient
+
+    def login_as(provider_id):
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(provider_id)
+        return client
+    return login_as
@@ -0,0 +1,33 @@
+import hashlib
+
+from auth import identity_version
+
+
+def test_identity_version_is_keyed_by_secret_key(app, make_provider, monkeypatch):
+    provider = make_provider()
+    raw = f"{provider.password_hash}|{provider.active is not False}|{bool(provider.is_admin)}"
+    version = identity_version(provider)
+
+    # The cookie must not carry a plain digest of the password hash
+    assert version != hashlib.sha256(raw.encode()).hexdigest()[:16]
+    monkeypatch.setattr(app, 'secret_key', 'another-secret')
+    assert identity_version(provider) != version
+
+
+def test_admin_route_loads_the_provider_once(login, make_provider):
+    client = login(make_provider(is_admin=True).id)
+
+    # The session user's one Provider lookup, then the treatments; admin_required adds nothing
+    first = client.get('/admin/treatments')
+    assert first.status_code == 200
+    assert first.headers['X-Query-Count'] == '2'
+
+    # Within IDENTITY_TTL_SECONDS the cached identity answers without touching providers
+    assert client.get('/admin/treatments').headers['X-Query-Count'] == '1'
+
+
+def test_admin_route_denies_providers_without_extra_queries(login, make_provider):
+    response = login(make_provider().id).get('/admin/treatments')
+
+    assert response.status_code == 302
+    assert response.headers['X-Query-Count'] == '1'
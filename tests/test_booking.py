@@ -0,0 +1,118 @@
+import random
+import threading
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from booking import book_appointment, BookingError
+from models import Appointment, ProviderAvailability, ProviderDailyLimit, ProviderTreatment
+
+DAY = date.today() + timedelta(days=365)
+
+
+def _bookable(db, provider, treatment, daily_limit=None, offers=True):
+    if offers:
+        db.session.add(ProviderTreatment(provider_id=provider.id, treatment_id=treatment.id))
+    db.session.add(ProviderAvailability(provider_id=provider.id, day_of_week=DAY.weekday(),
+                                        start_time=time(8, 0), end_time=time(20, 0)))
+    if daily_limit:
+        db.session.add(ProviderDailyLimit(provider_id=provider.id, treatment_id=treatment.id, max_per_day=daily_limit))
+    db.session.commit()
+
+
+def _booking(client, treatment, **fields):
+    return {'client_id': client.id, 'treatment_id': treatment.id, 'date': DAY.isoformat(), 'start_time': '10:00',
+            **fields}
+
+
+def test_provider_cannot_book_for_another_provider(db, login, make_provider, make_client, treatment):
+    provider, other = make_provider(), make_provider()
+    _bookable(db, other, treatment)
+    client, other_id = make_client(), other.id
+
+    response = login(provider.id).post('/api/appointments', json=_booking(client, treatment, provider_id=other_id))
+
+    assert response.status_code == 403
+    assert Appointment.query.filter_by(provider_id=other_id).count() == 0
+
+
+def test_admin_can_book_for_another_provider(db, login, make_provider, make_client, treatment):
+    admin, other = make_provider(is_admin=True), make_provider()
+    _bookable(db, other, treatment)
+    client, other_id = make_client(), other.id
+
+    response = login(admin.id).post('/api/appointments', json=_booking(client, treatment, provider_id=other_id))
+
+    assert response.status_code == 201
+    assert Appointment.query.filter_by(provider_id=other_id).count() == 1
+
+
+def test_treatments_the_provider_does_not_offer_are_refused(db, login, make_provider, make_client, treatment):
+    provider = make_provider()
+    _bookable(db, provider, treatment, offers=False)
+    client, provider_id = make_client(), provider.id
+
+    response = login(provider_id).post('/api/appointments', json=_booking(client, treatment))
+
+    assert (response.status_code, response.get_json()['status']) == (409, 'error')
+    assert 'does not offer' in response.get_json()['message']
+    assert Appointment.query.filter_by(provider_id=provider_id).count() == 0
+
+
+def test_inactive_and_unknown_providers_take_no_bookings(db, login, make_provider, make_client, treatment):
+    admin, retired = make_provider(is_admin=True), make_provider(active=False)
+    _bookable(db, retired, treatment)
+    client, retired_id = make_client(), retired.id
+    http = login(admin.id)
+
+    inactive = http.post('/api/appointments', json=_booking(client, treatment, provider_id=retired_id))
+    unknown = http.post('/api/appointments', json=_booking(client, treatment, provider_id=10 ** 9))
+
+    assert (inactive.status_code, unknown.status_code) == (409, 409)
+    assert Appointment.query.filter_by(provider_id=retired_id).count() == 0
+    with pytest.raises(BookingError):
+        book_appointment(retired_id, client.id, DAY, time(10, 0))
+
+
+def test_concurrent_bookings_never_overlap_or_exceed_limits(app, db, make_provider, make_client, treatment):
+    """Race many threads for one provider-day; the lock must leave no overlap, buffer or limit violations"""
+    threads, attempts, daily_limit = 8, 20, 6
+    provider = make_provider(buffer_time_minutes=15)
+    _bookable(db, provider, treatment, daily_limit)
+    provider_id, client_id, treatment_id = provider.id, make_client().id, treatment.id
+    buffer_minutes = provider.buffer_time_minutes
+
+    results = Counter()
+    results_lock = threading.Lock()
+
+    def hammer(seed):
+        rng = random.Random(seed)
+        with app.app_context():
+            for _ in range(attempts):
+                start = time(rng.randint(8, 18), rng.choice((0, 15, 30, 45)))
+                try:
+                    book_appointment(provider_id, client_id, DAY, start, treatment_id=treatment_id)
+                    outcome = 'booked'
+                except BookingError:
+                    outcome = 'rejected'
+                except Exception as e:
+                    outcome = f'{type(e).__name__}: {e}'
+                with results_lock:
+                    results[outcome] += 1
+
+    workers = [threading.Thread(target=hammer, args=(seed,)) for seed in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    db.session.commit()
+    booked = Appointment.query.filter_by(provider_id=provider_id, appointment_date=DAY)\
+        .order_by(Appointment.start_time).all()
+    assert set(results) <= {'booked', 'rejected'}, results
+    assert results['booked'] == len(booked) > 0
+    assert len(booked) <= daily_limit
+    for previous, current in zip(booked, booked[1:]):
+        earliest = datetime.combine(DAY, previous.end_time) + timedelta(minutes=buffer_minutes)
+        assert datetime.combine(DAY, current.start_time) >= earliest, (previous.start_time, current.start_time)
@@ -0,0 +1,132 @@
+from datetime import date, time
+
+import pytest
+from sqlalchemy import update
+
+from client_stats import reconcile_client_stats, COUNTER_FIELDS
+from models import Appointment, Client
+
+MARCH_3, MARCH_10, MARCH_17 = date(2025, 3, 3), date(2025, 3, 10), date(2025, 3, 17)
+
+
+@pytest.fixture
+def visit(db, make_provider, treatment):
+    provider = make_provider()
+
+    def make(client, day, status='completed'):
+        appointment = Appointment(provider_id=provider.id, client_id=client.id, treatment_id=treatment.id,
+                                  appointment_date=day, start_time=time(10, 0), end_time=time(11, 0), status=status)
+        db.session.add(appointment)
+        db.session.commit()
+        return appointment
+    return make
+
+
+def _counters(db, client):
+    db.session.refresh(client)
+    return {field: getattr(client, field) for field in COUNTER_FIELDS}
+
+
+def _assert_matches_reconcile(db, *clients):
+    """The incrementally maintained counters are exactly what a full recompute produces"""
+    before = [_counters(db, client) for client in clients]
+    reconcile_client_stats()
+    assert [_counters(db, client) for client in clients] == before
+
+
+def test_completed_visits_count(db, make_client, visit, treatment):
+    client = make_client()
+    visit(client, MARCH_10)
+    visit(client, MARCH_3)
+
+    assert _counters(db, client) == {'visit_count': 2, 'first_visit': MARCH_3, 'last_visit': MARCH_10,
+                                     'lifetime_value': 2 * treatment.price}
+    _assert_matches_reconcile(db, client)
+
+
+def test_completed_to_cancelled(db, make_client, visit):
+    client = make_client()
+    visit(client, MARCH_3)
+    last = visit(client, MARCH_10)
+
+    last.status = 'cancelled'
+    db.session.commit()
+
+    assert _counters(db, client)['visit_count'] == 1
+    assert _counters(db, client)['last_visit'] == MARCH_3
+    _assert_matches_reconcile(db, client)
+
+
+def test_cancelled_to_completed(db, make_client, visit):
+    client = make_client()
+    visit(client, MARCH_3)
+    later = visit(client, MARCH_17, status='cancelled')
+    assert _counters(db, client)['visit_count'] == 1
+
+    later.status = 'completed'
+    db.session.commit()
+
+    assert _counters(db, client)['visit_count'] == 2
+    assert _counters(db, client)['last_visit'] == MARCH_17
+    _assert_matches_reconcile(db, client)
+
+
+def test_reschedule_moves_first_and_last_visit(db, make_client, visit):
+    client = make_client()
+    first = visit(client, MARCH_3)
+    visit(client, MARCH_10)
+
+    first.appointment_date = MARCH_17
+    db.session.commit()
+
+    counters = _counters(db, client)
+    assert (counters['visit_count'], counters['first_visit'], counters['last_visit']) == (2, MARCH_10, MARCH_17)
+    _assert_matches_reconcile(db, client)
+
+
+def test_delete_last_visit_clears_counters(db, make_client, visit):
+    client = make_client()
+    only = visit(client, MARCH_3)
+
+    db.session.delete(only)
+    db.session.commit()
+
+    assert _counters(db, client) == {'visit_count': 0, 'first_visit': None, 'last_visit': None,
+                                     'lifetime_value': 0.0}
+    _assert_matches_reconcile(db, client)
+
+
+def test_moving_a_visit_to_another_client(db, make_client, visit, treatment):
+    giver, receiver = make_client(), make_client()
+    moved = visit(giver, MARCH_10)
+    visit(giver, MARCH_3)
+    visit(receiver, MARCH_17)
+
+    moved.client_id = receiver.id
+    db.session.commit()
+
+    assert _counters(db, giver) == {'visit_count': 1, 'first_visit': MARCH_3, 'last_visit': MARCH_3,
+                                    'lifetime_value': treatment.price}
+    assert _counters(db, receiver) == {'visit_count': 2, 'first_visit': MARCH_10, 'last_visit': MARCH_17,
+                                       'lifetime_value': 2 * treatment.price}
+    _assert_matches_reconcile(db, giver, receiver)
+
+
+def test_reconcile_repairs_corrupted_counters(db, make_client, visit, treatment):
+    client, lapsed = make_client(), make_client()
+    visit(client, MARCH_3)
+    visit(client, MARCH_10)
+    expected = _counters(db, client)
+    db.session.execute(update(Client).where(Client.id == client.id)
+                       .values(visit_count=99, first_visit=MARCH_17, last_visit=None, lifetime_value=-1.0))
+    # Counters left behind on a client with no completed visits at all
+    db.session.execute(update(Client).where(Client.id == lapsed.id)
+                       .values(visit_count=4, first_visit=MARCH_3, last_visit=MARCH_3, lifetime_value=360.0))
+    db.session.commit()
+
+    assert reconcile_client_stats() >= 2
+
+    assert _counters(db, client) == expected
+    assert _counters(db, lapsed) == {'visit_count': 0, 'first_visit': None, 'last_visit': None,
+                                     'lifetime_value': 0.0}
+    assert reconcile_client_stats() == 0
@@ -0,0 +1,87 @@
+import itertools
+
+import pytest
+from sqlalchemy import select
+
+import clients
+from clients import upsert_clients, upsert_client, load_clients
+from models import Client, SearchDocument
+
+_numbers = itertools.count(1)
+
+
+@pytest.fixture(params=['on_conflict', 'fallback'])
+def upsert(request, db, monkeypatch):
+    """upsert_clients through INSERT ... ON CONFLICT, and through the ORM fallback for other databases"""
+    if request.param == 'fallback':
+        monkeypatch.setattr(clients, '_dialect_insert', lambda: None)
+    return upsert_clients
+
+
+def _email():
+    return f'upsert{next(_numbers)}@example.com'
+
+
+def _stored(db, client_id):
+    db.session.expire_all()
+    return db.session.get(Client, client_id)
+
+
+def _document_title(db, client_id):
+    return db.session.execute(select(SearchDocument.title).where(SearchDocument.kind == 'client',
+                                                                 SearchDocument.source_id == client_id)).scalar()
+
+
+def test_existing_email_is_updated_in_place(db, upsert, make_client):
+    client = make_client(phone='555-0100')
+
+    ids = upsert([{'name': 'Renamed Client', 'email': client.email, 'phone': ''}], commit=True)
+
+    assert ids == {client.email: client.id}
+    stored = _stored(db, client.id)
+    # Blank values never overwrite what is stored
+    assert (stored.name, stored.phone) == ('Renamed Client', '555-0100')
+    assert Client.query.filter_by(email=client.email).count() == 1
+
+
+def test_update_false_leaves_existing_clients_alone(db, upsert, make_client):
+    client = make_client()
+    new_email = _email()
+
+    ids = upsert([('Someone Else', client.email, '555-0199'), ('New Client', new_email)], update=False, commit=True)
+
+    assert ids[client.email] == client.id
+    assert _stored(db, client.id).name == client.name
+    assert _stored(db, ids[new_email]).name == 'New Client'
+
+
+def test_emails_are_trimmed_and_lowercased(db, upsert):
+    email = _email()
+
+    ids = upsert([('First Spelling', f'  {email.upper()} ', None),
+                  {'name': 'Second Spelling', 'email': email.title(), 'phone': '555-0123'},
+                  ('No Email', '   ', None)], commit=True)
+
+    assert list(ids) == [email]
+    stored = _stored(db, ids[email])
+    assert (stored.email, stored.name, stored.phone) == (email, 'Second Spelling', '555-0123')
+    assert upsert_client('Third Spelling', email.upper(), commit=True) == ids[email]
+
+
+def test_batches_cover_every_record(db, upsert):
+    emails = [_email() for _ in range(5)]
+
+    ids = upsert([(f'Batch Client {i}', email) for i, email in enumerate(emails)], batch_size=2, commit=True)
+
+    assert sorted(ids) == sorted(emails)
+    assert {client.email for client in load_clients(ids.values()).values()} == set(emails)
+
+
+def test_search_documents_follow_the_upsert(db, upsert, make_client):
+    client = make_client(name='Before The Upsert')
+    new_email = _email()
+
+    ids = upsert([('After The Upsert', client.email), ('Brand New Client', new_email)], commit=True)
+
+    assert _document_title(db, client.id) == 'After The Upsert'
+    assert _document_title(db, ids[new_email]) == 'Brand New Client'
@@ -0,0 +1,120 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from compression import CompressionMiddleware, choose_encoding, brotli
+
+BODY = 'Relaxation massage, 60 minutes. ' * 64
+
+
+@pytest.fixture
+def site(tmp_path):
+    """A small app behind the middleware, with a static folder of its own"""
+    static = tmp_path / 'static'
+    static.mkdir()
+    site = Flask('compression_site', static_folder=str(static))
+
+    @site.route('/page')
+    def page():
+        return BODY
+
+    @site.route('/tiny')
+    def tiny():
+        return 'ok'
+
+    site.wsgi_app = CompressionMiddleware(site.wsgi_app, min_size=512, static_folder=site.static_folder,
+                                          static_url_path=site.static_url_path)
+    return site
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip', 'gzip'),
+    ('gzip;q=0.5, br;q=0.9', 'br'),
+    ('br;q=0.2, gzip;q=0.8', 'gzip'),
+    ('br;q=0, gzip;q=0', None),
+    ('*;q=0.3, br;q=0', 'gzip'),
+    ('identity', None),
+    ('', None),
+])
+def test_negotiation_follows_q_values(header, expected):
+    assert choose_encoding(header, ('br', 'gzip')) == expected
+
+
+def test_text_above_min_size_is_gzipped(site):
+    response = site.test_client().get('/page', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data).decode() == BODY
+
+
+@pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+def test_brotli_is_preferred_when_accepted(site):
+    response = site.test_client().get('/page', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data).decode() == BODY
+
+
+def test_bodies_under_min_size_pass_through(site):
+    response = site.test_client().get('/tiny', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'ok'
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_head_is_never_encoded(site):
+    with open(f'{site.static_folder}/app.css', 'wb') as f:
+        f.write(b'body { margin: 0 }\n' * 100)
+    with open(f'{site.static_folder}/app.css.gz', 'wb') as f:
+        f.write(gzip.compress(b'body { margin: 0 }\n' * 100))
+    http = site.test_client()
+
+    head = http.head('/page', headers={'Accept-Encoding': 'gzip'})
+    static = http.head('/static/app.css', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in head.headers
+    assert head.data == b''
+    assert static.status_code == 200
+    assert 'Content-Encoding' not in static.headers
+
+
+def test_precompressed_sibling_is_served_and_revalidates(site):
+    folder = site.static_folder
+    css = b'body { margin: 0 }\n' * 100
+    with open(f'{folder}/app.css', 'wb') as f:
+        f.write(css)
+    with open(f'{folder}/app.css.gz', 'wb') as f:
+        f.write(gzip.compress(css, mtime=0))
+    http = site.test_client()
+
+    response = http.get('/static/app.css', headers={'Accept-Encoding': 'gzip'})
+    etag = response.headers['ETag']
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == css
+    assert int(response.headers['Content-Length']) == len(response.data)
+    # The encoded body is not the file itself, so only a weak validator is honest
+    assert etag.startswith('W/')
+    revalidated = http.get('/static/app.css', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert (revalidated.status_code, revalidated.data) == (304, b'')
+    assert 'Content-Encoding' not in revalidated.headers
+    # Without gzip the original file goes out untouched
+    plain = http.get('/static/app.css', headers={'Accept-Encoding': 'identity'})
+    assert (plain.data, plain.headers.get('Content-Encoding')) == (css, None)
+
+
+@pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+def test_brotli_sibling_wins_when_both_exist(site):
+    folder = site.static_folder
+    css = b'a { color: teal }\n' * 100
+    for name, data in (('app.css', css), ('app.css.gz', gzip.compress(css)), ('app.css.br', brotli.compress(css))):
+        with open(f'{folder}/{name}', 'wb') as f:
+            f.write(data)
+
+    response = site.test_client().get('/static/app.css', headers={'Accept-Encoding': 'gzip, br'})
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == css
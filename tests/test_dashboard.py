@@ -0,0 +1,127 @@
+import base64
+from datetime import date, time, timedelta
+
+import pytest
+from sqlalchemy import insert
+
+from dashboard import get_appointment_page, encode_cursor, decode_cursor, MAX_PAGE_SIZE
+from models import Appointment, SOAPNote, MedicalAlert, Intake
+
+
+def _seed_schedule(db, provider, treatment, make_client, count):
+    """count rows in every portal section, each for a different client so no section's loads hide another's"""
+    today = date.today()
+
+    def appointment(day, start, status):
+        row = Appointment(provider_id=provider.id, client_id=make_client().id, treatment_id=treatment.id,
+                          appointment_date=day, start_time=start, end_time=time(20, 0), status=status)
+        db.session.add(row)
+        return row
+
+    for i in range(count):
+        start = time(8 + i // 6, (i % 6) * 10)
+        appointment(today, start, 'scheduled')
+        appointment(today + timedelta(days=1), start, 'confirmed')
+        completed = appointment(today - timedelta(days=1), start, 'completed')
+        db.session.flush()
+        db.session.add(SOAPNote(appointment_id=completed.id, provider_id=provider.id, client_id=completed.client_id,
+                                subjective='s', objective='o', assessment='a', plan='p'))
+        db.session.add(MedicalAlert(client_id=make_client().id, alert_type='Injury', description='Sore shoulder'))
+        db.session.add(Intake(client_id=make_client().id, assigned_provider_id=provider.id))
+    db.session.commit()
+
+
+def _portal_query_count(login, provider_id):
+    response = login(provider_id).get('/provider-portal')
+    assert response.status_code == 200
+    return int(response.headers['X-Query-Count'])
+
+
+def test_provider_portal_query_count_does_not_grow_with_rows(app, db, login, make_provider, make_client, treatment):
+    few, many = make_provider(), make_provider()
+    _seed_schedule(db, few, treatment, make_client, 1)
+    _seed_schedule(db, many, treatment, make_client, 30)
+    few_id, many_id = few.id, many.id
+    # The first request in a process does one-off work; measure steady-state renders
+    _portal_query_count(login, few_id)
+
+    assert _portal_query_count(login, few_id) == _portal_query_count(login, many_id)
+
+
+def _book_many(db, provider, client, treatment, days, per_day):
+    """per_day appointments on each of days consecutive dates, inserted in shuffled id order"""
+    first = date(2030, 1, 7)
+    rows = [dict(provider_id=provider.id, client_id=client.id, treatment_id=treatment.id,
+                 appointment_date=first + timedelta(days=day), start_time=time(8 + slot // 4, slot % 4 * 15),
+                 end_time=time(20, 0), status='scheduled')
+            for slot in reversed(range(per_day)) for day in reversed(range(days))]
+    db.session.execute(insert(Appointment), rows)
+    db.session.commit()
+
+
+def _walk(provider_id, limit, total):
+    pages, after = [], None
+    while len(pages) <= total:
+        rows, cursor = get_appointment_page(provider_id, after=after, limit=limit)
+        pages.append([row.id for row in rows])
+        if cursor is None:
+            return pages
+        after = decode_cursor(cursor)
+    raise AssertionError(f'more than {total} pages of {limit}: the cursor is not advancing')
+
+
+def test_pages_cover_every_appointment_once_across_shared_dates(db, make_provider, make_client, treatment):
+    provider = make_provider()
+    _book_many(db, provider, make_client(), treatment, days=3, per_day=7)
+    expected = [row.id for row in Appointment.query.filter_by(provider_id=provider.id)
+                .order_by(Appointment.appointment_date, Appointment.start_time, Appointment.id)]
+
+    for limit in (1, 3, 7, 20, 21):
+        pages = _walk(provider.id, limit, len(expected))
+        assert [appointment_id for page in pages for appointment_id in page] == expected
+        assert all(len(page) == limit for page in pages[:-1])
+
+
+def test_cursor_on_an_exact_date_and_time_key_breaks_the_tie_on_id(db, make_provider, make_client, treatment):
+    provider = make_provider()
+    _book_many(db, provider, make_client(), treatment, days=1, per_day=3)
+    first, second, third = Appointment.query.filter_by(provider_id=provider.id).order_by(Appointment.start_time)
+
+    rows, _ = get_appointment_page(provider.id, after=(second.appointment_date, second.start_time, second.id - 1))
+    assert [row.id for row in rows] == [second.id, third.id]
+    rows, _ = get_appointment_page(provider.id, after=(second.appointment_date, second.start_time, second.id))
+    assert [row.id for row in rows] == [third.id]
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(date(2030, 1, 7), time(9, 45), 12)) == (date(2030, 1, 7), time(9, 45), 12)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not a cursor',
+    base64.urlsafe_b64encode(b'\xff\xfe\xfd').decode(),
+    base64.urlsafe_b64encode(b'2030-01-07|09:45').decode(),
+    base64.urlsafe_b64encode(b'2030-13-07|09:45|12').decode(),
+    base64.urlsafe_b64encode(b'2030-01-07|09:45|twelve').decode(),
+])
+def test_malformed_cursor_is_a_400(db, login, make_provider, cursor):
+    provider = make_provider()
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+    response = login(provider.id).get(f'/api/providers/{provider.id}/appointments', query_string={'cursor': cursor})
+
+    assert response.status_code == 400
+    assert response.get_json()['status'] == 'error'
+
+
+def test_page_size_is_clamped(db, login, make_provider, make_client, treatment):
+    provider = make_provider()
+    _book_many(db, provider, make_client(), treatment, days=MAX_PAGE_SIZE // 40 + 1, per_day=40)
+    client, url = login(provider.id), f'/api/providers/{provider.id}/appointments'
+
+    huge = client.get(url, query_string={'limit': MAX_PAGE_SIZE * 10}).get_json()
+    assert len(huge['appointments']) == MAX_PAGE_SIZE
+    assert huge['next_cursor']
+    assert len(client.get(url, query_string={'limit': 0}).get_json()['appointments']) == 1
+    assert client.get(url, query_string={'limit': 'ten'}).status_code == 400
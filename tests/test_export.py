@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+from datetime import date, time, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+from export import APPOINTMENT_COLUMNS, appointment_export_query, stream_export, pyarrow
+from models import Appointment, Location
+
+START = date(2031, 5, 1)
+END = START + timedelta(days=6)
+NAMES = [name for name, _, _ in APPOINTMENT_COLUMNS]
+
+
+@pytest.fixture
+def week(db, make_provider, make_client, treatment):
+    """Seven appointments in a week nobody else books, at two locations; returns the one location's id"""
+    Appointment.query.filter(Appointment.appointment_date.between(START, END + timedelta(days=1))).delete()
+    location, other = Location(name='Holliston'), Location(name='Worcester')
+    db.session.add_all([location, other])
+    db.session.flush()
+    here, there, client = make_provider(location_id=location.id), make_provider(location_id=other.id), make_client()
+    for offset in range(7):
+        provider = here if offset % 3 else there
+        db.session.add(Appointment(provider_id=provider.id, client_id=client.id, treatment_id=treatment.id,
+                                   appointment_date=START + timedelta(days=offset), start_time=time(10, 0),
+                                   end_time=time(11, 0), duration_minutes=60, status='scheduled'))
+    # Outside the week: never exported
+    db.session.add(Appointment(provider_id=here.id, client_id=client.id, appointment_date=END + timedelta(days=1),
+                               start_time=time(10, 0), end_time=time(11, 0)))
+    db.session.commit()
+    return location.id
+
+
+def _count(db, **filters):
+    query = appointment_export_query(START, END, **filters)
+    return db.session.execute(select(func.count()).select_from(query.subquery())).scalar()
+
+
+def _export(fmt, **filters):
+    return list(stream_export(appointment_export_query(START, END, **filters), fmt, batch_size=2))
+
+
+def test_csv_has_a_header_and_every_row(db, week):
+    rows = list(csv.reader(io.StringIO(''.join(_export('csv')))))
+
+    assert rows[0] == NAMES
+    assert len(rows) - 1 == _count(db) == 7
+    assert [row[NAMES.index('appointment_date')] for row in rows[1:]] == \
+        [(START + timedelta(days=offset)).isoformat() for offset in range(7)]
+
+
+def test_csv_of_nothing_is_just_the_header(db, week):
+    query = appointment_export_query(END + timedelta(days=100), END + timedelta(days=101))
+
+    assert ''.join(stream_export(query, 'csv')).splitlines() == [','.join(NAMES)]
+
+
+def test_jsonl_streams_one_chunk_per_batch(db, week):
+    chunks = _export('jsonl', location_id=week)
+    records = [json.loads(line) for chunk in chunks for line in chunk.splitlines()]
+
+    assert len(records) == _count(db, location_id=week) == 4
+    assert len(chunks) == 2
+    assert {record['location_name'] for record in records} == {'Holliston'}
+    assert records[0]['start_time'] == '10:00:00'
+    assert records[0]['price'] == 100.0
+
+
+@pytest.mark.skipif(pyarrow is None, reason='pyarrow is not installed')
+def test_parquet_writes_a_row_group_per_batch(db, week):
+    import pyarrow.parquet
+    data = b''.join(_export('parquet'))
+    parquet = pyarrow.parquet.ParquetFile(io.BytesIO(data))
+
+    assert parquet.metadata.num_rows == _count(db) == 7
+    assert parquet.metadata.num_row_groups == 4
+    assert parquet.schema_arrow.names == NAMES
+    assert parquet.read().column('appointment_date').to_pylist()[0] == START
+
+
+def test_unknown_format_is_rejected(db):
+    with pytest.raises(ValueError):
+        stream_export(appointment_export_query(), 'xlsx')
+
+
+def test_route_streams_the_filtered_export(db, week, make_provider, login):
+    http = login(make_provider(is_admin=True).id)
+
+    response = http.get('/admin/export/appointments.csv',
+                        query_string={'start': START.isoformat(), 'end': END.isoformat(), 'location_id': week})
+    bad_format = http.get('/admin/export/appointments.xlsx')
+    bad_date = http.get('/admin/export/appointments.csv', query_string={'start': 'May 1st'})
+
+    assert response.mimetype == 'text/csv'
+    assert f'appointments-{START}-{END}.csv' in response.headers['Content-Disposition']
+    assert len(response.data.decode().splitlines()) - 1 == 4
+    assert (bad_format.status_code, bad_format.get_json()['status']) == (400, 'error')
+    assert bad_date.status_code == 400
+
+
+def test_route_is_for_admins_only(db, make_provider, login):
+    response = login(make_provider().id).get('/admin/export/appointments.csv')
+
+    assert response.status_code in (302, 403)
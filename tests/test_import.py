@@ -0,0 +1,53 @@
+import io
+import os
+import threading
+
+import pytest
+
+import importer
+from importer import checkpoint_path, import_csv
+
+CLIENTS_CSV = b'name,email\nUpload Person,upload.person@example.com\n'
+
+
+@pytest.fixture
+def upload(app, db, login, make_provider, monkeypatch, tmp_path):
+    """POST a CSV as an admin, wait for the background import and return (status JSON, stored path)"""
+    monkeypatch.setattr(app, 'instance_path', str(tmp_path))
+    client = login(make_provider(is_admin=True).id)
+
+    def post(data=CLIENTS_CSV):
+        response = client.post('/admin/import', data={'file': (io.BytesIO(data), 'clients.csv')})
+        assert response.status_code == 202
+        import_id = response.get_json()['import_id']
+        for thread in threading.enumerate():
+            if thread.name == f'job-import-{import_id}':
+                thread.join()
+        return client.get(response.get_json()['status_url']).get_json(), tmp_path / 'imports' / f'{import_id}.csv'
+    return post
+
+
+def test_uploads_are_stored_outside_static(app, upload):
+    status, path = upload()
+
+    assert status['status'] == 'finished'
+    assert status['counts']['clients'] == 1
+    # The finished file is removed; its checkpoint stays for the status endpoint
+    assert not path.exists()
+    assert os.path.exists(checkpoint_path(str(path)))
+    assert os.path.commonpath([app.static_folder, str(path)]) != app.static_folder
+
+
+def test_failed_upload_keeps_file_and_resumes_from_cli_path(upload, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('database went away')
+    monkeypatch.setattr(importer, '_import_rows', fail)
+
+    status, path = upload()
+
+    assert status['status'] == 'failed'
+    assert status['resume_command'] == f'flask import-csv {path}'
+    assert path.exists()
+
+    monkeypatch.undo()
+    assert import_csv(str(path), progress=None)['finished']
@@ -0,0 +1,125 @@
+import smtplib
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql
+
+from mailer import (enqueue_email, enqueue_emails, deliver_pending, deliver_all, SMTPConnectionPool, StubSMTPServer,
+                    MAX_ATTEMPTS, BACKOFF_BASE_SECONDS)
+from models import OutboundEmail, Client
+
+
+@pytest.fixture
+def queue(db):
+    """An empty outbound queue; emails left behind by other tests would be delivered too"""
+    db.session.query(OutboundEmail).delete()
+    db.session.commit()
+    return db
+
+
+@pytest.fixture
+def smtp_server():
+    server = StubSMTPServer(port=0)
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class FailingPool:
+    """Stands in for SMTPConnectionPool with a server that refuses every message"""
+    dev_mode = False
+    username = 'no-reply@example.com'
+
+    def send(self, message):
+        raise smtplib.SMTPDataError(451, b'try again later')
+
+    def close(self):
+        pass
+
+
+def test_one_connection_is_reused_for_the_whole_queue(queue, smtp_server, monkeypatch):
+    pool = SMTPConnectionPool('127.0.0.1', smtp_server.server_address[1], 'no-reply@example.com', 'secret',
+                              starttls=False)
+    connects = []
+    connect = pool._connect
+    monkeypatch.setattr(pool, '_connect', lambda: connects.append(1) or connect())
+    enqueue_emails([(f'reader{i}@example.com', f'Message {i}', '<p>Hello</p>') for i in range(5)], commit=True)
+
+    assert deliver_all(pool, batch_size=2) == 5
+    pool.close()
+
+    assert len(connects) == 1
+    assert [message['to'] for message in smtp_server.messages] == [[f'reader{i}@example.com'] for i in range(5)]
+    assert OutboundEmail.query.filter_by(status='sent').count() == 5
+
+
+def test_failures_back_off_exponentially_then_give_up(queue):
+    email, = enqueue_email('bounce@example.com', 'Retry me', '<p>Hello</p>', commit=True)
+
+    delays = []
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        before = datetime.utcnow()
+        assert deliver_pending(FailingPool()) == 0
+        queue.session.refresh(email)
+        assert email.attempts == attempt
+        if attempt < MAX_ATTEMPTS:
+            assert email.status == 'pending'
+            delays.append(round((email.next_attempt_at - before).total_seconds()))
+            # Not due yet: another run leaves it alone
+            assert deliver_pending(FailingPool()) == 0
+            queue.session.refresh(email)
+            assert email.attempts == attempt
+            email.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+            queue.session.commit()
+
+    assert delays == [BACKOFF_BASE_SECONDS * 2 ** n for n in range(MAX_ATTEMPTS - 1)]
+    assert email.status == 'failed'
+    assert '451' in email.last_error
+    assert deliver_pending(FailingPool()) == 0
+    assert queue.session.get(OutboundEmail, email.id).attempts == MAX_ATTEMPTS
+
+
+def test_batches_are_claimed_with_skip_locked(queue):
+    """Concurrent workers on Postgres skip each other's rows instead of sending them twice"""
+    enqueue_email('claimed@example.com', 'Once only', '<p>Hello</p>', commit=True)
+    statements = []
+
+    def capture(state):
+        if state.is_select:
+            statements.append(state.statement)
+    event.listen(queue.session, 'do_orm_execute', capture)
+    try:
+        deliver_pending(FailingPool())
+    finally:
+        event.remove(queue.session, 'do_orm_execute', capture)
+
+    claim = str(statements[0].compile(dialect=postgresql.dialect()))
+    assert 'FROM outbound_emails' in claim
+    assert claim.endswith('FOR UPDATE SKIP LOCKED')
+
+
+def test_queueing_joins_the_callers_transaction(queue, make_client):
+    from app import send_email
+    client = make_client()
+    client.name = 'Renamed With The Email'
+
+    assert send_email(client.email, 'Hello', '<p>Hello</p>')
+    queue.session.rollback()
+
+    assert OutboundEmail.query.count() == 0
+    assert queue.session.get(Client, client.id).name != 'Renamed With The Email'
+
+
+def test_queue_errors_keep_the_callers_work(queue, make_client, monkeypatch):
+    import app as app_module
+    client = make_client()
+    client.name = 'Kept Despite The Email'
+    monkeypatch.setattr(app_module, 'enqueue_email', lambda *args: 1 / 0)
+
+    assert not app_module.send_email(client.email, 'Hello', '<p>Hello</p>')
+    queue.session.commit()
+
+    queue.session.expire_all()
+    assert queue.session.get(Client, client.id).name == 'Kept Despite The Email'
@@ -0,0 +1,23 @@
+def test_metrics_needs_token_or_admin(app, login, make_provider, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'scrape-secret')
+    anonymous = app.test_client()
+
+    assert anonymous.get('/metrics').status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+    assert login(make_provider().id).get('/metrics').status_code == 401
+    assert login(make_provider(is_admin=True).id).get('/metrics').status_code == 200
+
+
+def test_metrics_without_token_is_admin_only(app, login, make_provider):
+    assert app.test_client().get('/metrics').status_code == 401
+    assert login(make_provider(is_admin=True).id).get('/metrics').status_code == 200
+
+
+def test_slot_cache_stats_are_exported_as_counters(login, make_provider):
+    body = login(make_provider(is_admin=True).id).get('/metrics').get_data(as_text=True)
+
+    assert '# TYPE slot_cache_loads_total counter' in body
+    assert '# TYPE slot_cache_local_hits_total counter' in body
+    assert '# TYPE slot_cache_local_entries gauge' in body
+    assert 'slot_cache_loads ' not in body
@@ -0,0 +1,71 @@
+import pytest
+from flask import flash, render_template_string
+
+from page_cache import page_cache, cached_page
+
+
+@pytest.fixture
+def cache(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PAGE_CACHE', True)
+    page_cache.clear()
+    yield page_cache
+    page_cache.clear()
+
+
+def test_anonymous_pages_revalidate_with_304(app, db, cache):
+    http = app.test_client()
+
+    first = http.get('/policies')
+    etag = first.headers['ETag']
+
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == 'no-cache'
+    assert 'Cookie' in first.headers['Vary']
+    assert cache.paths() == ['/policies']
+    revalidated = http.get('/policies', headers={'If-None-Match': etag})
+    assert (revalidated.status_code, revalidated.data) == (304, b'')
+    since = http.get('/policies', headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert since.status_code == 304
+    changed = http.get('/policies', headers={'If-None-Match': '"something-else"'})
+    assert (changed.status_code, changed.data) == (200, first.data)
+
+
+def test_logged_in_visitors_bypass_the_cache(app, db, cache, login, make_provider):
+    response = login(make_provider().id).get('/policies')
+
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert cache.paths() == []
+
+
+def test_query_strings_bypass_the_cache(app, db, cache):
+    response = app.test_client().get('/policies?utm_source=newsletter')
+
+    assert 'ETag' not in response.headers
+    assert cache.paths() == []
+
+
+def test_pending_flash_is_shown_and_not_cached(app, db, cache):
+    http = app.test_client()
+    with http.session_transaction() as session:
+        session['_flashes'] = [('success', 'Your gift card is on its way')]
+
+    response = http.get('/policies')
+
+    assert b'Your gift card is on its way' in response.data
+    assert 'ETag' not in response.headers
+    assert cache.paths() == []
+    assert b'Your gift card is on its way' not in http.get('/policies').data
+
+
+@pytest.mark.parametrize('template', ['{% for m in get_flashed_messages() %}{{ m }}{% endfor %}', 'no messages'])
+def test_message_flashed_while_rendering_never_enters_the_cache(app, cache, template):
+    @cached_page
+    def view():
+        flash('Only for this visitor')
+        return render_template_string(template)
+
+    with app.test_request_context('/flashing-page'):
+        view()
+
+    assert cache.get('/flashing-page') is None
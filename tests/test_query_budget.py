@@ -0,0 +1,71 @@
+"""
+Every GET route rendered as an admin against a small dataset with several rows behind each
+relationship, with the N+1 detector raising, and held to its QUERY_BUDGETS entry
+"""
+from datetime import date, time, timedelta
+
+import pytest
+
+from app import (app as flask_app, QUERY_BUDGETS, QUERY_BUDGET_DEFAULT, query_budget_sample_args,
+                 query_budget_targets, measure_route_queries)
+
+GET_RULES = sorted(rule.rule for rule in flask_app.url_map.iter_rules() if 'GET' in rule.methods)
+ROWS = 3
+
+
+@pytest.fixture(scope='module')
+def admin_id(app):
+    from models import (db, Provider, Client, Location, Treatment, ProviderTreatment, ProviderAvailability,
+                        Appointment, SOAPNote, MedicalAlert, Intake, ClientNote)
+    today = date.today()
+    with app.app_context():
+        location = Location(name='Budget Location', address='1 Main St')
+        db.session.add(location)
+        db.session.flush()
+        providers = [Provider(username=f'budget{i}', email=f'budget{i}@example.com', full_name=f'Budget Provider {i}',
+                              password_hash='not-a-real-hash', is_admin=i == 0, location_id=location.id)
+                     for i in range(ROWS)]
+        treatments = [Treatment(name=f'Budget Treatment {i}', duration_minutes=60, price=90.0) for i in range(ROWS)]
+        clients = [Client(name=f'Budget Massage Client {i}', email=f'budget.client{i}@example.com') for i in range(ROWS)]
+        db.session.add_all(providers + treatments + clients)
+        db.session.flush()
+        for provider in providers:
+            for treatment in treatments:
+                db.session.add(ProviderTreatment(provider_id=provider.id, treatment_id=treatment.id))
+            db.session.add(ProviderAvailability(provider_id=provider.id, day_of_week=today.weekday(),
+                                                start_time=time(9, 0), end_time=time(17, 0)))
+            for i, client in enumerate(clients):
+                for offset, status in ((0, 'scheduled'), (1, 'confirmed'), (-1, 'completed')):
+                    appointment = Appointment(provider_id=provider.id, client_id=client.id,
+                                              treatment_id=treatments[i].id,
+                                              appointment_date=today + timedelta(days=offset),
+                                              start_time=time(9 + i * 2, 0), end_time=time(10 + i * 2, 0),
+                                              status=status)
+                    db.session.add(appointment)
+                    if status == 'completed':
+                        db.session.flush()
+                        db.session.add(SOAPNote(appointment_id=appointment.id, provider_id=provider.id,
+                                                client_id=client.id, subjective='massage went well',
+                                                objective='o', assessment='a', plan='p'))
+                db.session.add(ClientNote(provider_id=provider.id, client_id=client.id, notes='Prefers firm massage'))
+        for client in clients:
+            db.session.add(MedicalAlert(client_id=client.id, alert_type='Injury', description='Sore shoulder'))
+            db.session.add(Intake(client_id=client.id, assigned_provider_id=providers[0].id))
+        db.session.commit()
+        return providers[0].id
+
+
+@pytest.mark.parametrize('rule', GET_RULES)
+def test_route_stays_within_query_budget(app, db, login, admin_id, rule, monkeypatch):
+    from models import Provider
+    monkeypatch.setitem(app.config, 'NPLUSONE_MODE', 'raise')
+    sample_args = query_budget_sample_args(db.session.get(Provider, admin_id))
+    target, url, reason = next(target for target in query_budget_targets(sample_args) if target[0].rule == rule)
+    if url is None:
+        pytest.skip(reason)
+
+    status, queries = measure_route_queries(login(admin_id), url, target.endpoint)
+
+    assert status < 500
+    budget = QUERY_BUDGETS.get(target.endpoint, QUERY_BUDGET_DEFAULT)
+    assert queries <= budget, f'{url} ran {queries} queries, over its budget of {budget}'
@@ -0,0 +1,60 @@
+from datetime import date, datetime, time
+
+from sqlalchemy import update
+
+from models import Appointment, PerformanceMetric
+from rollups import run_rollup
+
+FIRST, SECOND, THIRD = date(2025, 5, 5), date(2025, 5, 12), date(2025, 5, 19)
+
+
+def _visit(db, provider, client, day, settled=True):
+    visit = Appointment(provider_id=provider.id, client_id=client.id, appointment_date=day,
+                        start_time=time(10, 0), end_time=time(11, 0), status='completed')
+    db.session.add(visit)
+    db.session.commit()
+    if settled:
+        # Written long before the last rollup, so only the changes a test makes are rescanned by updated_at
+        db.session.execute(update(Appointment).where(Appointment.id == visit.id).values(updated_at=datetime(2025, 6, 1)))
+        db.session.commit()
+    return visit
+
+
+def _split(provider, day, full=False):
+    run_rollup(full=full)
+    metric = PerformanceMetric.query.filter_by(provider_id=provider.id, metric_date=day).one()
+    return metric.new_clients, metric.returning_clients
+
+
+def test_new_client_split_follows_an_earlier_first_visit(db, make_provider, make_client):
+    provider, other = make_provider(), make_provider()
+    client = make_client()
+    _visit(db, provider, client, SECOND)
+    assert _split(provider, SECOND, full=True) == (1, 0)
+
+    earlier = _visit(db, other, client, FIRST, settled=False)
+    assert _split(provider, SECOND) == (0, 1)
+
+    earlier.appointment_date = THIRD
+    db.session.commit()
+    assert _split(provider, SECOND) == (1, 0)
+
+    earlier.appointment_date = FIRST
+    db.session.commit()
+    assert _split(provider, SECOND) == (0, 1)
+
+    db.session.delete(earlier)
+    db.session.commit()
+    assert _split(provider, SECOND) == (1, 0)
+
+
+def test_cancelling_the_first_visit_makes_the_next_one_new(db, make_provider, make_client):
+    provider, other = make_provider(), make_provider()
+    client = make_client()
+    first = _visit(db, other, client, FIRST)
+    _visit(db, provider, client, SECOND)
+    assert _split(provider, SECOND, full=True) == (0, 1)
+
+    first.status = 'cancelled'
+    db.session.commit()
+    assert _split(provider, SECOND) == (1, 0)
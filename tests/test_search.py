@@ -0,0 +1,84 @@
+import random
+
+from sqlalchemy import delete, insert
+
+from models import SearchDocument, Intake, ClientNote
+from search import search, InvertedIndex
+from timeline import can_view_client
+
+
+def _other_worker(*statements):
+    """Run statements on a separate connection, as another gunicorn worker would, bypassing this session"""
+    from models import db
+    db.session.commit()
+    with db.engine.begin() as connection:
+        for statement in statements:
+            connection.execute(statement)
+
+
+def _client_document(client, title):
+    return [
+        delete(SearchDocument).where(SearchDocument.kind == 'client', SearchDocument.source_id == client.id),
+        insert(SearchDocument).values(kind='client', source_id=client.id, client_id=client.id, title=title, body=''),
+    ]
+
+
+def test_search_sees_documents_changed_by_other_workers(db, make_client):
+    client = make_client(name='Marguerite Okonkwo')
+    db.session.commit()
+    assert [r['client_id'] for r in search('Okonkwo')] == [client.id]
+
+    _other_worker(*_client_document(client, 'Marguerite Vasquez-Thornbury'))
+
+    assert [r['client_id'] for r in search('Thornbury')] == [client.id]
+    assert search('Okonkwo') == []
+
+
+def test_search_drops_documents_deleted_by_other_workers(db, make_client):
+    client = make_client(name='Ignatius Featherstonehaugh')
+    db.session.commit()
+    assert [r['client_id'] for r in search('Featherstonehaugh')] == [client.id]
+
+    _other_worker(delete(SearchDocument).where(SearchDocument.kind == 'client', SearchDocument.source_id == client.id))
+
+    assert search('Featherstonehaugh') == []
+
+
+def test_provider_search_matches_timeline_access(db, make_provider, make_client):
+    provider = make_provider()
+    assigned = make_client(name='Cordelia Intakeonly')
+    stranger = make_client(name='Cordelia Stranger')
+    db.session.add(Intake(client_id=assigned.id, assigned_provider_id=provider.id))
+    db.session.commit()
+
+    assert [r['client_id'] for r in search('Cordelia', provider_id=provider.id)] == [assigned.id]
+    assert can_view_client(provider, assigned.id)
+    assert not can_view_client(provider, stranger.id)
+
+
+def test_providers_only_find_their_own_client_notes(db, make_provider, make_client):
+    author, colleague = make_provider(), make_provider()
+    client = make_client()
+    for provider in (author, colleague):
+        db.session.add(Intake(client_id=client.id, assigned_provider_id=provider.id))
+    note = ClientNote(provider_id=author.id, client_id=client.id, notes='Discussed the quillwort allergy privately')
+    db.session.add(note)
+    db.session.commit()
+
+    assert [r['id'] for r in search('quillwort', provider_id=author.id)] == [note.id]
+    assert search('quillwort', provider_id=colleague.id) == []
+    assert [r['id'] for r in search('quillwort')] == [note.id]
+
+
+def test_pruned_top_k_matches_full_ranking():
+    """Stopping early on a short prefix must return exactly the head of the unpruned ranking"""
+    rng = random.Random(3)
+    words = ['pain', 'pressure', 'posture', 'piriformis', 'patel', 'pavel', 'plan', 'pectoral', 'neck', 'hip']
+    index = InvertedIndex()
+    for source_id in range(400):
+        body = ' '.join(rng.choice(words) for _ in range(rng.randint(3, 30)))
+        index._add(('soap_note', source_id), source_id, None, body)
+
+    everything = index.search('p', limit=1000)
+    for limit in (1, 5, 20):
+        assert index.search('p', limit=limit) == everything[:limit]
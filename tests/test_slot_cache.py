@@ -0,0 +1,67 @@
+from datetime import date
+
+import pytest
+
+import slot_cache
+from slot_cache import SlotCache
+from slots import ProviderDay
+
+fakeredis = pytest.importorskip('fakeredis')
+
+DAY = date(2026, 3, 2)
+
+
+@pytest.fixture
+def workers():
+    """Factory of SlotCache instances standing in for gunicorn workers that share one Redis"""
+    server = fakeredis.FakeServer()
+    return lambda: SlotCache(shared=fakeredis.FakeRedis(server=server))
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Stand-in for load_provider_days; tests set free_mask to change what the 'database' holds"""
+    state = {'free_mask': 1, 'during_load': None}
+
+    def load(provider_ids, start_date, end_date):
+        provider_days = {(provider_id, DAY): ProviderDay(provider_id, DAY, free_mask=state['free_mask'])
+                         for provider_id in provider_ids}
+        during_load = state.pop('during_load', None)
+        if during_load:
+            during_load()
+        return provider_days
+
+    monkeypatch.setattr(slot_cache, 'load_provider_days', load)
+    return state
+
+
+def test_other_worker_reads_shared_entry(workers, database):
+    first, second = workers(), workers()
+    first.get_provider_days([1], DAY, DAY)
+
+    assert second.get_provider_days([1], DAY, DAY)[(1, DAY)].free_mask == 1
+    assert second.stats()['shared_hits'] == 1
+    assert second.stats()['loads'] == 0
+
+
+def test_invalidation_during_load_is_not_overwritten(workers, database):
+    slow, booking, reader = workers(), workers(), workers()
+
+    def book():
+        # Another worker books the slot after the slow worker read the old rows
+        database['free_mask'] = 2
+        booking.invalidate(1, DAY)
+    database['during_load'] = book
+    slow.get_provider_days([1], DAY, DAY)
+
+    assert reader.get_provider_days([1], DAY, DAY)[(1, DAY)].free_mask == 2
+    assert reader.stats()['loads'] == 1
+
+
+def test_invalidate_all_retires_shared_entries(workers, database):
+    first, second = workers(), workers()
+    first.get_provider_days([1], DAY, DAY)
+    database['free_mask'] = 2
+    first.invalidate_all()
+
+    assert second.get_provider_days([1], DAY, DAY)[(1, DAY)].free_mask == 2
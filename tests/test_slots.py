@@ -0,0 +1,106 @@
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+from models import Appointment, ProviderAvailability, ProviderDailyLimit, ProviderTreatment
+from slots import ProviderDay, find_free_slots, to_unit, unit_to_str, units_for, _range_mask
+
+DAY = date.today() + timedelta(days=400)
+HOUR = units_for(60)
+
+
+def _open(start, end):
+    return ProviderDay(1, DAY, _range_mask(to_unit(start), to_unit(end)))
+
+
+def _times(units):
+    return [unit_to_str(unit) for unit in units]
+
+
+def test_fits_up_to_closing_time_and_no_further():
+    day = _open(time(9, 0), time(12, 0))
+
+    assert day.fits(to_unit(time(11, 0)), HOUR)
+    assert not day.fits(to_unit(time(11, 5)), HOUR)
+    assert not day.fits(to_unit(time(8, 55)), HOUR)
+    assert not day.fits(to_unit(time(9, 0)), 0)
+    assert not day.fits(-1, HOUR)
+
+
+def test_start_units_are_stepped_and_respect_not_before():
+    day = _open(time(9, 0), time(12, 0))
+    step = units_for(15)
+
+    assert _times(day.start_units(HOUR, step)) == ['09:00', '09:15', '09:30', '09:45', '10:00', '10:15', '10:30',
+                                                   '10:45', '11:00']
+    assert _times(day.start_units(HOUR, step, not_before=to_unit(time(10, 20)))) == ['10:30', '10:45', '11:00']
+    assert day.start_units(units_for(200), step) == []
+
+
+def test_at_limit_only_once_the_daily_limit_is_used():
+    day = ProviderDay(1, DAY, daily_limits={7: 2}, treatment_counts={7: 1, 8: 5})
+
+    assert not day.at_limit(7)
+    assert not day.at_limit(8)
+    day.treatment_counts[7] = 2
+    assert day.at_limit(7)
+
+
+@pytest.fixture
+def schedule(db, make_provider, make_client, treatment):
+    """A provider offering treatment 08:00-13:00 on DAY; returns book(start, end, status=..., treatment=...)"""
+    def make(buffer_minutes=0):
+        provider = make_provider(buffer_time_minutes=buffer_minutes)
+        client = make_client()
+        db.session.add_all([
+            ProviderTreatment(provider_id=provider.id, treatment_id=treatment.id),
+            ProviderAvailability(provider_id=provider.id, day_of_week=DAY.weekday(),
+                                 start_time=time(8, 0), end_time=time(13, 0)),
+        ])
+        db.session.commit()
+
+        def book(start, end, status='scheduled', treatment_id=treatment.id):
+            db.session.add(Appointment(provider_id=provider.id, client_id=client.id, treatment_id=treatment_id,
+                                       appointment_date=DAY, start_time=start, end_time=end, status=status))
+            db.session.commit()
+        return provider, book
+    return make
+
+
+def _slots(treatment, now=datetime(2000, 1, 1)):
+    return _times(find_free_slots(treatment, DAY, DAY, now=now).get(DAY, {}))
+
+
+def test_buffer_edges_and_closing_time(schedule, treatment):
+    _, book = schedule(buffer_minutes=15)
+    book(time(10, 0), time(11, 0))
+
+    # 08:45 ends exactly where the buffer before 10:00 starts; 12:00 ends exactly at closing
+    assert _slots(treatment) == ['08:00', '08:15', '08:30', '08:45', '11:15', '11:30', '11:45', '12:00']
+
+
+def test_back_to_back_bookings_leave_no_gap(schedule, treatment):
+    _, book = schedule()
+    book(time(9, 0), time(10, 0))
+    book(time(10, 0), time(11, 0))
+    book(time(11, 30), time(12, 0), status='cancelled')
+
+    assert _slots(treatment) == ['08:00', '11:00', '11:15', '11:30', '11:45', '12:00']
+
+
+def test_daily_limit_closes_the_day(db, schedule, treatment):
+    provider, book = schedule()
+    db.session.add(ProviderDailyLimit(provider_id=provider.id, treatment_id=treatment.id, max_per_day=1))
+    db.session.commit()
+    assert _slots(treatment)
+
+    book(time(8, 0), time(9, 0))
+
+    assert _slots(treatment) == []
+
+
+def test_today_starts_after_now(schedule, treatment):
+    schedule()
+
+    assert _slots(treatment, now=datetime.combine(DAY, time(11, 20))) == ['11:30', '11:45', '12:00']
+    assert _slots(treatment, now=datetime.combine(DAY + timedelta(days=1), time(0, 0))) == []
@@ -0,0 +1,113 @@
+from datetime import date, datetime, time
+
+import pytest
+
+from models import Appointment, ClientNote, Intake, MedicalAlert, SOAPNote
+from timeline import (KINDS, encode_timeline_cursor, decode_timeline_cursor, get_client_timeline, can_view_client)
+
+NOON = datetime(2024, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def history(db, make_provider, make_client):
+    """A client with every kind of entry, two of them sharing NOON; returns (provider, client, expected keys)"""
+    provider, client = make_provider(), make_client()
+    visit = Appointment(provider_id=provider.id, client_id=client.id, appointment_date=date(2024, 3, 1),
+                        start_time=time(12, 0), end_time=time(13, 0), status='completed')
+    earlier = Appointment(provider_id=provider.id, client_id=client.id, appointment_date=date(2024, 2, 1),
+                          start_time=time(9, 30), end_time=time(10, 30), status='completed')
+    db.session.add_all([visit, earlier])
+    db.session.flush()
+    entries = [
+        Intake(client_id=client.id, medical_history='Lower back pain', created_at=datetime(2024, 1, 15, 8, 0),
+               assigned_provider_id=provider.id),
+        SOAPNote(appointment_id=visit.id, provider_id=provider.id, client_id=client.id, assessment='Improving',
+                 created_at=datetime(2024, 3, 1, 14, 0)),
+        MedicalAlert(client_id=client.id, alert_type='allergy', description='Nut oils', created_at=NOON),
+        MedicalAlert(client_id=client.id, alert_type='allergy', description='Resolved', created_at=NOON,
+                     is_active=False),
+        ClientNote(provider_id=provider.id, client_id=client.id, notes='Prefers firm pressure',
+                   created_at=datetime(2024, 2, 20, 10, 0)),
+    ]
+    db.session.add_all(entries)
+    db.session.commit()
+    intake, soap, alert, _, note = entries
+    # Newest first; at NOON the medical alert sorts ahead of the appointment by kind
+    expected = [('soap_note', soap.id), ('medical_alert', alert.id), ('appointment', visit.id),
+                ('client_note', note.id), ('appointment', earlier.id), ('intake', intake.id)]
+    return provider, client, expected
+
+
+def _keys(rows):
+    return [(row.kind, row.id) for row in rows]
+
+
+def test_all_five_branches_merge_newest_first(history):
+    _, client, expected = history
+
+    rows, next_cursor = get_client_timeline(client.id)
+
+    assert _keys(rows) == expected
+    assert next_cursor is None
+    assert {row.kind for row in rows} == set(KINDS)
+    assert rows[2].occurred_at == NOON
+    assert (rows[0].title, rows[0].detail) == ('SOAP note', 'Improving')
+
+
+def test_pages_follow_the_cursor_without_gaps_or_repeats(history):
+    _, client, expected = history
+    seen, after = [], None
+
+    for _ in range(len(expected)):
+        rows, next_cursor = get_client_timeline(client.id, after, limit=2)
+        seen += _keys(rows)
+        if next_cursor is None:
+            break
+        after = decode_timeline_cursor(next_cursor)
+
+    assert seen == expected
+
+
+def test_kinds_narrow_the_union(history):
+    _, client, expected = history
+
+    rows, _ = get_client_timeline(client.id, kinds=['appointment', 'intake'])
+
+    assert _keys(rows) == [key for key in expected if key[0] in ('appointment', 'intake')]
+
+
+def test_cursor_round_trips():
+    cursor = encode_timeline_cursor(NOON, 'medical_alert', 42)
+
+    assert '=' not in cursor
+    assert decode_timeline_cursor(cursor) == (NOON, 'medical_alert', 42)
+
+
+@pytest.mark.parametrize('cursor', ['==', 'not base64!', encode_timeline_cursor(NOON, 'invoice', 1),
+                                    encode_timeline_cursor(NOON, 'intake', 1)[:-3]])
+def test_malformed_cursors_are_rejected(app, db, make_provider, login, cursor):
+    with pytest.raises(ValueError):
+        decode_timeline_cursor(cursor)
+
+    admin = make_provider(is_admin=True)
+    response = login(admin.id).get('/api/clients/1/timeline', query_string={'cursor': cursor})
+    assert response.status_code == 400
+
+
+def test_providers_see_only_clients_they_have_met(history, db, make_provider, make_client, login):
+    provider, client, expected = history
+    assigned_only = make_client()
+    db.session.add(Intake(client_id=assigned_only.id, assigned_provider_id=provider.id))
+    db.session.commit()
+    stranger, admin = make_provider(), make_provider(is_admin=True)
+
+    assert can_view_client(provider, client.id)
+    assert can_view_client(provider, assigned_only.id)
+    assert can_view_client(admin, client.id)
+    assert not can_view_client(stranger, client.id)
+    assert not can_view_client(provider, make_client().id)
+
+    denied = login(stranger.id).get(f'/api/clients/{client.id}/timeline')
+    assert (denied.status_code, denied.get_json()['status']) == (403, 'error')
+    allowed = login(provider.id).get(f'/api/clients/{client.id}/timeline').get_json()
+    assert [(event['kind'], event['id']) for event in allowed['events']] == expected
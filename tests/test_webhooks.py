@@ -0,0 +1,84 @@
+import itertools
+
+import pytest
+
+from models import Intake, WebhookEvent
+from webhooks import record_webhook_event, process_all_pending, MAX_ATTEMPTS
+
+_bookings = itertools.count(1)
+
+
+@pytest.fixture
+def events(db):
+    """An empty webhook queue, so the processor only sees this test's events"""
+    WebhookEvent.query.delete()
+    db.session.commit()
+    return db
+
+
+def _booking(**fields):
+    number = next(_bookings)
+    return {'booking_id': f'hook-{number}', 'client_name': f'Hook Client {number}',
+            'email': f'hook.client{number}@example.com', 'medical_history': 'None', **fields}
+
+
+def _intakes(*payloads):
+    emails = [payload['email'] for payload in payloads]
+    return [intake for intake in Intake.query.all() if intake.client and intake.client.email in emails]
+
+
+def test_redelivered_booking_is_stored_and_processed_once(app, events):
+    payload = _booking()
+    http = app.test_client()
+
+    first = http.post('/webhook/fullslate', json=payload).get_json()
+    again = http.post('/webhook/fullslate', json=payload).get_json()
+    process_all_pending()
+
+    assert (first['status'], again['status']) == ('accepted', 'duplicate')
+    assert again['event_id'] == first['event_id']
+    assert len(_intakes(payload)) == 1
+    # The same booking id from another source is a different booking
+    assert record_webhook_event(payload, source='other-calendar')[1]
+
+
+def test_bookings_without_an_id_dedupe_on_the_payload(events):
+    payload = _booking(booking_id=None)
+    other = _booking(booking_id='')
+
+    first_id, created = record_webhook_event(payload)
+    again_id, created_again = record_webhook_event(dict(reversed(list(payload.items()))))
+    other_id, other_created = record_webhook_event(other)
+    process_all_pending()
+
+    assert (created, created_again, other_created) == (True, False, True)
+    assert again_id == first_id != other_id
+    assert events.session.get(WebhookEvent, first_id).booking_id.startswith('sha256:')
+    assert len(_intakes(payload)) == 1
+    assert [intake.booking_id for intake in _intakes(payload, other)] == [None, None]
+
+
+def test_a_bad_event_does_not_hold_up_the_rest_of_its_batch(events):
+    good, bad, later = _booking(), _booking(email=['not', 'an', 'address']), _booking()
+    ids = [record_webhook_event(payload)[0] for payload in (good, bad, later)]
+
+    assert process_all_pending() == 3
+
+    assert len(_intakes(good, later)) == 2
+    statuses = {event.id: event.status for event in WebhookEvent.query.filter(WebhookEvent.id.in_(ids))}
+    assert statuses == {ids[0]: 'processed', ids[1]: 'pending', ids[2]: 'processed'}
+
+    for _ in range(MAX_ATTEMPTS - 1):
+        process_all_pending()
+    failed = events.session.get(WebhookEvent, ids[1])
+    assert (failed.status, failed.attempts) == ('failed', MAX_ATTEMPTS)
+    assert failed.last_error
+
+
+def test_mixed_case_email_matches_the_stored_client(events, make_client):
+    client = make_client()
+    record_webhook_event(_booking(email=f' {client.email.upper()}'))
+
+    assert process_all_pending() == 1
+
+    assert [intake.client_id for intake in Intake.query.filter_by(client_id=client.id)] == [client.id]
@@ -0,0 +1,140 @@
+"""
+Per-client history: intakes, appointments, SOAP notes, medical alerts and client notes
+merged newest first by one UNION ALL statement. Each branch seeks past the cursor and
+stops at the page size on its own, so a page costs the same for a client with five
+visits or five hundred.
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import select, union, union_all, literal, case, func, tuple_, type_coerce, DateTime, String
+from models import db, Intake, Appointment, SOAPNote, MedicalAlert, ClientNote
+
+KINDS = ('intake', 'appointment', 'soap_note', 'medical_alert', 'client_note')
+MAX_TIMELINE_PAGE = 100
+
+# SQLite keeps timestamps as text; comparing them needs one fixed format on both sides
+SQLITE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _sqlite():
+    return db.engine.dialect.name == 'sqlite'
+
+
+def _timestamp(column, time_column=None):
+    """Sortable timestamp expression; time_column combines a date with a time of day"""
+    if _sqlite():
+        if time_column is not None:
+            return func.datetime(column.op('||')(literal(' ')).op('||')(time_column))
+        return func.datetime(column)
+    if time_column is not None:
+        return type_coerce(column.op('+')(time_column), DateTime)
+    return column
+
+
+def encode_timeline_cursor(occurred_at, kind, item_id):
+    """Opaque keyset cursor pointing just after one timeline entry"""
+    raw = f"{occurred_at.isoformat()}|{kind}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_timeline_cursor(cursor):
+    """Inverse of encode_timeline_cursor; raises ValueError for anything malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        occurred_at, kind, item_id = raw.split('|')
+        if kind not in KINDS:
+            raise ValueError(kind)
+        return datetime.fromisoformat(occurred_at), kind, int(item_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def _branches(client_id):
+    """(kind, select) per source table, all producing the same columns"""
+    return [
+        ('intake', select(
+            _timestamp(Intake.created_at), Intake.id, literal('Intake form'),
+            Intake.medical_history, case((Intake.confirmed.is_(True), 'confirmed'), else_='pending'),
+            Intake.assigned_provider_id
+        ).where(Intake.client_id == client_id)),
+        ('appointment', select(
+            _timestamp(Appointment.appointment_date, Appointment.start_time), Appointment.id,
+            literal('Appointment'), Appointment.notes, Appointment.status, Appointment.provider_id
+        ).where(Appointment.client_id == client_id)),
+        ('soap_note', select(
+            _timestamp(SOAPNote.created_at), SOAPNote.id, literal('SOAP note'),
+            SOAPNote.assessment, literal(None, String), SOAPNote.provider_id
+        ).where(SOAPNote.client_id == client_id)),
+        ('medical_alert', select(
+            _timestamp(MedicalAlert.created_at), MedicalAlert.id, MedicalAlert.alert_type,
+            MedicalAlert.description, MedicalAlert.severity, MedicalAlert.created_by_provider_id
+        ).where(MedicalAlert.client_id == client_id, MedicalAlert.is_active.is_(True))),
+        ('client_note', select(
+            _timestamp(ClientNote.created_at), ClientNote.id, literal('Client note'),
+            ClientNote.notes, literal(None, String), ClientNote.provider_id
+        ).where(ClientNote.client_id == client_id)),
+    ]
+
+
+def get_client_timeline(client_id, after=None, limit=50, kinds=None):
+    """
+    One page of a client's history, newest first, ordered by (occurred_at, kind, id).
+    Returns (rows, next_cursor); rows have occurred_at, kind, id, title, detail, status and
+    provider_id, and next_cursor is None on the last page.
+    """
+    limit = min(max(limit, 1), MAX_TIMELINE_PAGE)
+    if after is not None:
+        after_at = after[0].strftime(SQLITE_FORMAT) if _sqlite() else after[0]
+
+    pages = []
+    for kind, query in _branches(client_id):
+        if kinds and kind not in kinds:
+            continue
+        occurred_at = query.selected_columns[0]
+        item_id = query.selected_columns[1]
+        if after is not None:
+            query = query.where(tuple_(occurred_at, literal(kind), item_id) < tuple_(after_at, after[1], after[2]))
+        # Each branch returns at most one page, already in order
+        branch = query.order_by(occurred_at.desc(), item_id.desc()).limit(limit + 1)\
+            .add_columns(literal(kind).label('kind')).subquery()
+        pages.append(select(branch))
+    if not pages:
+        return [], None
+
+    merged = union_all(*pages).subquery()
+    at, item_id, title, detail, status, provider_id, kind = merged.c
+    rows = db.session.execute(
+        select(type_coerce(at, DateTime).label('occurred_at'), kind.label('kind'), item_id.label('id'),
+               title.label('title'), detail.label('detail'), status.label('status'),
+               provider_id.label('provider_id'))
+        .order_by(at.desc(), kind.desc(), item_id.desc())
+        .limit(limit + 1)
+    ).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_timeline_cursor(last.occurred_at, last.kind, last.id)
+    return rows, next_cursor
+
+
+def provider_client_ids(provider_id, client_id=None):
+    """
+    SELECT of the clients a provider may see: those with appointments with them or intakes
+    assigned to them. Search and the timeline both scope through this; client_id narrows it
+    to a single client.
+    """
+    appointments = select(Appointment.client_id).where(Appointment.provider_id == provider_id)
+    intakes = select(Intake.client_id).where(Intake.assigned_provider_id == provider_id)
+    if client_id is not None:
+        appointments = appointments.where(Appointment.client_id == client_id)
+        intakes = intakes.where(Intake.client_id == client_id)
+    return union(appointments, intakes)
+
+
+def can_view_client(user, client_id):
+    """Admins see every client; providers see the clients in provider_client_ids()"""
+    if user.is_admin:
+        return True
+    return db.session.query(provider_client_ids(user.id, client_id).exists()).scalar()
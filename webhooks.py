@@ -0,0 +1,176 @@
+"""
+FullSlate webhook ingestion
+The HTTP handler only stores the raw payload (deduplicated on booking_id, or on a hash of
+the payload when it has none) and returns.
+process_pending_events() later turns batches of stored events into clients, intakes
+and notification emails.
+"""
+import hashlib
+import json
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from models import db, Intake, WebhookEvent
+from clients import upsert_clients, load_clients, normalize_email
+
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 5
+
+
+def dedupe_key(payload):
+    """
+    The payload's booking_id, or 'sha256:<hash of the payload>' when it has none, so a
+    redelivered booking without an id is still recognised. Two distinct bookings with
+    byte-for-byte identical payloads and no id are indistinguishable and stored once.
+    """
+    booking_id = payload.get('booking_id')
+    if booking_id not in (None, ''):
+        return str(booking_id)
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    return 'sha256:' + hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def record_webhook_event(payload, source='fullslate'):
+    """
+    Persist a raw webhook payload in one short transaction.
+    Returns (event_id, created); created is False when the same dedupe_key() was already received.
+    """
+    booking_id = dedupe_key(payload)
+
+    event = WebhookEvent(source=source, booking_id=booking_id, payload=json.dumps(payload))
+    db.session.add(event)
+    try:
+        db.session.commit()
+        return event.id, True
+    except IntegrityError:
+        db.session.rollback()
+        existing_id = db.session.query(WebhookEvent.id).filter_by(source=source, booking_id=booking_id).scalar()
+        return existing_id, False
+
+
+def _resolve_clients(payloads):
+    """Upsert the client for every payload in one statement and load them in one query"""
+    ids = upsert_clients(
+        {'name': payload['client_name'], 'email': payload['email'], 'phone': payload.get('phone')}
+        for payload in payloads
+    )
+    clients = load_clients(ids.values())
+    return {email: clients[client_id] for email, client_id in ids.items()}
+
+
+def _process_batch(events, notify):
+    payloads = {}
+    for event in events:
+        event.attempts = (event.attempts or 0) + 1
+        payload = json.loads(event.payload)
+        if not payload.get('email') or not payload.get('client_name'):
+            event.status = 'failed'
+            event.last_error = 'Payload is missing client_name or email'
+            continue
+        payloads[event.id] = payload
+
+    # Events received before this pipeline existed may already have intakes
+    booking_ids = [p['booking_id'] for p in payloads.values() if p.get('booking_id')]
+    existing_intakes = {}
+    if booking_ids:
+        existing_intakes = dict(db.session.query(Intake.booking_id, Intake.id)
+                                .filter(Intake.booking_id.in_([str(b) for b in booking_ids])).all())
+
+    clients = _resolve_clients(list(payloads.values()))
+
+    new_intakes = []
+    now = datetime.utcnow()
+    for event in events:
+        payload = payloads.get(event.id)
+        if payload is None:
+            continue
+        booking_id = str(payload['booking_id']) if payload.get('booking_id') else None
+        if booking_id in existing_intakes:
+            event.intake_id = existing_intakes[booking_id]
+        else:
+            intake = Intake(
+                client=clients[normalize_email(payload['email'])],
+                medical_history=payload.get('medical_history', ''),
+                pregnancy_stage=payload.get('pregnancy_stage'),
+                booking_id=booking_id,
+                confirmed=False
+            )
+            db.session.add(intake)
+            new_intakes.append((event, intake))
+        event.status = 'processed'
+        event.processed_at = now
+        event.last_error = None
+
+    db.session.flush()
+    for event, intake in new_intakes:
+        event.intake_id = intake.id
+
+    if notify and new_intakes:
+        notify([intake for _, intake in new_intakes])
+    db.session.commit()
+    return len(events)
+
+
+def process_pending_events(notify=None, batch_size=BATCH_SIZE):
+    """
+    Process one batch of pending events in a single transaction.
+    notify(intakes) is called inside that transaction so notifications are queued atomically.
+    If the batch fails, its events are retried one at a time so a bad payload can't block the rest.
+    Returns the number of events handled.
+    """
+    events = WebhookEvent.query.filter_by(status='pending')\
+        .order_by(WebhookEvent.id).limit(batch_size).with_for_update(skip_locked=True).all()
+    if not events:
+        db.session.commit()
+        return 0
+
+    event_ids = [event.id for event in events]
+    try:
+        return _process_batch(events, notify)
+    except Exception as e:
+        db.session.rollback()
+        print(f"⚠ Webhook batch failed ({e}); retrying events individually")
+
+    handled = 0
+    for event_id in event_ids:
+        event = WebhookEvent.query.filter_by(id=event_id, status='pending')\
+            .with_for_update(skip_locked=True).first()
+        if event is None:
+            db.session.commit()
+            continue
+        try:
+            handled += _process_batch([event], notify)
+        except Exception as e:
+            db.session.rollback()
+            event = db.session.get(WebhookEvent, event_id)
+            event.attempts = (event.attempts or 0) + 1
+            event.last_error = str(e)
+            if event.attempts >= MAX_ATTEMPTS:
+                event.status = 'failed'
+                print(f"✗ Webhook event {event_id} failed permanently: {e}")
+            db.session.commit()
+            handled += 1
+    return handled
+
+
+def process_all_pending(notify=None, batch_size=BATCH_SIZE):
+    """Drain the pending queue batch by batch"""
+    total = 0
+    while True:
+        handled = process_pending_events(notify, batch_size)
+        total += handled
+        if handled < batch_size:
+            return total
+
+
+def requeue_events(status=None, since=None, event_ids=None):
+    """Reset stored events to pending so the processor replays them; returns how many"""
+    query = WebhookEvent.query
+    if event_ids:
+        query = query.filter(WebhookEvent.id.in_(event_ids))
+    if status:
+        query = query.filter(WebhookEvent.status == status)
+    if since:
+        query = query.filter(WebhookEvent.received_at >= since)
+    count = query.update({'status': 'pending', 'attempts': 0, 'last_error': None}, synchronize_session=False)
+    db.session.commit()
+    return count
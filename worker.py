@@ -0,0 +1,54 @@
+"""
+Periodic background jobs
+Jobs run either in a daemon thread inside each web worker or in the foreground from a CLI command;
+one-off jobs such as uploaded imports run once in their own daemon thread
+"""
+import threading
+import time
+
+_started_jobs = set()
+_started_lock = threading.Lock()
+
+
+def run_job(app, name, job):
+    """Run a job once inside an app context, logging instead of raising on failure"""
+    with app.app_context():
+        try:
+            return job()
+        except Exception as e:
+            print(f"✗ Background job {name} failed: {e}")
+            from models import db
+            db.session.rollback()
+            return None
+
+
+def run_periodically(app, name, job, interval):
+    """Run a job every `interval` seconds until the process exits"""
+    while True:
+        started = time.monotonic()
+        run_job(app, name, job)
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def start_background_job(app, name, job, interval):
+    """Start a periodic job in a daemon thread, at most once per process"""
+    with _started_lock:
+        if name in _started_jobs:
+            return False
+        _started_jobs.add(name)
+
+    thread = threading.Thread(
+        target=run_periodically,
+        args=(app, name, job, interval),
+        name=f"job-{name}",
+        daemon=True
+    )
+    thread.start()
+    return True
+
+
+def run_in_background(app, name, job):
+    """Run a job once in a daemon thread"""
+    thread = threading.Thread(target=run_job, args=(app, name, job), name=f"job-{name}", daemon=True)
+    thread.start()
+    return thread